@@ -0,0 +1,131 @@
+"""
+Độ trễ RAG search (p50/p99) khi ingestion đang upsert vào ChromaDB:
+  - before: gọi collection.query / collection.upsert đồng bộ ngay trong coroutine (chặn event loop)
+  - after:  VectorStoreService (executor riêng cho ChromaDB + timeout)
+
+ChromaDB giả lập trong process: mỗi lời gọi là một thao tác I/O chặn (time.sleep) với độ trễ cấu hình.
+
+Chạy: python benchmarks/chroma_concurrency_benchmark.py --duration 5 --qps 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCollection:
+    def __init__(self, query_latency: float, write_latency: float):
+        self.query_latency = query_latency
+        self.write_latency = write_latency
+
+    def query(self, **kwargs):
+        time.sleep(self.query_latency)
+        return {"ids": [["a"]], "documents": [["nội dung"]], "metadatas": [[{"source": "f"}]], "distances": [[0.1]]}
+
+    def upsert(self, **kwargs):
+        time.sleep(self.write_latency)
+
+    def get(self, **kwargs):
+        time.sleep(self.query_latency)
+        return {"ids": [], "metadatas": [], "documents": []}
+
+    def count(self):
+        return 0
+
+
+class FakeChromaClient:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_collection(self, name):
+        return self.collection
+
+    def get_or_create_collection(self, name):
+        return self.collection
+
+
+class FakeEmbeddings:
+    def get_embedding(self, text):
+        return [0.0] * 8
+
+    async def aget_embedding(self, text):
+        return self.get_embedding(text)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))] * 1000
+
+
+async def run_workload(search, upsert, duration: float, qps: float, ingest_workers: int):
+    latencies = []
+    stop = time.monotonic() + duration
+
+    async def ingest():
+        while time.monotonic() < stop:
+            await upsert()
+            await asyncio.sleep(0)
+
+    async def one_search(scheduled):
+        await search()
+        # Tính từ thời điểm câu hỏi lẽ ra được nhận (open-loop), gồm cả thời gian chờ event loop
+        latencies.append(time.monotonic() - scheduled)
+
+    ingest_tasks = [asyncio.create_task(ingest()) for _ in range(ingest_workers)]
+    search_tasks = []
+    start = time.monotonic()
+    for i in range(int(duration * qps)):
+        scheduled = start + i / qps
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        search_tasks.append(asyncio.create_task(one_search(scheduled)))
+    await asyncio.gather(*search_tasks, *ingest_tasks)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--qps", type=float, default=50, help="Số câu hỏi RAG mỗi giây")
+    parser.add_argument("--query-latency", type=float, default=0.015)
+    parser.add_argument("--write-latency", type=float, default=0.25, help="Độ trễ mỗi lô upsert (giây)")
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    collection = FakeCollection(args.query_latency, args.write_latency)
+
+    import services.vectorstore_service as vectorstore_module
+    vectorstore_module.chromadb.HttpClient = lambda **kwargs: FakeChromaClient(collection)
+    service = vectorstore_module.VectorStoreService(FakeEmbeddings(), minio=None)
+
+    async def before_search():
+        collection.query(query_embeddings=[[0.0] * 8], n_results=10)
+
+    async def before_upsert():
+        collection.upsert(ids=[], embeddings=[], metadatas=[], documents=[])
+
+    async def after_search():
+        await service.search("team_bench", "câu hỏi", k=10)
+
+    async def after_upsert():
+        await service._run(collection.upsert, ids=[], embeddings=[], metadatas=[], documents=[])
+
+    print(f"duration={args.duration}s qps={args.qps} query={args.query_latency * 1000:.0f}ms "
+          f"upsert={args.write_latency * 1000:.0f}ms ingest_workers={args.ingest_workers}")
+    print(f"{'Mode':<28} | {'Requests':>8} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'max (ms)':>9}")
+    print("-" * 76)
+    for label, search, upsert in (
+        ("before (sync in coroutine)", before_search, before_upsert),
+        ("after (chroma executor)", after_search, after_upsert),
+    ):
+        latencies = asyncio.run(run_workload(search, upsert, args.duration, args.qps, args.ingest_workers))
+        print(f"{label:<28} | {len(latencies):>8} | {percentile(latencies, 0.5):>9.1f} | "
+              f"{percentile(latencies, 0.99):>9.1f} | {max(latencies) * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
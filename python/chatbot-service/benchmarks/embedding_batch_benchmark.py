@@ -0,0 +1,74 @@
+"""
+So sánh throughput embedding (chunks/giây):
+  - before: 1 request /api/embeddings cho mỗi chunk, tuần tự (như process_and_store cũ)
+  - after:  LLMService.embed_batched (/api/embed, nhiều input mỗi request, vài lô song song)
+
+Chạy: python benchmarks/embedding_batch_benchmark.py --chunks 500 --latency 0.02
+Cột Speedup = thời gian tuần tự / thời gian theo lô; conc = số lô chạy song song (--concurrency).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import start_fake_ollama
+
+
+def make_chunks(count: int):
+    return [f"Đoạn văn bản số {i}: " + ("nội dung tài liệu mẫu " * 40) for i in range(count)]
+
+
+def run_sequential(llm, chunks, model):
+    start = time.perf_counter()
+    for text in chunks:
+        llm.client.embeddings(model=model, prompt=text)
+    return time.perf_counter() - start
+
+
+def run_batched(llm, chunks, batch_size, concurrency):
+    start = time.perf_counter()
+    vectors = asyncio.run(llm.embed_batched(chunks, batch_size=batch_size, max_concurrency=concurrency))
+    elapsed = time.perf_counter() - start
+    assert all(v is not None for v in vectors), "Có chunk embed thất bại"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Độ trễ cố định mỗi request (giây)")
+    parser.add_argument("--per-item", type=float, default=0.001, help="Chi phí model mỗi input (giây)")
+    parser.add_argument("--batch-sizes", default="8,32,64")
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_ollama(request_latency=args.latency, per_item_latency=args.per_item)
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+    from config import OLLAMA_EMBEDDING_MODEL
+    from services.llm_service import LLMService
+
+    llm = LLMService()
+    chunks = make_chunks(args.chunks)
+
+    print(f"Fake Ollama: {base_url} | chunks={args.chunks} latency={args.latency}s per_item={args.per_item}s")
+    print(f"{'Mode':<28} | {'Time (s)':>9} | {'Chunks/s':>9} | {'Speedup':>7}")
+    print("-" * 62)
+
+    baseline = run_sequential(llm, chunks, OLLAMA_EMBEDDING_MODEL)
+    print(f"{'before (sequential)':<28} | {baseline:>9.2f} | {args.chunks / baseline:>9.1f} | {1.0:>7.1f}")
+
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        elapsed = run_batched(llm, chunks, batch_size, args.concurrency)
+        label = f"after (batch={batch_size}, conc={args.concurrency})"
+        print(f"{label:<28} | {elapsed:>9.2f} | {args.chunks / elapsed:>9.1f} | {baseline / elapsed:>7.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Fake Ollama server (stdlib) dùng cho benchmark: mô phỏng độ trễ mạng/model
+cho /api/embeddings (1 prompt), /api/embed (nhiều input) và /api/chat (stream NDJSON từng token).
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 768
+
+
+def fake_vector(text: str, dim: int = EMBEDDING_DIM):
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    raw = [((seed[i % len(seed)] + i * 31) % 255) / 127.5 - 1.0 for i in range(dim)]
+    norm = math.sqrt(sum(v * v for v in raw)) or 1.0
+    return [v / norm for v in raw]
+
+
+def make_handler(request_latency: float, per_item_latency: float, chat_tokens: int = 20, token_latency: float = 0.01):
+    class FakeOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chat(self, data: dict):
+            time.sleep(request_latency)
+            tokens = [f"tok{i} " for i in range(chat_tokens)]
+            if not data.get("stream", True):
+                time.sleep(token_latency * chat_tokens)
+                self._reply({"model": data.get("model"), "message": {"role": "assistant", "content": "".join(tokens)}, "done": True})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens + [""]):
+                time.sleep(token_latency if token else 0)
+                line = json.dumps({
+                    "model": data.get("model"),
+                    "message": {"role": "assistant", "content": token},
+                    "done": i == len(tokens)
+                }).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path == "/api/embeddings":
+                time.sleep(request_latency + per_item_latency)
+                self._reply({"embedding": fake_vector(data.get("prompt", ""))})
+            elif self.path == "/api/embed":
+                inputs = data.get("input", "")
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                time.sleep(request_latency + per_item_latency * len(inputs))
+                self._reply({"model": data.get("model"), "embeddings": [fake_vector(t) for t in inputs]})
+            elif self.path == "/api/chat":
+                self._chat(data)
+            else:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+    return FakeOllamaHandler
+
+
+def start_fake_ollama(
+    port: int = 0,
+    request_latency: float = 0.02,
+    per_item_latency: float = 0.001,
+    chat_tokens: int = 20,
+    token_latency: float = 0.01,
+):
+    """
+    Chạy server trong thread nền. Trả về (server, base_url).
+    """
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(request_latency, per_item_latency, chat_tokens, token_latency)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, bound_port = server.server_address
+    return server, f"http://{host}:{bound_port}"
@@ -0,0 +1,98 @@
+"""
+Recall@k (so với brute force) và độ trễ truy vấn của index HNSW theo từng cấu hình
+(space, M, construction_ef, search_ef) trên corpus vector tổng hợp.
+
+Dùng hnswlib - thư viện index mà ChromaDB dùng cho collection, nhận đúng các tham số
+hnsw:space / hnsw:M / hnsw:construction_ef / hnsw:search_ef trong config.py.
+
+Chạy: python benchmarks/hnsw_recall_benchmark.py --n 50000 --dim 768 --queries 200 --k 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def make_corpus(n: int, dim: int, clusters: int, seed: int = 0):
+    """Vector phân cụm (giống embedding văn bản theo chủ đề), đã chuẩn hóa."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    data = centers[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data
+
+
+def brute_force(data, queries, k: int, space: str):
+    if space == "l2":
+        scores = -(np.sum(queries ** 2, axis=1, keepdims=True) - 2 * queries @ data.T + np.sum(data ** 2, axis=1))
+    else:
+        scores = queries @ data.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", default="cosine")
+    parser.add_argument("--m", default="8,16,32", help="Danh sách M")
+    parser.add_argument("--construction-ef", default="100,200")
+    parser.add_argument("--search-ef", default="10,32,64,128")
+    args = parser.parse_args()
+
+    if hnswlib is None:
+        print("Cần cài hnswlib (pip install hnswlib) để chạy benchmark này.")
+        return
+
+    data = make_corpus(args.n, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = data[rng.choice(args.n, size=args.queries, replace=False)] + 0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    truth = brute_force(data, queries, args.k, args.space)
+    brute_ms = (time.perf_counter() - start) / args.queries * 1000
+
+    print(f"n={args.n} dim={args.dim} queries={args.queries} k={args.k} space={args.space} | brute force: {brute_ms:.2f} ms/query")
+    print(f"{'M':>3} | {'constr_ef':>9} | {'build (s)':>9} | {'search_ef':>9} | {'recall@k':>8} | {'p50 (ms)':>8} | {'p99 (ms)':>8}")
+    print("-" * 72)
+    for m in (int(v) for v in args.m.split(",")):
+        for construction_ef in (int(v) for v in args.construction_ef.split(",")):
+            index = hnswlib.Index(space=args.space, dim=args.dim)
+            start = time.perf_counter()
+            index.init_index(max_elements=args.n, M=m, ef_construction=construction_ef)
+            index.add_items(data, np.arange(args.n))
+            build = time.perf_counter() - start
+            index.set_num_threads(1)
+
+            for search_ef in (int(v) for v in args.search_ef.split(",")):
+                index.set_ef(max(search_ef, args.k))
+                latencies, hits = [], 0
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    labels, _ = index.knn_query(query, k=args.k)
+                    latencies.append(time.perf_counter() - start)
+                    hits += len(expected.intersection(labels[0]))
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] * 1000
+                p99 = latencies[int(0.99 * (len(latencies) - 1))] * 1000
+                recall = hits / (args.k * args.queries)
+                print(f"{m:>3} | {construction_ef:>9} | {build:>9.1f} | {search_ef:>9} | {recall:>8.3f} | {p50:>8.3f} | {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
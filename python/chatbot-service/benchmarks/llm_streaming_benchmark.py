@@ -0,0 +1,88 @@
+"""
+So sánh N câu trả lời stream đồng thời trên một worker:
+  - before: ollama.Client (sync) qua asyncio.to_thread, lặp `for chunk in stream` trên event loop
+  - after:  LLMService.achat (ollama.AsyncClient, pool kết nối dùng chung), `async for`
+
+Đo tổng thời gian, thời gian tới token đầu (TTFT) và độ trễ event loop (một task tick mỗi 5ms).
+Ollama giả lập trong process (benchmarks/fake_ollama.py): mỗi token tốn --token-latency giây.
+
+Chạy: python benchmarks/llm_streaming_benchmark.py --streams 16 --tokens 50 --token-latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import start_fake_ollama
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def measure(label, make_stream, streams: int):
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    async def one():
+        start = time.perf_counter()
+        first = None
+        async for _ in make_stream():
+            if first is None:
+                first = time.perf_counter() - start
+        return first
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    ttfts = await asyncio.gather(*(one() for _ in range(streams)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    print(f"{label:<34} | {elapsed:>8.2f} | {percentile(ttfts, 0.5) * 1000:>9.0f} | "
+          f"{percentile(ttfts, 0.99) * 1000:>9.0f} | {percentile(lags, 0.99) * 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=16)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_ollama(request_latency=0.02, chat_tokens=args.tokens, token_latency=args.token_latency)
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+    from services.llm_service import LLMService
+
+    llm = LLMService()
+    messages = [{"role": "user", "content": "Xin chào"}]
+
+    async def before_stream():
+        stream = await asyncio.to_thread(llm.chat, messages)
+        for chunk in stream:
+            yield chunk
+
+    def after_stream():
+        return llm.achat(messages)
+
+    print(f"Fake Ollama: {base_url} | streams={args.streams} tokens={args.tokens} token_latency={args.token_latency}s")
+    print(f"{'Mode':<34} | {'Time (s)':>8} | {'TTFT p50':>9} | {'TTFT p99':>9} | {'loop lag p99':>12}")
+    print("-" * 84)
+    asyncio.run(measure("before (sync client + to_thread)", before_stream, args.streams))
+    asyncio.run(measure("after (AsyncClient, async for)", after_stream, args.streams))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+So sánh rerank FlashRank (ONNX) khi nhiều câu hỏi đến cùng lúc:
+  - sequential: Ranker.rerank cho từng câu hỏi, chạy thẳng trên event loop (cách cũ của RetrieverService)
+  - batched:    RerankerService gom các câu hỏi trong cửa sổ --window-ms thành một lần session.run
+
+Mỗi mức concurrency C: C client, mỗi client gửi --rounds câu hỏi liên tiếp, mỗi câu hỏi --passages đoạn văn.
+Đo số lần rerank/giây, độ trễ trung bình/p50/p99 mỗi câu hỏi và số câu hỏi trung bình mỗi batch.
+Lần chạy đầu tải model về --cache-dir.
+
+Chạy: python benchmarks/rerank_batching_benchmark.py --concurrency 1,4,16,32 --passages 10 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flashrank import RerankRequest
+
+from models.registry import ModelRegistry
+from services.reranker_service import RerankerService
+
+WORDS = (
+    "dự án nhóm công việc hạn chót báo cáo tiến độ thiết kế giao diện kiểm thử triển khai máy chủ "
+    "cơ sở dữ liệu tài liệu yêu cầu người dùng quản lý phân quyền thông báo lịch họp ngân sách "
+    "rủi ro phát hành phiên bản lỗi sửa chữa tích hợp thanh toán hiệu năng bảo mật sao lưu"
+).split()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def make_requests(count: int, passages: int, passage_words: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        (
+            " ".join(rng.choices(WORDS, k=8)) + "?",
+            [" ".join(rng.choices(WORDS, k=passage_words)) for _ in range(passages)]
+        )
+        for _ in range(count)
+    ]
+
+
+async def measure(label: str, rerank, requests, concurrency: int, rounds: int, batcher=None):
+    latencies = []
+
+    async def client(offset: int):
+        # Độ trễ tính từ lúc câu hỏi sẵn sàng (đầu lượt / câu trước xong), để thời gian chờ
+        # event loop bị chặn bởi client khác (chế độ sequential) cũng được tính
+        issued = start
+        for i in range(rounds):
+            query, texts = requests[(offset * rounds + i) % len(requests)]
+            await rerank(query, texts)
+            done = time.perf_counter()
+            latencies.append(done - issued)
+            issued = done
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    batch = f"{batcher.stats()['avg_batch_requests']:.1f}" if batcher is not None else "1.0"
+    mean = sum(latencies) / len(latencies)
+    print(f"{label:<10} | {concurrency:>4} | {len(latencies) / elapsed:>11.1f} | {mean * 1000:>9.1f} | "
+          f"{percentile(latencies, 0.5) * 1000:>8.1f} | {percentile(latencies, 0.99) * 1000:>8.1f} | {batch:>7}")
+    return mean
+
+
+def run(registry: ModelRegistry, model_name: str, concurrency_levels, passages: int, passage_words: int, rounds: int, window_ms: float, max_batch_pairs: int):
+    requests = make_requests(256, passages, passage_words)
+    ranker = registry.get_ranker(model_name)
+
+    async def sequential(query, texts):
+        ranker.rerank(RerankRequest(query=query, passages=[{"id": str(i), "text": t} for i, t in enumerate(texts)]))
+
+    print(f"model={model_name} load={registry.load_info.get(model_name)} "
+          f"intra_op_threads={registry.intra_op_threads or 'mặc định'}")
+    print(f"passages={passages} words/passage={passage_words} rounds={rounds} window={window_ms}ms max_batch_pairs={max_batch_pairs}")
+    print(f"{'Mode':<10} | {'C':>4} | {'reranks/s':>11} | {'mean (ms)':>9} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | {'batch':>7}")
+    print("-" * 76)
+    # Làm nóng session ONNX (lần chạy đầu cấp phát bộ nhớ, chậm hơn hẳn)
+    for query, texts in requests[:3]:
+        asyncio.run(sequential(query, texts))
+    for concurrency in concurrency_levels:
+        base_mean = asyncio.run(measure("sequential", sequential, requests, concurrency, rounds))
+        batcher = RerankerService(registry, model_name, window_ms=window_ms, max_batch_pairs=max_batch_pairs)
+        batched_mean = asyncio.run(measure("batched", batcher.score, requests, concurrency, rounds, batcher))
+        batcher.executor.shutdown()
+        print(f"{'':<10} | {'':>4} | độ trễ trung bình thay đổi: {(batched_mean - base_mean) * 1000:+.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="ms-marco-TinyBERT-L-2-v2")
+    parser.add_argument("--cache-dir", default="/tmp")
+    parser.add_argument("--concurrency", default="1,4,16,32")
+    parser.add_argument("--passages", type=int, default=10)
+    parser.add_argument("--passage-words", type=int, default=120)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch-pairs", type=int, default=64)
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="0 = mặc định của ONNX Runtime")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(cache_dir=args.cache_dir, intra_op_threads=args.intra_op_threads)
+    run(
+        registry,
+        args.model,
+        [int(c) for c in args.concurrency.split(",")],
+        args.passages,
+        args.passage_words,
+        args.rounds,
+        args.window_ms,
+        args.max_batch_pairs
+    )
+
+
+if __name__ == "__main__":
+    main()
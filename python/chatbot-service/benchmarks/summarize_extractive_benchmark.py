@@ -0,0 +1,117 @@
+"""
+So sánh số lời gọi LLM và thời gian tóm tắt tài liệu dài:
+  - before: Summarizer map-reduce trên toàn bộ văn bản
+  - after:  lọc trích xuất TF-IDF (utils/extractive.py) trước bước MAP
+
+LLM giả lập trong process: mỗi lời gọi tốn --latency giây + --per-kchar giây cho mỗi 1000 ký tự prompt.
+
+Chạy: python benchmarks/summarize_extractive_benchmark.py --docs 5 --chars 400000 --ratio 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chains.summarizer import Summarizer
+from utils.extractive import select_passages
+
+TOPICS = [
+    "hệ thống phân tán cân bằng tải máy chủ độ trễ mạng",
+    "cơ sở dữ liệu chỉ mục truy vấn giao dịch khóa",
+    "học máy mô hình huấn luyện dữ liệu đánh giá",
+    "bảo mật xác thực mã hóa phân quyền người dùng",
+    "quản lý dự án tiến độ nhân sự rủi ro ngân sách",
+]
+FILLER = "và là của cho với trong được các những một này đó khi thì".split()
+
+
+def make_document(chars: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < chars:
+        topic = rng.choice(TOPICS).split()
+        for _ in range(rng.randint(20, 40)):
+            words = [rng.choice(topic if rng.random() < 0.4 else FILLER) for _ in range(rng.randint(8, 20))]
+            sentence = " ".join(words).capitalize() + "."
+            parts.append(sentence)
+            size += len(sentence) + 1
+        parts.append("\n")
+    return " ".join(parts)
+
+
+class FakeLLM:
+    model = "fake"
+
+    def __init__(self, latency: float, per_kchar: float):
+        self.latency = latency
+        self.per_kchar = per_kchar
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _cost(self, messages):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency + self.per_kchar * len(messages[0]["content"]) / 1000)
+
+    def chatWithOutStream(self, messages):
+        self._cost(messages)
+        return {"message": {"content": "- ý chính " * 30}}
+
+    def chat(self, messages):
+        self._cost(messages)
+        return iter([{"message": {"content": "Bản tóm tắt."}}])
+
+    async def achatWithOutStream(self, messages):
+        return await asyncio.to_thread(self.chatWithOutStream, messages)
+
+    async def achat(self, messages):
+        for chunk in await asyncio.to_thread(self.chat, messages):
+            yield chunk
+
+
+async def run(docs, extractive, ratio, latency, per_kchar):
+    llm = FakeLLM(latency, per_kchar)
+    summarizer = Summarizer(llm, extractive=extractive, extractive_ratio=ratio)
+    summarizer.stream_sections = False
+    start = time.perf_counter()
+    for doc in docs:
+        async for _ in summarizer.summarize([doc]):
+            pass
+    return llm.calls, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=5)
+    parser.add_argument("--chars", type=int, default=400000, help="Độ dài mỗi tài liệu (ký tự)")
+    parser.add_argument("--ratio", type=float, default=0.3, help="Tỉ lệ văn bản giữ lại sau khi lọc")
+    parser.add_argument("--latency", type=float, default=0.05, help="Độ trễ cố định mỗi lời gọi LLM (giây)")
+    parser.add_argument("--per-kchar", type=float, default=0.01, help="Chi phí mỗi 1000 ký tự prompt (giây)")
+    args = parser.parse_args()
+
+    docs = [make_document(args.chars, seed) for seed in range(args.docs)]
+
+    start = time.perf_counter()
+    for doc in docs:
+        select_passages(doc, int(len(doc) * args.ratio))
+    extract_time = time.perf_counter() - start
+
+    before_calls, before_time = asyncio.run(run(docs, False, args.ratio, args.latency, args.per_kchar))
+    after_calls, after_time = asyncio.run(run(docs, True, args.ratio, args.latency, args.per_kchar))
+
+    print(f"docs={args.docs} chars/doc={args.chars} ratio={args.ratio} latency={args.latency}s per_kchar={args.per_kchar}s")
+    print(f"{'Mode':<22} | {'LLM calls':>9} | {'Time (s)':>9}")
+    print("-" * 46)
+    print(f"{'before (full text)':<22} | {before_calls:>9} | {before_time:>9.2f}")
+    print(f"{'after (extractive)':<22} | {after_calls:>9} | {after_time:>9.2f}")
+    print(f"LLM calls giảm {1 - after_calls / before_calls:.0%}, thời gian giảm {1 - after_time / before_time:.0%} "
+          f"(trong đó lọc TF-IDF tốn {extract_time:.2f}s CPU cho {args.docs} tài liệu)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+So sánh lưu vector float32 / float16 / int8 (scale theo từng vector) trong backend local
+(services/local_vector_store.py): dung lượng dữ liệu phải quét mỗi truy vấn, độ trễ top-k
+và recall@k so với float32, có và không có bước chấm lại (rescore) bằng float32.
+
+Corpus:
+  - mặc định: vector tổng hợp phân cụm (giống embedding văn bản theo chủ đề);
+  - --collection: thư mục một collection thật đã ingest bằng VECTOR_BACKEND=local
+    (vd. vector_data/team_abc), truy vấn lấy từ chính các chunk + nhiễu nhỏ.
+
+Chạy: python benchmarks/vector_quantization_benchmark.py --n 50000 --dim 768 --queries 200 --k 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.hnsw_recall_benchmark import make_corpus
+from services.local_vector_store import LocalCollection
+
+
+def load_collection(directory: str) -> np.ndarray:
+    source = LocalCollection(os.path.basename(directory.rstrip("/")), directory)
+    slots = sorted(source.ids)
+    data = np.asarray(source.vectors[slots], dtype=np.float32)
+    source.db.close()
+    return data
+
+
+def build(data: np.ndarray, dtype: str, rescore_factor: int, directory: str) -> LocalCollection:
+    collection = LocalCollection("bench", directory, space="cosine", ann_min_rows=10 ** 12, dtype=dtype, rescore_factor=rescore_factor)
+    for start in range(0, len(data), 5000):
+        batch = data[start:start + 5000]
+        collection.upsert(
+            ids=[str(i) for i in range(start, start + len(batch))],
+            embeddings=batch,
+            metadatas=[{"source": "bench"}] * len(batch)
+        )
+    return collection
+
+
+def scan_bytes(collection: LocalCollection) -> int:
+    """Số byte phải đọc để quét toàn bộ collection (bản nén nếu có, ngược lại float32)."""
+    n = collection.count()
+    if collection.codes is None:
+        return n * collection.dim * 4
+    size = n * collection.dim * collection.codes.dtype.itemsize
+    if collection.scales is not None:
+        size += n * 4
+    return size
+
+
+def run(collection: LocalCollection, queries: np.ndarray, k: int):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        slots, _ = collection._top_k(query, k, None)
+        latencies.append(time.perf_counter() - start)
+        results.append(set(slots))
+    latencies.sort()
+    return results, latencies[len(latencies) // 2] * 1000, latencies[int(0.99 * (len(latencies) - 1))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", default=None, help="Thư mục collection local đã ingest (corpus thật)")
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.collection:
+        data = load_collection(args.collection)
+        corpus = args.collection
+    else:
+        data = make_corpus(args.n, args.dim, args.clusters)
+        corpus = "tổng hợp"
+    n, dim = data.shape
+    rng = np.random.default_rng(1)
+    queries = data[rng.choice(n, size=min(args.queries, n), replace=False)]
+    queries = queries + 0.05 * np.linalg.norm(queries, axis=1, keepdims=True) / np.sqrt(dim) * rng.normal(size=queries.shape).astype(np.float32)
+
+    print(f"corpus={corpus} n={n} dim={dim} queries={len(queries)} k={args.k}")
+    print(f"{'dtype':>8} | {'rescore':>7} | {'quét (MB)':>9} | {'tiết kiệm':>9} | {'recall@k':>8} | {'p50 (ms)':>8} | {'p99 (ms)':>8}")
+    print("-" * 76)
+    truth = None
+    base_bytes = None
+    with tempfile.TemporaryDirectory() as workdir:
+        for dtype, factor in (("float32", 1), ("float16", 1), ("float16", args.rescore_factor), ("int8", 1), ("int8", args.rescore_factor)):
+            collection = build(data, dtype, factor, os.path.join(workdir, f"{dtype}_{factor}"))
+            run(collection, queries[:5], args.k)  # làm nóng page cache
+            results, p50, p99 = run(collection, queries, args.k)
+            if truth is None:
+                truth, base_bytes = results, scan_bytes(collection)
+            recall = sum(len(a & b) for a, b in zip(truth, results)) / (args.k * len(queries))
+            size = scan_bytes(collection)
+            rescore = f"x{factor}" if dtype != "float32" else "-"
+            print(f"{dtype:>8} | {rescore:>7} | {size / 2 ** 20:>9.1f} | {1 - size / base_bytes:>8.0%} | {recall:>8.3f} | {p50:>8.2f} | {p99:>8.2f}")
+            collection.db.close()
+            collection._close_vectors()
+
+
+if __name__ == "__main__":
+    main()
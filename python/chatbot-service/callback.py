@@ -4,8 +4,9 @@ from aio_pika import Exchange, IncomingMessage, Channel, Message
 from services.vectorstore_service import VectorStoreService
 from services.minio_service import MinioService
 from chains.rag_chain import RAGChain
-from chains.summarizer import Summarizer
+from chains.summarizer import Summarizer, NO_CONTENT_MESSAGE, FAILED_MESSAGE
 from chains.task_architect import TaskArchitect
+from services.summary_store import SummaryStore
 from config import (
     EVENTS_EXCHANGE,
     ASK_QUESTION_ROUTING_KEY,
@@ -16,7 +17,11 @@ from config import (
     SUMMARIZE_DOCUMENT_ROUTING_KEY,
     STREAM_RESPONSE_ROUTING_KEY,
     SOCKET_EXCHANGE,
-    REDIS_HOST
+    REDIS_HOST,
+    INGESTION_REINGEST_MODE,
+    CHATBOT_EXCHANGE,
+    PRECOMPUTE_SUMMARY_ROUTING_KEY,
+    SUMMARY_REPLAY_CHUNK_CHARS
 )
 
 redis_client = redis.Redis(host=REDIS_HOST, port=6379, db=0)
@@ -152,14 +157,112 @@ async def send_status_file(channel: Channel, user_id, file_id, fileName,status,
     except Exception as e:
         print(f"Lỗi khi gửi thông báo: {e}")
 
+async def generate_summary(
+    summarizer: Summarizer,
+    summary_store: SummaryStore | None,
+    vectorstore_service: VectorStoreService,
+    user_id: str,
+    team_id: str | None,
+    file_name: str,
+    original_name: str | None
+):
+    """
+    Sinh bản tóm tắt dạng stream, từ các chunk đã lưu trong ChromaDB.
+    Bản lưu được gắn với phiên bản nội dung của chính các chunk đó (content_hash), model và cấu hình
+    Summarizer: có bản lưu thì phát lại từ Redis, ngược lại chạy Summarizer rồi lưu kết quả.
+    """
+    # Chỉ ingest (tải + parse) khi file chưa có chunk
+    collection_name = f"user_{user_id}" if team_id is None else f"team_{team_id}"
+    if not await vectorstore_service.has_chunks(collection_name, file_name):
+        await vectorstore_service.process_and_store(
+            user_id, 
+            file_name, 
+            search_exchange=SEARCH_EXCHANGE, 
+            team_id=team_id,
+            original_name=original_name
+        )
+        print(f"--> [VECTOR] Đã lưu xong!")
+
+    model = getattr(summarizer.llm_service, "model", "unknown")
+    settings = summarizer.settings_key
+    version = None
+    if summary_store is not None:
+        version = await vectorstore_service.content_version(collection_name, file_name)
+        if version:
+            cached = await summary_store.get(file_name, version, model, settings)
+            if cached is not None:
+                print(f"--> [SUMMARIZE CACHE HIT] Phát lại bản tóm tắt đã lưu của '{file_name}'.")
+                for start in range(0, len(cached), SUMMARY_REPLAY_CHUNK_CHARS):
+                    yield cached[start:start + SUMMARY_REPLAY_CHUNK_CHARS]
+                return
+
+    parts = []
+    report = {}
+    async for chunk in summarizer.summarize(vectorstore_service.iter_document_text(collection_name, file_name), report):
+        parts.append(chunk)
+        yield chunk
+
+    # Chỉ lưu bản tóm tắt đầy đủ: không lưu câu báo "không có nội dung"/"không thể tóm tắt",
+    # cũng không lưu khi có lời gọi MAP/COLLAPSE lỗi (bản tóm tắt thiếu phần)
+    summary = "".join(parts)
+    if report.get("failed_calls"):
+        print(f"--> [SUMMARIZE] {report['failed_calls']} lời gọi LLM lỗi, không lưu bản tóm tắt của '{file_name}'.")
+    elif summary_store is not None and version and summary not in (NO_CONTENT_MESSAGE, FAILED_MESSAGE):
+        # File được ingest lại trong lúc tóm tắt: văn bản đã đọc có thể lẫn hai phiên bản, không lưu
+        if await vectorstore_service.content_version(collection_name, file_name) == version:
+            await summary_store.put(file_name, version, model, summary, settings)
+
+async def request_summary_precompute(channel: Channel, user_id: str, team_id: str | None, storage_key: str, original_name: str | None):
+    """
+    Đẩy job tóm tắt sẵn (ưu tiên thấp) sau khi ingestion xong.
+    """
+    try:
+        exchange = await channel.get_exchange(CHATBOT_EXCHANGE)
+        body = {"userId": user_id, "teamId": team_id, "storageKey": storage_key, "originalName": original_name}
+        await exchange.publish(
+            Message(body=json.dumps(body).encode()),
+            routing_key=PRECOMPUTE_SUMMARY_ROUTING_KEY
+        )
+    except Exception as e:
+        print(f"--> [SUMMARIZE PRECOMPUTE] Không gửi được job tóm tắt sẵn: {e}")
+
+async def summary_precompute_callback(
+    message: IncomingMessage,
+    summarizer: Summarizer,
+    summary_store: SummaryStore,
+    vectorstore_service: VectorStoreService
+):
+    """
+    Callback tóm tắt sẵn tài liệu vừa ingest, kết quả chỉ lưu vào SummaryStore.
+    """
+    async with message.process():
+        try:
+            payload_dto = json.loads(message.body.decode())
+            storage_key = payload_dto.get('storageKey')
+            user_id = payload_dto.get('userId')
+            if not all([user_id, storage_key]):
+                raise ValueError("Payload thiếu userId hoặc storageKey.")
+
+            print(f"--> [SUMMARIZE PRECOMPUTE] Tóm tắt sẵn file '{storage_key}'...")
+            async for _ in generate_summary(
+                summarizer, summary_store, vectorstore_service,
+                user_id, payload_dto.get('teamId'), storage_key, payload_dto.get('originalName')
+            ):
+                pass
+            print(f"--> [SUMMARIZE PRECOMPUTE] Hoàn tất '{storage_key}'.")
+        except Exception as e:
+            print(f"--> [SUMMARIZE PRECOMPUTE ERROR] {e}")
+
 async def ingestion_callback(
     message: IncomingMessage, 
     vectorstore_service: VectorStoreService, 
     channel: Channel, 
-    search_exchange: Exchange
+    search_exchange: Exchange,
+    summary_precompute: bool = False
     ):
     """
     Callback xử lý các tác vụ nạp dữ liệu (ingestion).
+    summary_precompute: gửi job tóm tắt sẵn sau khi ingest xong (chỉ bật khi có summary store để lưu kết quả).
     """
     print(f"\n[INGESTION] Nhận được yêu cầu xử lý tài liệu mới...")
     user_id, file_name = None, None
@@ -185,10 +288,13 @@ async def ingestion_callback(
                 file_id=storage_key,
                 search_exchange=search_exchange,
                 team_id=team_id,
-                original_name=original_name
+                original_name=original_name,
+                reingest_mode=INGESTION_REINGEST_MODE
             )
             print(f"--> Xử lý file thành công!")
             await send_status_file(channel, user_id, file_id, original_name or storage_key, "completed", team_id)
+            if summary_precompute:
+                await request_summary_precompute(channel, user_id, team_id, storage_key, original_name)
 
         except Exception as e:
             error_message = str(e)
@@ -200,7 +306,7 @@ async def ingestion_callback(
                 team_id = payload_dto.get('teamId')
                 await send_status_file(channel, user_id, file_id ,original_name, "failed", team_id)
 
-async def action_callback(message: IncomingMessage, rag_chain: RAGChain, summarizer: Summarizer, suggest_summarizer: Summarizer, minio_service: MinioService, task_architect: TaskArchitect, vectorstore_service: VectorStoreService, channel: Channel):
+async def action_callback(message: IncomingMessage, rag_chain: RAGChain, summarizer: Summarizer, suggest_summarizer: Summarizer, minio_service: MinioService, task_architect: TaskArchitect, vectorstore_service: VectorStoreService, channel: Channel, summary_store: SummaryStore | None = None):
     """
     Callback xử lý các tác vụ tương tác (RAG, Summarize).
     """
@@ -264,15 +370,10 @@ async def action_callback(message: IncomingMessage, rag_chain: RAGChain, summari
                 print(f"--> [SUMMARIZE] Bắt đầu tóm tắt file '{file_name}' cho user '{user_id}'.")
                 
                 try:
-                    documents = await vectorstore_service.process_and_store(
-                        user_id, 
-                        file_name, 
-                        search_exchange=SEARCH_EXCHANGE, 
-                        team_id=team_id,
-                        original_name=original_name
-                    )
-                    print(f"--> [VECTOR] Đã lưu xong!")
-                    async for chunk in summarizer.summarize(documents):
+                    async for chunk in generate_summary(
+                        summarizer, summary_store, vectorstore_service,
+                        user_id, team_id, file_name, original_name
+                    ):
                         await publish_to_redis(discussion_id, chunk, is_completed=False)
                     await publish_to_redis(discussion_id, "", is_completed=True)
                 except Exception as e:
@@ -365,9 +466,9 @@ async def on_team_deleted(message: IncomingMessage, vector_store: VectorStoreSer
             
             print(f"[DELETE] Đang xóa collection: {collection_name}")
             
-            await vector_store.delete_collection(collection_name)
+            removed = await vector_store.delete_collection(collection_name)
             
-            print(f"[DELETE] Đã xóa thành công collection: {collection_name}")
+            print(f"[DELETE] Đã xóa thành công collection: {collection_name} ({removed} chunks)")
             
         except Exception as e:
             print(f"[DELETE] Lỗi nghiêm trọng khi xóa collection {collection_name}: {e}")
@@ -396,10 +497,9 @@ async def on_document_deleted(message: IncomingMessage, vector_store: VectorStor
             collection_name = f"user_{user_id}" if team_id is None else f"team_{team_id}"
             
             print(f"[DELETE] Đang xóa {len(storage_keys)} file khỏi collection: {collection_name}")
-            for key in storage_keys:
-                await vector_store.delete_documents_by_source(collection_name, key)
+            removed = await vector_store.delete_documents_by_sources(collection_name, storage_keys)
             
-            print(f"[DELETE] Xóa hoàn tất.")
+            print(f"[DELETE] Xóa hoàn tất: {removed} chunks của {len(storage_keys)} file.")
             
         except Exception as e:
             print(f"[DELETE] Lỗi nghiêm trọng khi xóa tài liệu lẻ: {e}")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import asyncio
+from contextvars import ContextVar
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from utils.history import format_chat_history
@@ -6,18 +7,24 @@ from typing import AsyncGenerator
 from services.llm_service import LLMService
 from services.vectorstore_service import VectorStoreService
 from services.retriever_service import RetrieverService
+from utils.rank_fusion import reciprocal_rank_fusion
+from config import HYBRID_SEARCH_ENABLED, RRF_K
 import functools
 
+# Mỗi message RabbitMQ được xử lý trong task riêng nên context được tách biệt
+# giữa các câu hỏi chạy song song trên cùng một RAGChain.
+_last_retrieved_context: ContextVar = ContextVar("last_retrieved_context", default=None)
+
 class RAGChain:
-    def __init__(self, llm_service: LLMService, vectorstore_service: VectorStoreService, retriever_service: RetrieverService, threadpool=None):
+    def __init__(self, llm_service: LLMService, vectorstore_service: VectorStoreService, retriever_service: RetrieverService, threadpool=None, hybrid: bool = HYBRID_SEARCH_ENABLED):
         self.llm_service = llm_service
         self.vectorstore_service = vectorstore_service
         self.retriever_service = retriever_service
         self.threadpool = threadpool 
-        self.last_retrieved_context = None
+        self.hybrid = hybrid and vectorstore_service.lexical is not None
         
     def clear_last_context(self):
-        self.last_retrieved_context = None
+        _last_retrieved_context.set(None)
 
     def _format_docs_for_context(self, docs):
         print("[RAG] Đang format context...")
@@ -40,7 +47,7 @@ class RAGChain:
     def _save_context_metadata(self, docs):
         formatted = []
         if not docs: 
-            self.last_retrieved_context = {}
+            _last_retrieved_context.set({})
             return
             
         for doc in docs:
@@ -72,24 +79,48 @@ class RAGChain:
             })
             
         print("[CONTEXT] Last retrieved context:", formatted)
-        self.last_retrieved_context = {
+        _last_retrieved_context.set({
             "retrieved_context": formatted
-        }
+        })
         
     def get_last_retrieved_context(self):
-        return self.last_retrieved_context if self.last_retrieved_context else []
+        last_retrieved_context = _last_retrieved_context.get()
+        return last_retrieved_context if last_retrieved_context else []
         
 
+    async def _retrieve(self, collection_name: str, question: str, file_ids: list | None, k: int = 10):
+        """
+        Tìm kiếm vector; khi bật tìm kiếm lai, chạy song song BM25 (bắt được mã ticket, UUID, tên riêng)
+        và gộp hai danh sách bằng reciprocal rank fusion.
+        """
+        dense_search = self.vectorstore_service.search(collection_name, question, k=k, file_ids=file_ids)
+        if not self.hybrid:
+            try:
+                return await dense_search
+            except Exception as e:
+                print(f"[RAG ERROR] Lỗi tìm kiếm vector (Ollama Embedding 500?): {e}")
+                return []
+
+        dense_docs, lexical_docs = await asyncio.gather(
+            dense_search,
+            self.vectorstore_service.lexical_search(collection_name, question, k=k, file_ids=file_ids),
+            return_exceptions=True
+        )
+        if isinstance(dense_docs, Exception):
+            print(f"[RAG ERROR] Lỗi tìm kiếm vector (Ollama Embedding 500?): {dense_docs}")
+            dense_docs = []
+        if isinstance(lexical_docs, Exception):
+            print(f"[RAG ERROR] Lỗi tìm kiếm BM25: {lexical_docs}")
+            lexical_docs = []
+        print(f"[RAG] Hybrid: {len(dense_docs)} vector + {len(lexical_docs)} BM25, gộp bằng RRF...")
+        return reciprocal_rank_fusion([dense_docs, lexical_docs], k=RRF_K, limit=k)
+
     async def ask_question_for_user(self, question: str, user_id: str, team_id: str | None, chat_history: list, file_ids: list = None):
         collection_name = f"user_{user_id}" if team_id is None else f"team_{team_id}"
         print(f"[RAG] Đang tìm kiếm trong collection: {collection_name}")
         if file_ids:
             print(f"[RAG] Filter theo file_ids: {file_ids}")
-        try:
-            raw_docs = await self.vectorstore_service.search(collection_name, question, k=10, file_ids=file_ids)
-        except Exception as e:
-            print(f"[RAG ERROR] Lỗi tìm kiếm vector (Ollama Embedding 500?): {e}")
-            raw_docs = []
+        raw_docs = await self._retrieve(collection_name, question, file_ids, k=10)
             
         if raw_docs:
             print(f"[RAG] Tìm thấy {len(raw_docs)} tài liệu. Đang Rerank...")
@@ -141,12 +172,7 @@ class RAGChain:
 
         print(f"[RAG] Đang trả lời câu hỏi...")
 
-        def run_chat_sync():
-            return self.llm_service.chat(messages)
-        
-        stream = await asyncio.to_thread(run_chat_sync)
-        
-        for chunk in stream:
+        async for chunk in self.llm_service.achat(messages):
             content = chunk.get('message', {}).get('content', '')
             if content:
                 print(content, end="", flush=True)
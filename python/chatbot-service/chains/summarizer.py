@@ -1,96 +1,282 @@
 import asyncio
 from services.llm_service import LLMService
+from utils.adaptive_limiter import AdaptiveLimiter
+from utils.extractive import select_passages
+from config import (
+    SUMMARIZE_TOKEN_BUDGET,
+    SUMMARIZE_MIN_CONCURRENCY,
+    SUMMARIZE_MAX_CONCURRENCY,
+    SUMMARIZE_TARGET_LATENCY,
+    SUMMARIZE_STREAM_SECTIONS,
+    SUMMARIZE_EXTRACTIVE,
+    SUMMARIZE_EXTRACTIVE_RATIO
+)
+
+CHARS_PER_TOKEN = 4
+MAX_REDUCE_LEVELS = 4
+
+STUFF_PROMPT = """
+    Bạn là chuyên gia phân tích. Hãy viết bản tóm tắt chi tiết, rành mạch bằng Markdown cho văn bản sau:
+    VĂN BẢN:
+    {text}
+    TÓM TẮT:
+"""
+
+# Ép đầu ra cực ngắn để tiết kiệm thời gian sinh token
+MAP_PROMPT = """
+    Trích xuất 5-10 ý chính quan trọng nhất dưới dạng đầu dòng cực ngắn gọn.
+    VĂN BẢN: "{text}"
+    TRẢ LỜI (Bullet points):
+"""
+
+COLLAPSE_PROMPT = """
+    Gộp các danh sách ý chính sau (theo thứ tự trong tài liệu) thành một danh sách 5-10 ý chính ngắn gọn, bỏ ý trùng lặp.
+    CÁC Ý CHÍNH:
+    {text}
+    TRẢ LỜI (Bullet points):
+"""
+
+REDUCE_PROMPT = """
+    Dựa trên các ý chính sau, hãy viết một bản tóm tắt tổng thể hoàn chỉnh bằng Markdown:
+    {text}
+    BẢN TÓM TẮT CUỐI CÙNG:
+"""
+
+
+NO_CONTENT_MESSAGE = "Không có nội dung để tóm tắt."
+FAILED_MESSAGE = "Không thể tóm tắt tài liệu này."
+
+
+def _document_texts(documents):
+    for doc in documents:
+        if hasattr(doc, 'page_content'):
+            yield doc.page_content
+        elif isinstance(doc, tuple) and len(doc) > 0:
+            yield str(doc[0])
+        elif isinstance(doc, str):
+            yield doc
+        elif isinstance(doc, dict) and 'page_content' in doc:
+            yield doc['page_content']
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+async def _chain(head, rest):
+    for item in head:
+        yield item
+    async for item in rest:
+        yield item
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng số token (~4 ký tự/token), đủ dùng để chia ngân sách prompt."""
+    return len(text) // CHARS_PER_TOKEN
+
 
 class Summarizer:
-    def __init__(self, llm_service: LLMService):
+    def __init__(
+        self,
+        llm_service: LLMService,
+        token_budget: int = SUMMARIZE_TOKEN_BUDGET,
+        extractive: bool = SUMMARIZE_EXTRACTIVE,
+        extractive_ratio: float = SUMMARIZE_EXTRACTIVE_RATIO
+    ):
         self.llm_service = llm_service
-        self.semaphore = asyncio.Semaphore(2)  # Giới hạn tối đa 2 task tóm tắt song song cho Ollama
-        
-    async def summarize(self, documents):
-        if not documents:
-            yield "Không có nội dung để tóm tắt."
+        self.token_budget = token_budget
+        self.extractive = extractive
+        self.extractive_ratio = extractive_ratio
+        self.stream_sections = SUMMARIZE_STREAM_SECTIONS
+        # Số lời gọi LLM song song tự điều chỉnh theo độ trễ của Ollama (AIMD)
+        self.limiter = AdaptiveLimiter(
+            min_limit=SUMMARIZE_MIN_CONCURRENCY,
+            max_limit=SUMMARIZE_MAX_CONCURRENCY,
+            target_latency=SUMMARIZE_TARGET_LATENCY,
+            initial=2
+        )
+
+    @property
+    def settings_key(self) -> str:
+        """Các cấu hình làm thay đổi nội dung bản tóm tắt (dùng trong key của SummaryStore)."""
+        extractive = f"{self.extractive_ratio}" if self.extractive else "off"
+        return f"budget={self.token_budget};extractive={extractive};sections={int(self.stream_sections)}"
+
+    async def summarize(self, documents, report: dict | None = None):
+        """
+        documents: list document (LangChain Document / str / dict / tuple) hoặc async iterable
+        các đoạn văn bản theo thứ tự (vd. VectorStoreService.iter_document_text).
+        Với nguồn dạng stream, bước MAP bắt đầu ngay khi đã đọc đủ một phần.
+        report: dict (tùy chọn) nhận "failed_calls" = số lời gọi MAP/COLLAPSE bị lỗi
+        (> 0 nghĩa là bản tóm tắt thiếu phần, không nên lưu lại).
+        """
+        report = report if report is not None else {}
+        report["failed_calls"] = 0
+        pieces = aiter(documents) if hasattr(documents, "__aiter__") else _iterate(_document_texts(documents or []))
+
+        # Đọc tới khi chắc chắn văn bản vượt ngân sách STUFF (hoặc hết)
+        stuff_chars = self._chars_for(STUFF_PROMPT)
+        head, head_size, exhausted = [], 0, True
+        async for piece in pieces:
+            head.append(piece)
+            head_size += len(piece) + 2
+            if head_size > stuff_chars:
+                exhausted = False
+                break
+
+        if not head:
+            yield NO_CONTENT_MESSAGE
             return
-        
-        text_parts = []
-        for doc in documents:
-            if hasattr(doc, 'page_content'):
-                text_parts.append(doc.page_content)
-            elif isinstance(doc, tuple) and len(doc) > 0:
-                text_parts.append(str(doc[0]))
-            elif isinstance(doc, str):
-                text_parts.append(doc)
-            elif isinstance(doc, dict) and 'page_content' in doc:
-                text_parts.append(doc['page_content'])
-                
-        full_text = "\n\n".join(text_parts)
-        text_len = len(full_text)
-        
-        # CHIẾN THUẬT 1: "STUFFING" - Nếu văn bản đủ nhỏ (< 20k ký tự), tóm tắt luôn trong 1 bước
-        if text_len < 20000:
-            print(f"--> [SUMMARIZE STUFF] Văn bản ngắn ({text_len} ký tự), tóm tắt trực tiếp...")
-            prompt = f"""
-                Bạn là chuyên gia phân tích. Hãy viết bản tóm tắt chi tiết, rành mạch bằng Markdown cho văn bản sau:
-                VĂN BẢN:
-                {full_text}
-                TÓM TẮT:
-            """
-            messages = [{"role": "user", "content": prompt}]
-            def run_stuff_sync():
-                return self.llm_service.chat(messages)
-            
-            stream = await asyncio.to_thread(run_stuff_sync)
-            for chunk in stream:
-                content = chunk.get('message', {}).get('content', '')
-                if content:
+
+        if exhausted or self.extractive:
+            if not exhausted:
+                head.extend([piece async for piece in pieces])
+            full_text = "\n\n".join(head)
+            text_len = len(full_text)
+
+            # Văn bản dài: giữ lại các câu tiêu biểu nhất trước khi gửi cho LLM (không tốn lời gọi LLM)
+            if self.extractive and not self._fits(full_text, STUFF_PROMPT):
+                budget_chars = max(stuff_chars, int(text_len * self.extractive_ratio))
+                full_text = await asyncio.to_thread(select_passages, full_text, budget_chars)
+                print(f"--> [SUMMARIZE EXTRACTIVE] Lọc còn {len(full_text)}/{text_len} ký tự.")
+                text_len = len(full_text)
+
+            # CHIẾN THUẬT 1: "STUFFING" - Nếu văn bản nằm trong ngân sách token, tóm tắt luôn trong 1 bước
+            if self._fits(full_text, STUFF_PROMPT):
+                print(f"--> [SUMMARIZE STUFF] Văn bản ngắn ({text_len} ký tự), tóm tắt trực tiếp...")
+                async for content in self._stream_chat(STUFF_PROMPT.format(text=full_text)):
                     yield content
-            return
+                return
+            source = _iterate([full_text])
+        else:
+            source = _chain(head, pieces)
 
-        # CHIẾN THUẬT 2: MAP-REDUCE TỐI ƯU
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
-        # Tăng chunk_size để giảm số lượng lần gọi LLM
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=20000, chunk_overlap=2000)
-        chunks = text_splitter.split_text(full_text)
-        
-        print(f"--> [SUMMARIZE MAP-REDUCE] Bước MAP: Tóm tắt {len(chunks)} Chunks với Semaphore...")
-        
-        # Ép đầu ra cực ngắn để tiết kiệm thời gian sinh token
-        map_prompt_template = """
-            Trích xuất 5-10 ý chính quan trọng nhất dưới dạng đầu dòng cực ngắn gọn.
-            VĂN BẢN: "{text}"
-            TRẢ LỜI (Bullet points):
+        async for content in self._map_reduce(source, report):
+            yield content
+
+    async def _map_reduce(self, pieces, report: dict):
         """
-        
-        async def map_chunk(chunk_text):
-            async with self.semaphore: # Chờ nếu đã có 2 task đang chạy
-                messages = [{"role": "user", "content": map_prompt_template.format(text=chunk_text)}]
-                try:
-                    response = await asyncio.to_thread(self.llm_service.chatWithOutStream, messages)
-                    return response.get('message', {}).get('content', '')
-                except Exception as e:
-                    print(f"[MAP ERROR] {e}")
-                    return ""
-
-        map_results = await asyncio.gather(*(map_chunk(chunk) for chunk in chunks))
-        combined_summaries = "\n---\n".join([res for res in map_results if res])
-
-        print(f"--> [SUMMARIZE MAP-REDUCE] Bước REDUCE: Tổng hợp kết quả...")
-        reduce_prompt = f"""
-            Dựa trên các ý chính sau, hãy viết một bản tóm tắt tổng thể hoàn chỉnh bằng Markdown:
-            {combined_summaries}
-            BẢN TÓM TẮT CUỐI CÙNG:
+        CHIẾN THUẬT 2: MAP-REDUCE NHIỀU TẦNG.
+        Văn bản được chia dần khi đọc; mỗi phần đủ lớn được MAP ngay (song song theo limiter)
+        và ý chính được phát ra theo thứ tự tài liệu.
         """
-        
-        reduce_messages = [{"role": "user", "content": reduce_prompt}]
-        def run_reduce_sync():
-            return self.llm_service.chat(reduce_messages)
-            
-        stream = await asyncio.to_thread(run_reduce_sync)
-        for chunk in stream:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        chunk_chars = self._chars_for(MAP_PROMPT)
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_chars, chunk_overlap=chunk_chars // 10)
+
+        print(f"--> [SUMMARIZE MAP-REDUCE] Bước MAP (limit={self.limiter.limit:.1f})...")
+
+        map_tasks = []
+        map_results = []
+        emitted = 0
+
+        def submit(chunks):
+            for chunk in chunks:
+                map_tasks.append(asyncio.create_task(self._complete(MAP_PROMPT.format(text=chunk), report)))
+
+        def section(index, result):
+            map_results.append(result)
+            return f"**Phần {index}**\n{result.strip()}\n\n"
+
+        try:
+            buffer = ""
+            async for piece in pieces:
+                buffer = f"{buffer}\n\n{piece}" if buffer else piece
+                if len(buffer) < 2 * chunk_chars:
+                    continue
+                # Chia văn bản dài tốn CPU, không chạy trên event loop; phần cuối giữ lại để nối tiếp
+                chunks = await asyncio.to_thread(text_splitter.split_text, buffer)
+                submit(chunks[:-1])
+                buffer = chunks[-1]
+                while emitted < len(map_tasks) and map_tasks[emitted].done():
+                    result = map_tasks[emitted].result()
+                    emitted += 1
+                    if result:
+                        text = section(emitted, result)
+                        if self.stream_sections:
+                            yield text
+            if buffer:
+                submit(await asyncio.to_thread(text_splitter.split_text, buffer))
+
+            print(f"--> [SUMMARIZE MAP-REDUCE] Đã chia {len(map_tasks)} phần, chờ MAP hoàn tất...")
+            while emitted < len(map_tasks):
+                result = await map_tasks[emitted]
+                emitted += 1
+                if result:
+                    text = section(emitted, result)
+                    if self.stream_sections:
+                        yield text
+        finally:
+            for task in map_tasks:
+                task.cancel()
+
+        if not map_results:
+            yield FAILED_MESSAGE
+            return
+        summaries = await self._reduce_until_fits(map_results, report)
+
+        print(f"--> [SUMMARIZE MAP-REDUCE] Bước REDUCE cuối: Tổng hợp {len(summaries)} bản tóm tắt...")
+        if self.stream_sections:
+            yield "---\n\n"
+        async for content in self._stream_chat(REDUCE_PROMPT.format(text="\n---\n".join(summaries))):
+            yield content
+
+    def _fits(self, text: str, template: str) -> bool:
+        return estimate_tokens(text) + estimate_tokens(template) <= self.token_budget
+
+    def _chars_for(self, template: str) -> int:
+        """Số ký tự văn bản tối đa để prompt dựng từ template không vượt ngân sách token."""
+        return max(1000, (self.token_budget - estimate_tokens(template)) * CHARS_PER_TOKEN)
+
+    async def _complete(self, prompt: str, report: dict) -> str:
+        messages = [{"role": "user", "content": prompt}]
+        try:
+            async with self.limiter():
+                response = await self.llm_service.achatWithOutStream(messages)
+            return response.get('message', {}).get('content', '')
+        except Exception as e:
+            print(f"[MAP ERROR] {e}")
+            report["failed_calls"] = report.get("failed_calls", 0) + 1
+            return ""
+
+    async def _stream_chat(self, prompt: str):
+        messages = [{"role": "user", "content": prompt}]
+        async for chunk in self.llm_service.achat(messages):
             content = chunk.get('message', {}).get('content', '')
             if content:
                 yield content
-                
-    
+
+    async def _reduce_until_fits(self, summaries: list[str], report: dict) -> list[str]:
+        """
+        Gộp dần các bản tóm tắt theo nhóm (mỗi nhóm vừa ngân sách token) cho tới khi
+        toàn bộ vừa một prompt REDUCE cuối cùng.
+        """
+        limit_chars = self._chars_for(REDUCE_PROMPT)
+        level = 1
+        while len(summaries) > 1 and len("\n---\n".join(summaries)) > limit_chars:
+            if level > MAX_REDUCE_LEVELS:
+                print(f"--> [SUMMARIZE MAP-REDUCE] Vượt {MAX_REDUCE_LEVELS} tầng, cắt bớt đầu vào REDUCE.")
+                return ["\n---\n".join(summaries)[:limit_chars]]
+
+            groups, current, size = [], [], 0
+            for summary in summaries:
+                if current and size + len(summary) > limit_chars:
+                    groups.append(current)
+                    current, size = [], 0
+                current.append(summary[:limit_chars])
+                size += len(current[-1]) + 5
+            if current:
+                groups.append(current)
+
+            print(f"--> [SUMMARIZE MAP-REDUCE] REDUCE tầng {level}: {len(summaries)} -> {len(groups)} nhóm...")
+            results = await asyncio.gather(*(
+                self._complete(COLLAPSE_PROMPT.format(text="\n---\n".join(group)), report) for group in groups
+            ))
+            summaries = [res for res in results if res] or summaries[:1]
+            level += 1
+        return summaries
+
     async def summarize_objective(self, objective: str) -> str:
         """
         Tóm tắt mục tiêu thành đúng 5 từ, không ký tự đặc biệt.
@@ -114,10 +300,7 @@ class Summarizer:
         messages = [{"role": "user", "content": prompt}]
         
         try:
-            response = await asyncio.to_thread(
-                self.llm_service.chatWithOutStream,
-                messages
-            )
+            response = await self.llm_service.achatWithOutStream(messages)
             
             content = response.get('message', {}).get('content', '')
             return content.strip()
@@ -1,8 +1,6 @@
-import asyncio
 from datetime import datetime
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from utils.stream_helper import stream_blocking_generator
 
 class TaskArchitect:
     def __init__(self, llm_service):
@@ -91,14 +89,9 @@ class TaskArchitect:
         ]
 
         print(f"--> [SUGGEST TASK] Đang gọi LLM (Native Ollama)...")
-        def run_chat_sync():
-            return self.llm_service.chat(messages)
-            
-        stream = await asyncio.to_thread(run_chat_sync)
         print(f"--> [SUGGEST TASK] Gợi ý task với mục tiêu: {objective}")
 
-
-        for chunk in stream:
+        async for chunk in self.llm_service.achat(messages):
             content = chunk.get('message', {}).get('content', '')
             if content:
                 print(f"Chunk: {content}", end="", flush=True)
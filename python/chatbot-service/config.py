@@ -6,6 +6,11 @@ RABBITMQ_QUEUE =    os.environ.get("RABBITMQ_QUEUE", "rag_requests")
 OLLAMA_BASE_URL =   os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL =      os.environ.get("OLLAMA_MODEL", "gemma3:4b")
 OLLAMA_EMBEDDING_MODEL = os.environ.get("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+# Client async tới Ollama: pool kết nối keep-alive dùng chung; timeout tính bằng giây
+# (read = thời gian chờ tối đa giữa hai lần nhận dữ liệu, kể cả giữa hai token khi stream)
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "10"))
+OLLAMA_READ_TIMEOUT =    float(os.environ.get("OLLAMA_READ_TIMEOUT", "300"))
 CHROMA_HOST =       os.environ.get("CHROMA_HOST", "localhost")
 GEMINI_API_KEY =    os.environ.get("GEMINI_API_KEY", "")
 GEMINI_MODEL =      os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
@@ -18,10 +23,115 @@ MINIO_BUCKET =      os.environ.get("MINIO_BUCKET_NAME", "documents")
 
 THREADPOOL_MAX_WORKERS = int(os.environ.get("THREADPOOL_MAX_WORKERS", "6"))
 
+# Mỗi consumer RabbitMQ có channel, prefetch và giới hạn xử lý song song riêng
+INGESTION_PREFETCH =    int(os.environ.get("INGESTION_PREFETCH", "4"))
+INGESTION_CONCURRENCY = int(os.environ.get("INGESTION_CONCURRENCY", "2"))
+RAG_PREFETCH =          int(os.environ.get("RAG_PREFETCH", "16"))
+RAG_CONCURRENCY =       int(os.environ.get("RAG_CONCURRENCY", "8"))
+SUMMARIZE_PREFETCH =    int(os.environ.get("SUMMARIZE_PREFETCH", "2"))
+SUMMARIZE_CONCURRENCY = int(os.environ.get("SUMMARIZE_CONCURRENCY", "2"))
+SUGGEST_PREFETCH =      int(os.environ.get("SUGGEST_PREFETCH", "4"))
+SUGGEST_CONCURRENCY =   int(os.environ.get("SUGGEST_CONCURRENCY", "2"))
+# Tổng số tác vụ dài (tóm tắt + gợi ý task) chạy cùng lúc; phần còn lại luôn dành cho chat
+BACKGROUND_LLM_CONCURRENCY = int(os.environ.get("BACKGROUND_LLM_CONCURRENCY", "2"))
+DELETE_PREFETCH =       int(os.environ.get("DELETE_PREFETCH", "8"))
+DELETE_CONCURRENCY =    int(os.environ.get("DELETE_CONCURRENCY", "4"))
+
+EMBEDDING_BATCH_SIZE =      int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "2"))
+INGESTION_QUEUE_SIZE =      int(os.environ.get("INGESTION_QUEUE_SIZE", "64"))
+CHROMA_UPSERT_BATCH_SIZE =  int(os.environ.get("CHROMA_UPSERT_BATCH_SIZE", "128"))
+PARSE_PROCESS_WORKERS =     int(os.environ.get("PARSE_PROCESS_WORKERS", "2"))
+PARSE_MAX_TASKS_PER_CHILD = int(os.environ.get("PARSE_MAX_TASKS_PER_CHILD", "50"))
+PDF_PAGES_PER_TASK =        int(os.environ.get("PDF_PAGES_PER_TASK", "16"))
+IN_MEMORY_PARSE_MAX_BYTES = int(os.environ.get("IN_MEMORY_PARSE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Backend lưu vector: chroma (ChromaDB server) | local (trong process, vector memory-mapped)
+VECTOR_BACKEND =            os.environ.get("VECTOR_BACKEND", "chroma")
+LOCAL_VECTOR_DIR =          os.environ.get("LOCAL_VECTOR_DIR", "vector_data")
+# Backend local: collection từ ngưỡng này trở lên dùng HNSW (nếu có hnswlib), nhỏ hơn thì top-k chính xác
+LOCAL_ANN_MIN_ROWS =        int(os.environ.get("LOCAL_ANN_MIN_ROWS", "50000"))
+# Backend local: lưu thêm bản nén của vector để quét top-k (float32 = không nén), chỉ áp dụng cho collection mới.
+# Top (k * LOCAL_RESCORE_FACTOR) ứng viên được chấm lại bằng vector float32 gốc.
+LOCAL_VECTOR_DTYPE =        os.environ.get("LOCAL_VECTOR_DTYPE", "float32")  # float32 | float16 | int8
+LOCAL_RESCORE_FACTOR =      int(os.environ.get("LOCAL_RESCORE_FACTOR", "4"))
+# Pool thread riêng cho các lời gọi ChromaDB và timeout mỗi lời gọi (giây)
+CHROMA_MAX_WORKERS =        int(os.environ.get("CHROMA_MAX_WORKERS", "8"))
+CHROMA_READ_TIMEOUT =       float(os.environ.get("CHROMA_READ_TIMEOUT", "15"))
+CHROMA_WRITE_TIMEOUT =      float(os.environ.get("CHROMA_WRITE_TIMEOUT", "120"))
+# Tham số index HNSW khi tạo collection mới (collection đã tồn tại giữ cấu hình cũ)
+CHROMA_HNSW_SPACE =             os.environ.get("CHROMA_HNSW_SPACE", "cosine")  # cosine | l2 | ip
+CHROMA_HNSW_M =                 int(os.environ.get("CHROMA_HNSW_M", "16"))
+CHROMA_HNSW_CONSTRUCTION_EF =   int(os.environ.get("CHROMA_HNSW_CONSTRUCTION_EF", "200"))
+CHROMA_HNSW_SEARCH_EF =         int(os.environ.get("CHROMA_HNSW_SEARCH_EF", "64"))
+# Manifest file đã ingest trong Redis (kiểm tra "đã index" O(1), liệt kê file, phát hiện model embedding cũ)
+INGEST_MANIFEST_ENABLED =   os.environ.get("INGEST_MANIFEST_ENABLED", "true").lower() in ("1","true","yes")
+# Số file (source) mỗi lô khi xóa hàng loạt
+CHROMA_DELETE_BATCH_SIZE =  int(os.environ.get("CHROMA_DELETE_BATCH_SIZE", "100"))
+# Cache collection handle trong process; "chưa tồn tại" được cache ngắn hơn
+COLLECTION_CACHE_TTL =      float(os.environ.get("COLLECTION_CACHE_TTL", "300"))
+COLLECTION_NEGATIVE_TTL =   float(os.environ.get("COLLECTION_NEGATIVE_TTL", "30"))
+# Số chunk_id mỗi lần đọc lại chunk từ ChromaDB (luồng tóm tắt)
+CHUNK_READ_PAGE_SIZE =      int(os.environ.get("CHUNK_READ_PAGE_SIZE", "200"))
+# skip | diff | full: cách xử lý khi file được nạp lại mà đã có chunk trong ChromaDB
+INGESTION_REINGEST_MODE =   os.environ.get("INGESTION_REINGEST_MODE", "diff")
+# Tìm kiếm lai: BM25 (SQLite FTS5, mỗi collection một file) song song với vector, gộp bằng reciprocal rank fusion
+HYBRID_SEARCH_ENABLED =     os.environ.get("HYBRID_SEARCH_ENABLED", "true").lower() in ("1","true","yes")
+LEXICAL_INDEX_DIR =         os.environ.get("LEXICAL_INDEX_DIR", "lexical_data")
+RRF_K =                     int(os.environ.get("RRF_K", "60"))
+# Rerank: gom yêu cầu của các câu hỏi đến cùng lúc (cửa sổ tính bằng ms) thành một lần chạy ONNX,
+# tối đa RERANK_MAX_BATCH_PAIRS cặp (câu hỏi, đoạn văn) mỗi lần
+RERANK_BATCH_WINDOW_MS =    float(os.environ.get("RERANK_BATCH_WINDOW_MS", "5"))
+RERANK_MAX_BATCH_PAIRS =    int(os.environ.get("RERANK_MAX_BATCH_PAIRS", "64"))
+# Model ONNX (FlashRank) dùng chung trong process: mỗi model chỉ tải một lần (models/registry.py)
+RERANK_MODEL =              os.environ.get("RERANK_MODEL", "ms-marco-TinyBERT-L-2-v2")
+FLASHRANK_CACHE_DIR =       os.environ.get("FLASHRANK_CACHE_DIR", "/tmp")
+# true: tải model ngay khi khởi động; false: tải ở lần rerank đầu tiên
+MODEL_WARMUP =              os.environ.get("MODEL_WARMUP", "true").lower() in ("1","true","yes")
+# Số thread ONNX Runtime trong một phép toán (intra) / giữa các nhánh song song của graph (inter); 0 = mặc định
+ONNX_INTRA_OP_THREADS =     int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))
+ONNX_INTER_OP_THREADS =     int(os.environ.get("ONNX_INTER_OP_THREADS", "0"))
+
+CACHE_DIR =                     os.environ.get("CACHE_DIR", ".cache")
+EMBEDDING_CACHE_ENABLED =       os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1","true","yes")
+EMBEDDING_CACHE_PATH =          os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES =   int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+EMBEDDING_CACHE_REDIS_URL =     os.environ.get("EMBEDDING_CACHE_REDIS_URL", "")
+EMBEDDING_CACHE_REDIS_TTL =     int(os.environ.get("EMBEDDING_CACHE_REDIS_TTL", str(7 * 24 * 3600)))
+# Cache embedding câu hỏi RAG: LRU trong process + Redis (tùy chọn), key = model + câu hỏi đã chuẩn hóa
+QUERY_EMBEDDING_CACHE_ENABLED = os.environ.get("QUERY_EMBEDDING_CACHE_ENABLED", "true").lower() in ("1","true","yes")
+QUERY_EMBEDDING_CACHE_REDIS =   os.environ.get("QUERY_EMBEDDING_CACHE_REDIS", "true").lower() in ("1","true","yes")
+QUERY_EMBEDDING_CACHE_SIZE =    int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL =     int(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", str(24 * 3600)))
+SUMMARY_CACHE_ENABLED =         os.environ.get("SUMMARY_CACHE_ENABLED", "true").lower() in ("1","true","yes")
+SUMMARY_CACHE_TTL =             int(os.environ.get("SUMMARY_CACHE_TTL", str(30 * 24 * 3600)))
+SUMMARY_REPLAY_CHUNK_CHARS =    int(os.environ.get("SUMMARY_REPLAY_CHUNK_CHARS", "200"))
+# Tóm tắt sẵn ngay sau khi ingestion xong (chạy ở lane ưu tiên thấp, concurrency 1)
+SUMMARY_PRECOMPUTE =            os.environ.get("SUMMARY_PRECOMPUTE", "false").lower() in ("1","true","yes")
+# Tóm tắt: ngân sách token cho mỗi prompt (ước lượng ~4 ký tự/token) và giới hạn song song tự điều chỉnh
+SUMMARIZE_TOKEN_BUDGET =        int(os.environ.get("SUMMARIZE_TOKEN_BUDGET", "6000"))
+SUMMARIZE_MIN_CONCURRENCY =     int(os.environ.get("SUMMARIZE_MIN_CONCURRENCY", "1"))
+SUMMARIZE_MAX_CONCURRENCY =     int(os.environ.get("SUMMARIZE_MAX_CONCURRENCY", "4"))
+SUMMARIZE_TARGET_LATENCY =      float(os.environ.get("SUMMARIZE_TARGET_LATENCY", "30"))
+# Phát ý chính của từng phần về discussion ngay khi map xong (theo thứ tự tài liệu)
+SUMMARIZE_STREAM_SECTIONS =     os.environ.get("SUMMARIZE_STREAM_SECTIONS", "true").lower() in ("1","true","yes")
+# Lọc trích xuất (TF-IDF, chỉ CPU) trước bước MAP: giữ lại tỉ lệ văn bản tiêu biểu nhất
+SUMMARIZE_EXTRACTIVE =          os.environ.get("SUMMARIZE_EXTRACTIVE", "false").lower() in ("1","true","yes")
+SUMMARIZE_EXTRACTIVE_RATIO =    float(os.environ.get("SUMMARIZE_EXTRACTIVE_RATIO", "0.3"))
+PARSED_CACHE_ENABLED =          os.environ.get("PARSED_CACHE_ENABLED", "true").lower() in ("1","true","yes")
+PARSED_CACHE_DIR =              os.environ.get("PARSED_CACHE_DIR", os.path.join(CACHE_DIR, "parsed"))
+PARSED_CACHE_MAX_BYTES =        int(os.environ.get("PARSED_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# File có nội dung text lớn hơn ngưỡng này không được đưa vào cache (tránh giữ quá nhiều trong RAM khi parse)
+PARSED_CACHE_MAX_ENTRY_CHARS =  int(os.environ.get("PARSED_CACHE_MAX_ENTRY_CHARS", str(32 * 1024 * 1024)))
+
+METRICS_REDIS_KEY =         os.environ.get("METRICS_REDIS_KEY", "chatbot:metrics")
+METRICS_INTERVAL_SECONDS =  float(os.environ.get("METRICS_INTERVAL_SECONDS", "60"))
+
 INGESTION_QUEUE = "ingestion_queue"
 REMOVE_QUEUE = "remove_queue"
 SUGGEST_QUEUE = "suggest_task_queue"
 RAG_QUEUE = "rag_queue"
+SUMMARIZE_QUEUE = "summarize_queue"
+SUMMARY_PRECOMPUTE_QUEUE = "summary_precompute_queue"
 SEARCH_EXCHANGE = "search_exchange"
 INDEX_DOCUMENT_CHUNK_ROUTING_KEY = "index.document.chunk"
 DELETE_DOCUMENT_INDEX_ROUTING_KEY = "delete.document.index"
@@ -29,6 +139,7 @@ DELETE_DOCUMENT_INDEX_ROUTING_KEY = "delete.document.index"
 CHATBOT_EXCHANGE = os.getenv("CHATBOT_EXCHANGE", "chatbot_exchange")
 ASK_QUESTION_ROUTING_KEY = os.getenv("ASK_QUESTION_ROUTING_KEY", "ask_question")
 SUMMARIZE_DOCUMENT_ROUTING_KEY = os.getenv("SUMMARIZE_DOCUMENT_ROUTING_KEY", "summarize_document")
+PRECOMPUTE_SUMMARY_ROUTING_KEY = os.getenv("PRECOMPUTE_SUMMARY_ROUTING_KEY", "precompute_summary")
 SOCKET_EXCHANGE = os.getenv("SOCKET_EXCHANGE", "socket_exchange")
 EVENTS_EXCHANGE = os.getenv("EVENTS_EXCHANGE", "events_exchange")
 TASK_EXCHANGE = os.getenv("TASK_EXCHANGE", "task_exchange")
@@ -12,23 +12,52 @@ from config import (
     INGESTION_QUEUE,
     REMOVE_QUEUE,
     RAG_QUEUE,
+    SUMMARIZE_QUEUE,
+    SUMMARY_PRECOMPUTE_QUEUE,
+    PRECOMPUTE_SUMMARY_ROUTING_KEY,
+    SUMMARY_CACHE_ENABLED,
+    SUMMARY_PRECOMPUTE,
+    INGEST_MANIFEST_ENABLED,
+    HYBRID_SEARCH_ENABLED,
+    QUERY_EMBEDDING_CACHE_ENABLED,
+    QUERY_EMBEDDING_CACHE_REDIS,
+    MODEL_WARMUP,
     CHATBOT_EXCHANGE,
     ASK_QUESTION_ROUTING_KEY,
     SUMMARIZE_DOCUMENT_ROUTING_KEY,
     PROCESS_DOCUMENT_ROUTING_KEY,
     REMOVE_TEAM_ROUTING_KEY,
-    DELETE_DOCUMENT_ROUTING_KEY
+    DELETE_DOCUMENT_ROUTING_KEY,
+    METRICS_REDIS_KEY,
+    METRICS_INTERVAL_SECONDS,
+    INGESTION_PREFETCH,
+    INGESTION_CONCURRENCY,
+    RAG_PREFETCH,
+    RAG_CONCURRENCY,
+    SUMMARIZE_PREFETCH,
+    SUMMARIZE_CONCURRENCY,
+    SUGGEST_PREFETCH,
+    SUGGEST_CONCURRENCY,
+    BACKGROUND_LLM_CONCURRENCY,
+    DELETE_PREFETCH,
+    DELETE_CONCURRENCY
 )
-from callback import ingestion_callback, action_callback, on_team_deleted, on_document_deleted
+from callback import ingestion_callback, action_callback, summary_precompute_callback, on_team_deleted, on_document_deleted, redis_client
 from services.llm_service import LLMService
 from services.gemini_service import GeminiService
 from services.minio_service import MinioService
 from services.vectorstore_service import VectorStoreService
 from services.retriever_service import RetrieverService
+from services.summary_store import SummaryStore
+from services.ingest_manifest import IngestManifest
+from services.lexical_index import LexicalIndex
+from services.query_embedding_cache import QueryEmbeddingCache
 from chains.rag_chain import RAGChain
 from chains.summarizer import Summarizer
 from chains.task_architect import TaskArchitect
-from models.reranker import FlashRankRerank
+from models.registry import model_registry
+from utils.metrics import report_metrics, register_metrics
+from utils.consumer import WorkerLane
 
 threadpool = ThreadPoolExecutor(max_workers=THREADPOOL_MAX_WORKERS)
 
@@ -38,73 +67,133 @@ async def main():
     llm_service = LLMService()
     gemini_service = GeminiService()
     minio_service = MinioService()
-    vectorstore_service = VectorStoreService(llm_service, minio_service) 
+    ingest_manifest = None
+    if INGEST_MANIFEST_ENABLED:
+        ingest_manifest = IngestManifest(redis_client)
+        register_metrics("ingest_manifest", ingest_manifest.stats)
+    lexical_index = None
+    if HYBRID_SEARCH_ENABLED:
+        lexical_index = LexicalIndex()
+        register_metrics("lexical_index", lexical_index.stats)
+    query_cache = None
+    if QUERY_EMBEDDING_CACHE_ENABLED:
+        query_cache = QueryEmbeddingCache(redis_client if QUERY_EMBEDDING_CACHE_REDIS else None)
+        register_metrics("query_embedding_cache", query_cache.stats)
+    vectorstore_service = VectorStoreService(
+        llm_service,
+        minio_service,
+        manifest=ingest_manifest,
+        lexical=lexical_index,
+        query_cache=query_cache
+    )
+    register_metrics("collection_cache", vectorstore_service.get_collection_cache_stats)
 
-    reranker = None
-    try:
-        print("⚡ Đang tải FlashRank Reranker (ONNX)...")
-        reranker = FlashRankRerank() 
-        print("✅ Tải Reranker thành công!")
-    except Exception as e:
-        print(f"⚠️ Không load được FlashRank, sẽ chạy chế độ không Rerank: {e}")
-        reranker = None
+    reranker_ready = True
+    if MODEL_WARMUP:
+        try:
+            print("⚡ Đang tải FlashRank Reranker (ONNX)...")
+            model_registry.warm_up()
+            print("✅ Tải Reranker thành công!")
+        except Exception as e:
+            print(f"⚠️ Không load được FlashRank, sẽ chạy chế độ không Rerank: {e}")
+            reranker_ready = False
+    register_metrics("models", model_registry.stats)
 
     retriever_service = RetrieverService(
         embeddings=llm_service,
-        use_reranker=(reranker is not None)
+        use_reranker=reranker_ready
     )
+    if retriever_service.use_reranker:
+        register_metrics("reranker", retriever_service.reranker.stats)
 
     rag_chain = RAGChain(llm_service, vectorstore_service, retriever_service, threadpool=threadpool)
     summarizer = Summarizer(llm_service)
     suggest_summarizer = Summarizer(gemini_service)
     task_architect = TaskArchitect(gemini_service)
+    register_metrics("summarize_limiter", summarizer.limiter.stats)
+    summary_store = None
+    if SUMMARY_CACHE_ENABLED:
+        summary_store = SummaryStore(redis_client)
+        register_metrics("summary_store", summary_store.stats)
+    # Tóm tắt sẵn cần summary store để lưu kết quả; không có thì không gửi job (queue sẽ không ai đọc)
+    summary_precompute = SUMMARY_PRECOMPUTE and summary_store is not None
+    if SUMMARY_PRECOMPUTE and summary_store is None:
+        print("⚠️ SUMMARY_PRECOMPUTE bật nhưng không có summary store (SUMMARY_CACHE_ENABLED=false), bỏ qua tóm tắt sẵn.")
     
     print("✅ Khởi tạo toàn bộ service hoàn tất.")
 
     connection = await connect_robust(RABBITMQ_URL)
     async with connection:
-        channel = await connection.channel()
-        await channel.set_qos(prefetch_count=1)
+        # Mỗi consumer một channel riêng với prefetch riêng, để ingestion chậm
+        # không chặn việc giao câu hỏi RAG (và ngược lại).
+        ingestion_channel = await connection.channel()
+        await ingestion_channel.set_qos(prefetch_count=INGESTION_PREFETCH)
+        rag_channel = await connection.channel()
+        await rag_channel.set_qos(prefetch_count=RAG_PREFETCH)
+        summarize_channel = await connection.channel()
+        await summarize_channel.set_qos(prefetch_count=SUMMARIZE_PREFETCH)
+        precompute_channel = await connection.channel()
+        await precompute_channel.set_qos(prefetch_count=1)
+        suggest_channel = await connection.channel()
+        await suggest_channel.set_qos(prefetch_count=SUGGEST_PREFETCH)
+        delete_team_channel = await connection.channel()
+        await delete_team_channel.set_qos(prefetch_count=DELETE_PREFETCH)
+        delete_doc_channel = await connection.channel()
+        await delete_doc_channel.set_qos(prefetch_count=DELETE_PREFETCH)
 
-        chatbot_exchange = await channel.declare_exchange(
+        chatbot_exchange = await ingestion_channel.declare_exchange(
             CHATBOT_EXCHANGE, 
             type= ExchangeType.DIRECT, 
             durable=True
         )
         
-        search_exchange = await channel.declare_exchange(
+        search_exchange = await ingestion_channel.declare_exchange(
             SEARCH_EXCHANGE,
             type=ExchangeType.DIRECT,
             durable=True
         )
         
-        events_exchange = await channel.declare_exchange(
+        events_exchange = await ingestion_channel.declare_exchange(
             EVENTS_EXCHANGE,
             type=ExchangeType.TOPIC,
             durable=True
         )
 
-        ingestion_queue = await channel.declare_queue(INGESTION_QUEUE, durable=True)
+        ingestion_queue = await ingestion_channel.declare_queue(INGESTION_QUEUE, durable=True)
         await ingestion_queue.bind(chatbot_exchange, routing_key=PROCESS_DOCUMENT_ROUTING_KEY)
 
-        delete_team_queue = await channel.declare_queue("delete_team_queue", durable=True)
+        delete_team_queue = await delete_team_channel.declare_queue("delete_team_queue", durable=True)
         await delete_team_queue.bind(events_exchange, routing_key=REMOVE_TEAM_ROUTING_KEY)
 
-        delete_doc_queue = await channel.declare_queue("delete_doc_queue", durable=True)
+        delete_doc_queue = await delete_doc_channel.declare_queue("delete_doc_queue", durable=True)
         await delete_doc_queue.bind(events_exchange, routing_key=DELETE_DOCUMENT_ROUTING_KEY)
 
-        rag_queue = await channel.declare_queue(RAG_QUEUE, durable=True)
+        # Mỗi loại action một queue riêng để tóm tắt dài không chắn trước câu hỏi chat.
+        # Gỡ các binding cũ của rag_queue (trước đây nhận cả 3 routing key).
+        rag_queue = await rag_channel.declare_queue(RAG_QUEUE, durable=True)
         await rag_queue.bind(chatbot_exchange, routing_key=ASK_QUESTION_ROUTING_KEY)
-        await rag_queue.bind(chatbot_exchange, routing_key=SUMMARIZE_DOCUMENT_ROUTING_KEY)
-        await rag_queue.bind(chatbot_exchange, routing_key=SUGGEST_TASK_ROUTING_KEY)
+        await rag_queue.unbind(chatbot_exchange, routing_key=SUMMARIZE_DOCUMENT_ROUTING_KEY)
+        await rag_queue.unbind(chatbot_exchange, routing_key=SUGGEST_TASK_ROUTING_KEY)
+
+        summarize_queue = await summarize_channel.declare_queue(SUMMARIZE_QUEUE, durable=True)
+        await summarize_queue.bind(chatbot_exchange, routing_key=SUMMARIZE_DOCUMENT_ROUTING_KEY)
+
+        # Job tóm tắt sẵn sau ingestion: queue riêng, ưu tiên thấp; chỉ khai báo khi có consumer (cần summary store)
+        if summary_store is not None:
+            precompute_queue = await precompute_channel.declare_queue(SUMMARY_PRECOMPUTE_QUEUE, durable=True)
+            await precompute_queue.bind(chatbot_exchange, routing_key=PRECOMPUTE_SUMMARY_ROUTING_KEY)
+
+        suggest_queue = await suggest_channel.declare_queue(SUGGEST_QUEUE, durable=True)
+        await suggest_queue.bind(chatbot_exchange, routing_key=SUGGEST_TASK_ROUTING_KEY)
 
         print("-- Kết nối RabbitMQ thành công, khởi tạo consumer...")
 
         ingestion_consumer = partial(
             ingestion_callback, 
             vectorstore_service=vectorstore_service, 
-            channel=channel,
-            search_exchange=search_exchange
+            channel=ingestion_channel,
+            search_exchange=search_exchange,
+            summary_precompute=summary_precompute
         )
         action_consumer = partial(
             action_callback, 
@@ -114,7 +203,13 @@ async def main():
             minio_service=minio_service,
             task_architect=task_architect,
             vectorstore_service=vectorstore_service,
-            channel=channel
+            summary_store=summary_store
+        )
+        precompute_consumer = partial(
+            summary_precompute_callback,
+            summarizer=summarizer,
+            summary_store=summary_store,
+            vectorstore_service=vectorstore_service
         )
         remove_team_consumer = partial(
             on_team_deleted, 
@@ -125,19 +220,49 @@ async def main():
             vector_store=vectorstore_service,
         )
 
-        await ingestion_queue.consume(ingestion_consumer)
-        await rag_queue.consume(action_consumer)
-        await delete_team_queue.consume(remove_team_consumer)
-        await delete_doc_queue.consume(remove_doc_consumer)
+        # Tóm tắt và gợi ý task dùng chung BACKGROUND_LLM_CONCURRENCY slot,
+        # chat có ngân sách riêng nên luôn được phục vụ kể cả khi tóm tắt bị dồn ứ.
+        background_llm = asyncio.Semaphore(BACKGROUND_LLM_CONCURRENCY)
+        lanes = {
+            "ingestion": WorkerLane("ingestion", INGESTION_CONCURRENCY),
+            "chat": WorkerLane("chat", RAG_CONCURRENCY),
+            "summarize": WorkerLane("summarize", SUMMARIZE_CONCURRENCY, shared=background_llm),
+            "suggest": WorkerLane("suggest", SUGGEST_CONCURRENCY, shared=background_llm),
+            "summary_precompute": WorkerLane("summary_precompute", 1, shared=background_llm),
+            "delete_team": WorkerLane("delete_team", DELETE_CONCURRENCY),
+            "delete_doc": WorkerLane("delete_doc", DELETE_CONCURRENCY),
+        }
+        for name, lane in lanes.items():
+            register_metrics(f"lane_{name}", lane.stats)
+
+        await ingestion_queue.consume(lanes["ingestion"].wrap(ingestion_consumer))
+        await rag_queue.consume(lanes["chat"].wrap(partial(action_consumer, channel=rag_channel)))
+        await summarize_queue.consume(lanes["summarize"].wrap(partial(action_consumer, channel=summarize_channel)))
+        if summary_store is not None:
+            await precompute_queue.consume(lanes["summary_precompute"].wrap(precompute_consumer))
+        await suggest_queue.consume(lanes["suggest"].wrap(partial(action_consumer, channel=suggest_channel)))
+        await delete_team_queue.consume(lanes["delete_team"].wrap(remove_team_consumer))
+        await delete_doc_queue.consume(lanes["delete_doc"].wrap(remove_doc_consumer))
         
         print(f"[*] Đã kết nối tới RabbitMQ. Đang lắng nghe trên các hàng đợi:")
-        print(f"  - {INGESTION_QUEUE} (Xử lý tài liệu)")
-        print(f"  - {RAG_QUEUE} (Hỏi đáp & Tóm tắt)")
+        print(f"  - {INGESTION_QUEUE} (Xử lý tài liệu, prefetch={INGESTION_PREFETCH}, song song={INGESTION_CONCURRENCY})")
+        print(f"  - {RAG_QUEUE} (Hỏi đáp, prefetch={RAG_PREFETCH}, song song={RAG_CONCURRENCY})")
+        print(f"  - {SUMMARIZE_QUEUE} (Tóm tắt, song song={SUMMARIZE_CONCURRENCY})")
+        if summary_store is not None:
+            print(f"  - {SUMMARY_PRECOMPUTE_QUEUE} (Tóm tắt sẵn sau ingestion, song song=1)")
+        print(f"  - {SUGGEST_QUEUE} (Gợi ý nhiệm vụ, song song={SUGGEST_CONCURRENCY})")
         print(f"  - delete_team_queue (Xóa toàn bộ collection)")
         print(f"  - delete_doc_queue (Xóa các tệp con riêng lẻ)")
-        print(f"  - {SUGGEST_QUEUE} (Gợi ý nhiệm vụ)")
         print(" [*] Bắt đầu lắng nghe. Để thoát, nhấn CTRL+C")
-        await asyncio.Future()
+        metrics_task = asyncio.create_task(
+            report_metrics(redis_client, METRICS_REDIS_KEY, METRICS_INTERVAL_SECONDS)
+        )
+        try:
+            await asyncio.Future()
+        finally:
+            # Dừng vòng báo cáo metrics trước khi đóng kết nối (CTRL+C / hủy main)
+            metrics_task.cancel()
+            await asyncio.gather(metrics_task, return_exceptions=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from pathlib import Path
+import onnxruntime as ort
+from flashrank import Ranker
+from flashrank.Config import listwise_rankers, model_file_map
+from config import FLASHRANK_CACHE_DIR, ONNX_INTER_OP_THREADS, ONNX_INTRA_OP_THREADS, RERANK_MODEL
+
+
+def _rss_bytes() -> int:
+    """RSS hiện tại của process (đọc /proc/self/status, Linux), 0 nếu không đọc được."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class _OnnxRanker(Ranker):
+    """
+    flashrank.Ranker nhưng tạo InferenceSession với SessionOptions truyền vào (số thread ONNX Runtime).
+    Ranker gốc luôn dùng option mặc định nên phần khởi tạo được viết lại; rerank/tokenizer giữ nguyên.
+    Dùng phần nội bộ của flashrank (_prepare_model_dir, _get_tokenizer, model_file_map):
+    viết theo flashrank 0.2.10, phiên bản được cố định trong requirements.txt.
+    """
+    def __init__(self, model_name: str, cache_dir: str, session_options: ort.SessionOptions, max_length: int = 512):
+        if model_name in listwise_rankers:
+            raise ValueError(f"Model {model_name} không phải ONNX, registry chưa hỗ trợ")
+        self.logger = logging.getLogger("flashrank.Ranker")
+        self.cache_dir = Path(cache_dir)
+        self.model_dir = self.cache_dir / model_name
+        self._prepare_model_dir(model_name)
+        self.llm_model = None
+        self.session = ort.InferenceSession(str(self.model_dir / model_file_map[model_name]), sess_options=session_options)
+        self.tokenizer = self._get_tokenizer(max_length)
+
+
+class ModelRegistry:
+    """
+    Model ONNX dùng chung trong process: mỗi model chỉ tải một lần (lần get đầu tiên hoặc warm_up),
+    mọi thành phần dùng model (RerankerService, benchmark...) nhận cùng một instance.
+    Ghi lại thời gian tải và RSS tăng thêm khi tải từng model (model đầu tiên gồm cả phần khởi tạo ONNX Runtime).
+    """
+    def __init__(
+        self,
+        cache_dir: str = FLASHRANK_CACHE_DIR,
+        intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+        inter_op_threads: int = ONNX_INTER_OP_THREADS
+    ):
+        self.cache_dir = cache_dir
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.lock = threading.Lock()
+        self.models = {}
+        self.load_info = {}
+
+    def _session_options(self) -> ort.SessionOptions:
+        options = ort.SessionOptions()
+        if self.intra_op_threads > 0:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads > 0:
+            options.inter_op_num_threads = self.inter_op_threads
+            # inter_op chỉ có tác dụng khi chạy các nhánh của graph song song
+            if self.inter_op_threads > 1:
+                options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        return options
+
+    def get_ranker(self, model_name: str = RERANK_MODEL) -> Ranker:
+        """Ranker của model_name, tải ở lần gọi đầu tiên (các lần sau và các thread khác dùng lại)."""
+        ranker = self.models.get(model_name)
+        if ranker is not None:
+            return ranker
+        with self.lock:
+            ranker = self.models.get(model_name)
+            if ranker is None:
+                ranker = self._load(model_name)
+                self.models[model_name] = ranker
+        return ranker
+
+    def _load(self, model_name: str) -> Ranker:
+        print(f"[ModelRegistry] Đang tải model ONNX: {model_name}...")
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        ranker = _OnnxRanker(model_name, self.cache_dir, self._session_options())
+        load_seconds = time.perf_counter() - start
+        rss_mb = max(0, _rss_bytes() - rss_before) / 2 ** 20
+        self.load_info[model_name] = {
+            "load_seconds": round(load_seconds, 3),
+            "rss_mb": round(rss_mb, 1),
+            "loaded_at": time.time(),
+        }
+        print(f"[ModelRegistry] Đã tải {model_name} trong {load_seconds:.2f}s, RSS +{rss_mb:.1f}MB")
+        return ranker
+
+    def warm_up(self, model_names: list[str] | None = None) -> dict:
+        """Tải trước các model (mặc định RERANK_MODEL) lúc khởi động để câu hỏi đầu tiên không phải chờ."""
+        for model_name in model_names or [RERANK_MODEL]:
+            self.get_ranker(model_name)
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "process_rss_mb": round(_rss_bytes() / 2 ** 20, 1),
+            "models": dict(self.load_info),
+        }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,118 @@
+"""
+Các hàm parse tài liệu chạy trong ProcessPoolExecutor (MinioService).
+Chỉ nhận/trả dữ liệu thuần (đường dẫn hoặc bytes, text, dict metadata) để pickle được,
+không phụ thuộc vào event loop hay client nào của process chính.
+"""
+import csv
+import io
+import mmap
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def open_source(source):
+    """
+    source là bytes (file nhỏ, đọc thẳng từ MinIO) -> BytesIO,
+    hoặc đường dẫn file tạm (file lớn) -> memory-mapped file.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
+def parse_text_content(text: str, file_extension: str):
+    """
+    Parse nội dung text (.txt/.md/.csv) đã đọc sẵn trong bộ nhớ,
+    cùng định dạng output với TextLoader / CSVLoader.
+    """
+    if file_extension != ".csv":
+        return [(text, {})]
+    pages = []
+    for i, row in enumerate(csv.DictReader(io.StringIO(text))):
+        content = "\n".join(
+            f"{key.strip() if key is not None else key}: {value.strip() if isinstance(value, str) else value}"
+            for key, value in row.items()
+        )
+        pages.append((content, {"row": i}))
+    return pages
+
+
+def make_loader(file_path: str, file_extension: str):
+    from langchain_community.document_loaders import (
+        PyPDFLoader,
+        Docx2txtLoader,
+        TextLoader,
+        UnstructuredPowerPointLoader,
+        UnstructuredExcelLoader,
+        CSVLoader,
+    )
+
+    if file_extension == ".pdf":
+        return PyPDFLoader(file_path)
+    elif file_extension in [".docx", ".doc"]:
+        return Docx2txtLoader(file_path)
+    elif file_extension in [".txt", ".md"]:
+        return TextLoader(file_path, encoding="utf-8")
+    elif file_extension == ".csv":
+        return CSVLoader(file_path, encoding="utf-8")
+    elif file_extension in [".pptx", ".ppt"]:
+        return UnstructuredPowerPointLoader(file_path)
+    elif file_extension in [".xlsx", ".xls"]:
+        return UnstructuredExcelLoader(file_path)
+    raise ValueError(f"Định dạng '{file_extension}' không được hỗ trợ.")
+
+
+def parse_pdf_pages(source, start_page: int, end_page: int):
+    """
+    Parse các trang [start_page, end_page) của file PDF (bytes hoặc đường dẫn).
+    Trả về (pages, total_pages, elapsed) với pages = [(text, metadata), ...].
+    """
+    from pypdf import PdfReader
+
+    started = time.perf_counter()
+    with open_source(source) as stream:
+        reader = PdfReader(stream)
+        total_pages = len(reader.pages)
+        try:
+            labels = reader.page_labels
+        except Exception:
+            labels = []
+
+        pages = []
+        for i in range(start_page, min(end_page, total_pages)):
+            text = reader.pages[i].extract_text() or ""
+            pages.append((text, {
+                "page": i,
+                "page_label": labels[i] if i < len(labels) else str(i + 1),
+                "total_pages": total_pages,
+            }))
+    return pages, total_pages, time.perf_counter() - started
+
+
+def parse_docx(source):
+    """
+    Parse DOCX (bytes hoặc đường dẫn) bằng docx2txt, giống Docx2txtLoader.
+    """
+    import docx2txt
+
+    started = time.perf_counter()
+    if isinstance(source, str):
+        # zipfile chỉ đọc phần document.xml, không cần mmap cả file
+        text = docx2txt.process(source)
+    else:
+        text = docx2txt.process(io.BytesIO(source))
+    return [(text, {})], 1, time.perf_counter() - started
+
+
+def parse_document(file_path: str, file_extension: str):
+    """
+    Parse toàn bộ file bằng loader LangChain tương ứng.
+    Trả về (pages, total_pages, elapsed) giống parse_pdf_pages.
+    """
+    started = time.perf_counter()
+    documents = make_loader(file_path, file_extension).load()
+    pages = [(doc.page_content, dict(doc.metadata)) for doc in documents]
+    return pages, len(pages), time.perf_counter() - started
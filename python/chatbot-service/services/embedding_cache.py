@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+import redis
+from config import (
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_REDIS_URL,
+    EMBEDDING_CACHE_REDIS_TTL,
+)
+
+# Thời điểm truy cập (cho LRU) được gom trong RAM và ghi xuống sqlite theo đợt,
+# để cache hit trên đường ingestion không thành một lần commit (fsync)
+_ACCESS_FLUSH_SECONDS = 60
+_ACCESS_FLUSH_ENTRIES = 1000
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+def _unpack(blob: bytes) -> list:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    Cache embedding theo nội dung: key = sha256(model + text).
+    Tầng local: sqlite trên đĩa, xóa theo LRU khi vượt max_entries.
+    Tầng Redis (tùy chọn): dùng chung giữa các worker, có TTL.
+    """
+    def __init__(
+        self,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        redis_url: str = EMBEDDING_CACHE_REDIS_URL,
+        redis_ttl: int = EMBEDDING_CACHE_REDIS_TTL,
+    ):
+        self.max_entries = max_entries
+        self.redis_ttl = redis_ttl
+        self.lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> thời điểm truy cập chưa ghi xuống sqlite
+        self.pending_access = {}
+        self.access_flushed_at = time.time()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self.db.commit()
+        self.size = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        self.redis = None
+        if redis_url:
+            try:
+                self.redis = redis.Redis.from_url(redis_url)
+                self.redis.ping()
+                print(f"--> [EmbeddingCache] Bật tầng Redis: {redis_url}")
+            except Exception as e:
+                print(f"--> [EmbeddingCache] Không kết nối được Redis, chỉ dùng cache local: {e}")
+                self.redis = None
+
+        print(f"--> [EmbeddingCache] {path}: {self.size}/{self.max_entries} entries")
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: list[str], model: str) -> list:
+        """
+        Trả về list cùng độ dài với texts; phần tử chưa có trong cache là None.
+        """
+        keys = [self.make_key(text, model) for text in texts]
+        found = {}
+
+        with self.lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update({key: _unpack(blob) for key, blob in rows})
+            if found:
+                now = time.time()
+                self.pending_access.update((key, now) for key in found)
+                if len(self.pending_access) >= _ACCESS_FLUSH_ENTRIES or now - self.access_flushed_at >= _ACCESS_FLUSH_SECONDS:
+                    self._flush_access()
+                    self.db.commit()
+            self.hits_local += sum(1 for key in keys if key in found)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self.redis is not None:
+            try:
+                blobs = self.redis.mget([f"emb:{key}" for key in missing])
+                promoted = {key: _unpack(blob) for key, blob in zip(missing, blobs) if blob}
+                if promoted:
+                    found.update(promoted)
+                    self._put_local(promoted)
+                    with self.lock:
+                        self.hits_redis += sum(1 for key in keys if key in promoted)
+            except Exception as e:
+                print(f"--> [EmbeddingCache] Lỗi đọc Redis: {e}")
+
+        with self.lock:
+            self.misses += sum(1 for key in keys if key not in found)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: list[str], vectors: list, model: str):
+        items = {
+            self.make_key(text, model): vector
+            for text, vector in zip(texts, vectors) if vector
+        }
+        if not items:
+            return
+        self._put_local(items)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key, vector in items.items():
+                    pipe.set(f"emb:{key}", _pack(vector), ex=self.redis_ttl)
+                pipe.execute()
+            except Exception as e:
+                print(f"--> [EmbeddingCache] Lỗi ghi Redis: {e}")
+
+    def _flush_access(self):
+        """Ghi các thời điểm truy cập đang gom (gọi khi đang giữ self.lock, commit do người gọi)."""
+        if self.pending_access:
+            self.db.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self.pending_access.items()]
+            )
+            self.pending_access.clear()
+        self.access_flushed_at = time.time()
+
+    def _put_local(self, items: dict):
+        now = time.time()
+        with self.lock:
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, _pack(vector), now) for key, vector in items.items()]
+            )
+            self.size += self.db.total_changes - before
+            if self.size > self.max_entries:
+                # Thứ tự LRU phải tính cả các lần truy cập chưa ghi
+                self._flush_access()
+                # Xóa bớt 10% các entry ít được dùng nhất để không phải evict ở mỗi lần ghi
+                overflow = self.size - int(self.max_entries * 0.9)
+                self.db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                )
+                self.evictions += overflow
+                self.size -= overflow
+            self.db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits_local + self.hits_redis + self.misses
+        return {
+            "entries": self.size,
+            "max_entries": self.max_entries,
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits_local + self.hits_redis) / lookups, 4) if lookups else 0.0,
+        }
@@ -1,12 +1,13 @@
 import google.generativeai as genai
 from config import GEMINI_API_KEY, GEMINI_MODEL
-from utils_retry import retry_sync
+from utils_retry import retry_sync, retry_async
 
 class GeminiService:
     def __init__(self):
         if not GEMINI_API_KEY:
             print("⚠️ Warning: GEMINI_API_KEY is not set.")
         genai.configure(api_key=GEMINI_API_KEY)
+        self.model = GEMINI_MODEL
         self.default_model = genai.GenerativeModel(GEMINI_MODEL)
 
     def _convert_messages(self, messages):
@@ -22,20 +23,30 @@ class GeminiService:
         
         return system_content, history
 
-    @retry_sync(max_retries=3, delay=2, backoff=2)
-    def chat(self, messages):
+    def _start_chat(self, messages):
+        """
+        Dựng chat session từ messages dạng Ollama (system -> system_instruction).
+        Trả về (chat_session, nội dung tin nhắn cuối để gửi), hoặc None nếu không có tin nhắn nào.
+        """
         system_content, history = self._convert_messages(messages)
-        
         model = self.default_model
         if system_content:
             model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_content)
-        
+
         if not history:
-             return
-             
+            return None
+
         last_msg = history.pop()
-        chat_session = model.start_chat(history=history)
-        response = chat_session.send_message(last_msg["parts"][0], stream=True)
+        return model.start_chat(history=history), last_msg["parts"][0]
+
+    @retry_sync(max_retries=3, delay=2, backoff=2)
+    def chat(self, messages):
+        started = self._start_chat(messages)
+        if started is None:
+            return
+
+        chat_session, content = started
+        response = chat_session.send_message(content, stream=True)
         
         for chunk in response:
             try:
@@ -47,15 +58,39 @@ class GeminiService:
 
     @retry_sync(max_retries=3, delay=2, backoff=2)
     def chatWithOutStream(self, messages):
-        system_content, history = self._convert_messages(messages)
-        model = self.default_model
-        if system_content:
-            model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_content)
-            
-        if not history:
+        started = self._start_chat(messages)
+        if started is None:
             return {'message': {'content': ""}}
 
-        last_msg = history.pop()
-        chat_session = model.start_chat(history=history)
-        response = chat_session.send_message(last_msg["parts"][0])
+        chat_session, content = started
+        response = chat_session.send_message(content)
+        return {'message': {'content': response.text}}
+
+    @retry_async(max_retries=3, delay=2, backoff=2)
+    async def _send_message_async(self, messages, stream: bool):
+        started = self._start_chat(messages)
+        if started is None:
+            return None
+
+        chat_session, content = started
+        return await chat_session.send_message_async(content, stream=stream)
+
+    async def achat(self, messages):
+        """Bản async của chat(): stream qua gRPC async của Gemini, không cần thread."""
+        response = await self._send_message_async(messages, stream=True)
+        if response is None:
+            return
+
+        async for chunk in response:
+            try:
+                if chunk.text:
+                    yield {'message': {'content': chunk.text}}
+            except Exception as e:
+                print(f"Error in Gemini chunk: {e}")
+                continue
+
+    async def achatWithOutStream(self, messages):
+        response = await self._send_message_async(messages, stream=False)
+        if response is None:
+            return {'message': {'content': ""}}
         return {'message': {'content': response.text}}
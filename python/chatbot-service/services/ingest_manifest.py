@@ -0,0 +1,95 @@
+import hashlib
+import json
+
+
+class IngestManifest:
+    """
+    Danh mục file đã ingest, lưu trong Redis hash `ingest_manifest:{collection}`:
+    field = source (storageKey), value = JSON {chunks, content_hash, embedding_model, embedding_normalized, ingested_at}.
+    Entry chỉ tồn tại khi chunk của file đã được ghi đầy đủ vào ChromaDB
+    (xóa trước khi sửa/xóa chunk, ghi lại sau khi ghi xong).
+    Tập `ingest_manifest:collections` giữ danh sách collection có manifest.
+    Lỗi Redis không làm hỏng luồng chính: coi như miss và đọc từ ChromaDB.
+    """
+    COLLECTIONS_KEY = "ingest_manifest:collections"
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(collection_name: str) -> str:
+        return f"ingest_manifest:{collection_name}"
+
+    @staticmethod
+    def content_hash(chunk_hashes: list[str]) -> str:
+        """Hash nội dung cả file từ content_hash các chunk (theo thứ tự chunk_id)."""
+        digest = hashlib.sha256()
+        for chunk_hash in chunk_hashes:
+            digest.update(chunk_hash.encode("ascii"))
+        return digest.hexdigest()
+
+    async def get(self, collection_name: str, source: str) -> dict | None:
+        try:
+            value = await self.redis.hget(self._key(collection_name), source)
+        except Exception as e:
+            self.errors += 1
+            print(f"--> [Manifest] Lỗi đọc Redis: {e}")
+            return None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def list_sources(self, collection_name: str) -> dict[str, dict]:
+        try:
+            entries = await self.redis.hgetall(self._key(collection_name))
+        except Exception as e:
+            self.errors += 1
+            print(f"--> [Manifest] Lỗi đọc Redis: {e}")
+            return {}
+        return {
+            (source.decode("utf-8") if isinstance(source, bytes) else source): json.loads(value)
+            for source, value in entries.items()
+        }
+
+    async def put(self, collection_name: str, source: str, entry: dict):
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(self._key(collection_name), source, json.dumps(entry))
+                pipe.sadd(self.COLLECTIONS_KEY, collection_name)
+                await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            print(f"--> [Manifest] Lỗi ghi Redis: {e}")
+
+    async def remove(self, collection_name: str, sources: list[str]) -> bool:
+        if not sources:
+            return True
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hdel(self._key(collection_name), *sources)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            self.errors += 1
+            print(f"--> [Manifest] Lỗi xóa entry Redis: {e}")
+            return False
+
+    async def drop(self, collection_name: str) -> bool:
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(self._key(collection_name))
+                pipe.srem(self.COLLECTIONS_KEY, collection_name)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            self.errors += 1
+            print(f"--> [Manifest] Lỗi xóa manifest Redis: {e}")
+            return False
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
@@ -0,0 +1,208 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from langchain_core.documents import Document
+from config import LEXICAL_INDEX_DIR
+
+# Cùng quy tắc tách từ với tokenizer unicode61 của FTS5: chữ/số liên tiếp, "_" và dấu câu là ranh giới
+_SYLLABLE_RE = re.compile(r"[^\W_]+")
+# Mã ticket, UUID, phiên bản... (vd. PROJ-123, 3f2a-...-9c1e, v2.1.0): khớp cả cụm
+_CODE_RE = re.compile(r"[^\W_]+(?:[-./:_][^\W_]+)+")
+_MAX_QUERY_TERMS = 32
+# Âm tiết xuất hiện trong quá nhiều chunk (hư từ "của", "và"...) gần như không đóng góp điểm BM25
+# nhưng có danh sách posting rất dài: bỏ khỏi truy vấn để giữ độ trễ vài ms.
+# Ngưỡng = max(_MIN_DF_CUTOFF, _MAX_DF_RATIO * số chunk), collection nhỏ giữ mọi term.
+_MAX_DF_RATIO = 0.01
+_MIN_DF_CUTOFF = 500
+
+
+def normalize(text: str) -> str:
+    """NFC + chữ thường: văn bản tiếng Việt từ PDF thường ở dạng NFD (dấu tách rời)."""
+    return unicodedata.normalize("NFC", text or "").lower()
+
+
+def tokenize(text: str) -> list[str]:
+    """Tách âm tiết tiếng Việt (giữ dấu thanh)."""
+    return _SYLLABLE_RE.findall(normalize(text))
+
+
+def df_cutoff(total_docs: int) -> int:
+    return max(_MIN_DF_CUTOFF, int(total_docs * _MAX_DF_RATIO))
+
+
+def build_match_query(query: str, doc_freq: dict | None = None, cutoff: int = 0) -> str | None:
+    """
+    Biểu thức MATCH của FTS5 cho câu hỏi:
+    nguyên cụm mã (ticket, UUID) + cụm 2 âm tiết liền nhau (từ ghép tiếng Việt như "quản lý", "dự án")
+    + âm tiết đơn, nối bằng OR và để BM25 xếp hạng.
+    doc_freq (âm tiết -> số chunk chứa nó, đếm tối đa tới cutoff + 1): bỏ term không có trong index
+    và term phổ biến hơn cutoff.
+    """
+    text = normalize(query)
+    tokens = tokenize(text)
+    syllables = list(dict.fromkeys(tokens))
+    pairs = list(dict.fromkeys(zip(tokens, tokens[1:])))
+    codes = [tokenize(code) for code in _CODE_RE.findall(text)]
+    if doc_freq is None:
+        rare = set(syllables)
+    else:
+        # Câu hỏi chỉ gồm từ phổ biến thì BM25 không phân biệt được gì -> không tìm (để vector search lo)
+        rare = {syllable for syllable in syllables if 0 < doc_freq.get(syllable, 0) <= cutoff}
+        syllables = [syllable for syllable in syllables if syllable in rare]
+        pairs = [pair for pair in pairs if pair[0] in rare or pair[1] in rare]
+        codes = [code for code in codes if any(part in rare for part in code)]
+
+    terms = [" ".join(code) for code in codes]
+    terms.extend(" ".join(pair) for pair in pairs)
+    terms.extend(syllables)
+    terms = list(dict.fromkeys(terms))[:_MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+class LexicalIndex:
+    """
+    Index BM25 của chunk, mỗi collection một file SQLite FTS5 (tokenizer unicode61, giữ dấu tiếng Việt).
+    Được cập nhật cùng ChromaDB trong process_and_store và khi xóa file/collection.
+    Mỗi collection có connection và lock riêng: ghi lớn của một team không chặn tìm kiếm của team khác.
+    """
+    def __init__(self, directory: str = LEXICAL_INDEX_DIR):
+        self.directory = directory
+        # Chỉ bảo vệ self.connections; truy cập từng connection dùng lock của collection đó
+        self.lock = threading.Lock()
+        # collection -> (connection, lock)
+        self.connections = {}
+        self.searches = 0
+        self.search_seconds = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, collection_name: str) -> str:
+        if not collection_name or "/" in collection_name or collection_name.startswith("."):
+            raise ValueError(f"Tên collection không hợp lệ: {collection_name}")
+        return os.path.join(self.directory, f"{collection_name}.sqlite3")
+
+    def _connect(self, collection_name: str, create: bool = True):
+        """(connection, lock) của collection, hoặc (None, None) nếu chưa có index và create=False."""
+        with self.lock:
+            entry = self.connections.get(collection_name)
+            if entry is not None:
+                return entry
+            path = self._path(collection_name)
+            if not create and not os.path.exists(path):
+                return None, None
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                " rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, source TEXT, document TEXT, metadata TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS docs_source ON docs(source)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                " document, content='docs', content_rowid='rowid', tokenize='unicode61 remove_diacritics 0')"
+            )
+            conn.commit()
+            entry = self.connections[collection_name] = (conn, threading.Lock())
+            return entry
+
+    def _delete_rows(self, conn, where: str, params: list):
+        rows = conn.execute(f"SELECT rowid, document FROM docs WHERE {where}", params).fetchall()
+        conn.executemany("INSERT INTO chunks(chunks, rowid, document) VALUES ('delete', ?, ?)", rows)
+        conn.execute(f"DELETE FROM docs WHERE {where}", params)
+        return len(rows)
+
+    def replace_source(self, collection_name: str, source: str, ids: list[str], documents: list[str], metadatas: list[dict]):
+        """Thay toàn bộ chunk của một file bằng danh sách mới (một transaction)."""
+        conn, lock = self._connect(collection_name)
+        with lock, conn:
+            self._delete_rows(conn, "source = ?", [source])
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                document = unicodedata.normalize("NFC", document or "")
+                cursor = conn.execute(
+                    "INSERT INTO docs(id, source, document, metadata) VALUES (?, ?, ?, ?)",
+                    (chunk_id, source, document, json.dumps(metadata, ensure_ascii=False))
+                )
+                conn.execute("INSERT INTO chunks(rowid, document) VALUES (?, ?)", (cursor.lastrowid, document))
+
+    def has_source(self, collection_name: str, source: str) -> bool:
+        conn, lock = self._connect(collection_name, create=False)
+        if conn is None:
+            return False
+        with lock:
+            return conn.execute("SELECT 1 FROM docs WHERE source = ? LIMIT 1", (source,)).fetchone() is not None
+
+    def delete_sources(self, collection_name: str, sources: list[str]) -> int:
+        conn, lock = self._connect(collection_name, create=False)
+        if conn is None or not sources:
+            return 0
+        removed = 0
+        with lock, conn:
+            for start in range(0, len(sources), 500):
+                batch = sources[start:start + 500]
+                removed += self._delete_rows(conn, f"source IN ({','.join('?' * len(batch))})", batch)
+        return removed
+
+    def drop(self, collection_name: str):
+        with self.lock:
+            conn, lock = self.connections.pop(collection_name, (None, None))
+            if conn is not None:
+                # Chờ thao tác đang chạy trên collection xong rồi mới đóng
+                with lock:
+                    conn.close()
+            path = self._path(collection_name)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def search(self, collection_name: str, query: str, k: int = 10, sources: list[str] | None = None) -> list[Document]:
+        """Top-k chunk theo BM25, có thể lọc theo danh sách file."""
+        conn, lock = self._connect(collection_name, create=False)
+        if conn is None:
+            return []
+        start = time.perf_counter()
+        syllables = list(dict.fromkeys(tokenize(query)))[:_MAX_QUERY_TERMS]
+        if not syllables:
+            return []
+        with lock:
+            cutoff = df_cutoff(conn.execute("SELECT count(*) FROM docs").fetchone()[0])
+            # Chỉ đếm tới cutoff + 1 để term phổ biến không phải duyệt hết danh sách posting
+            doc_freq = {
+                syllable: conn.execute(
+                    "SELECT count(*) FROM (SELECT 1 FROM chunks WHERE chunks MATCH ? LIMIT ?)", (f'"{syllable}"', cutoff + 1)
+                ).fetchone()[0]
+                for syllable in syllables
+            }
+        match = build_match_query(query, doc_freq, cutoff)
+        if match is None:
+            return []
+        sql = (
+            "SELECT docs.document, docs.metadata, bm25(chunks) AS score FROM chunks"
+            " JOIN docs ON docs.rowid = chunks.rowid WHERE chunks MATCH ?"
+        )
+        params = [match]
+        if sources:
+            sql += f" AND docs.source IN ({','.join('?' * len(sources))})"
+            params.extend(sources)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k)
+        with lock:
+            rows = conn.execute(sql, params).fetchall()
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - start
+        return [
+            Document(page_content=document, metadata={**json.loads(metadata or "{}"), "bm25": -score})
+            for document, metadata, score in rows
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "collections": len(self.connections),
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 2) if self.searches else 0.0
+        }
@@ -1,16 +1,155 @@
-from config import OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_EMBEDDING_MODEL
+import asyncio
+import httpx
+from config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    OLLAMA_EMBEDDING_MODEL,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_CACHE_ENABLED,
+)
 import ollama
-from utils_retry import retry_sync
+from services.embedding_cache import EmbeddingCache
+from utils.metrics import register_metrics
+from utils_retry import retry_sync, retry_async
 
 class LLMService:
     def __init__(self):
         self.client = ollama.Client(host=OLLAMA_BASE_URL)
+        self.model = OLLAMA_MODEL
+        self._async_client = None
+        self._async_loop = None
+        self.embedding_cache = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+        if self.embedding_cache:
+            register_metrics("embedding_cache", self.embedding_cache.stats)
+
+    @property
+    def async_client(self) -> ollama.AsyncClient:
+        """
+        Client async (httpx) dùng chung pool kết nối keep-alive cho chat, stream và embedding.
+        Pool gắn với event loop nên tạo lại nếu được gọi từ loop khác.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = ollama.AsyncClient(
+                host=OLLAMA_BASE_URL,
+                timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS),
+            )
+            self._async_loop = loop
+        return self._async_client
 
-    @retry_sync(max_retries=3, delay=1, backoff=2)
     def get_embedding(self, text: str):
-        response = self.client.embeddings(model=OLLAMA_EMBEDDING_MODEL, prompt=text)
+        if self.embedding_cache:
+            cached = self.embedding_cache.get_many([text], OLLAMA_EMBEDDING_MODEL)[0]
+            if cached:
+                return cached
+
+        vector = self._embed_one(text)
+        if self.embedding_cache:
+            self.embedding_cache.put_many([text], [vector], OLLAMA_EMBEDDING_MODEL)
+        return vector
+
+    @retry_sync(max_retries=3, delay=1, backoff=2)
+    def _embed_one(self, text: str):
+        # Dùng chung endpoint /api/embed với đường batch để vector luôn cùng chuẩn hóa
+        response = self.client.embed(model=OLLAMA_EMBEDDING_MODEL, input=text)
+        return response['embeddings'][0]
+
+    async def aget_embedding(self, text: str):
+        if self.embedding_cache:
+            cached = (await asyncio.to_thread(self.embedding_cache.get_many, [text], OLLAMA_EMBEDDING_MODEL))[0]
+            if cached:
+                return cached
+
+        vector = await self._aembed_one(text)
+        if self.embedding_cache:
+            await asyncio.to_thread(self.embedding_cache.put_many, [text], [vector], OLLAMA_EMBEDDING_MODEL)
+        return vector
+
+    @retry_async(max_retries=3, delay=1, backoff=2)
+    async def _aembed_one(self, text: str):
+        response = await self.async_client.embed(model=OLLAMA_EMBEDDING_MODEL, input=text)
+        return response['embeddings'][0]
+
+    @retry_async(max_retries=3, delay=1, backoff=2)
+    async def aget_legacy_embedding(self, text: str):
+        """
+        Embedding qua endpoint cũ /api/embeddings (vector chưa chuẩn hóa, không qua embedding cache):
+        chỉ dùng cho câu hỏi trên collection mà mọi chunk còn được embed theo cách này.
+        """
+        response = await self.async_client.embeddings(model=OLLAMA_EMBEDDING_MODEL, prompt=text)
         return response['embedding']
 
+    @retry_sync(max_retries=2, delay=1, backoff=2)
+    def get_embeddings(self, texts: list[str]):
+        response = self.client.embed(model=OLLAMA_EMBEDDING_MODEL, input=texts)
+        embeddings = response['embeddings']
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Ollama trả về {len(embeddings)} vector cho {len(texts)} input.")
+        return embeddings
+
+    @retry_async(max_retries=2, delay=1, backoff=2)
+    async def aget_embeddings(self, texts: list[str]):
+        response = await self.async_client.embed(model=OLLAMA_EMBEDDING_MODEL, input=texts)
+        embeddings = response['embeddings']
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Ollama trả về {len(embeddings)} vector cho {len(texts)} input.")
+        return embeddings
+
+    async def embed_batched(
+        self,
+        texts: list[str],
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+    ):
+        """
+        Embedding theo lô (nhiều input / 1 request), tối đa max_concurrency lô chạy song song.
+        Kết quả cùng thứ tự với texts; chunk lỗi trả về None.
+        Nếu cả lô lỗi thì embed lại từng chunk để cô lập chunk hỏng.
+        Chunk đã có trong embedding cache không được gửi tới Ollama.
+        """
+        if self.embedding_cache and texts:
+            cached = await asyncio.to_thread(self.embedding_cache.get_many, texts, OLLAMA_EMBEDDING_MODEL)
+            missing = [i for i, vector in enumerate(cached) if vector is None]
+            if len(missing) < len(texts):
+                print(f"--> [EmbeddingCache] {len(texts) - len(missing)}/{len(texts)} chunk có sẵn trong cache.")
+            if missing:
+                fresh = await self._embed_batched_uncached([texts[i] for i in missing], batch_size, max_concurrency)
+                for i, vector in zip(missing, fresh):
+                    cached[i] = vector
+                await asyncio.to_thread(
+                    self.embedding_cache.put_many, [texts[i] for i in missing], fresh, OLLAMA_EMBEDDING_MODEL
+                )
+            return cached
+        return await self._embed_batched_uncached(texts, batch_size, max_concurrency)
+
+    async def _embed_batched_uncached(self, texts: list[str], batch_size: int, max_concurrency: int):
+        results = [None] * len(texts)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run_batch(start: int):
+            batch = texts[start:start + batch_size]
+            async with semaphore:
+                try:
+                    vectors = await self.aget_embeddings(batch)
+                except Exception as e:
+                    print(f"--> [Embedding] Lô {start}-{start + len(batch) - 1} lỗi: {e}. Thử lại từng chunk...")
+                    vectors = []
+                    for offset, text in enumerate(batch):
+                        try:
+                            vectors.append(await self._aembed_one(text))
+                        except Exception as chunk_error:
+                            print(f"--> [ERROR] Lỗi Embedding chunk {start + offset}: {chunk_error}")
+                            vectors.append(None)
+            results[start:start + len(batch)] = vectors
+
+        await asyncio.gather(*(run_batch(i) for i in range(0, len(texts), max(1, batch_size))))
+        return results
+
     @retry_sync(max_retries=3, delay=2, backoff=2)
     def chat(self, messages):
         return self.client.chat(model=OLLAMA_MODEL, messages=messages, stream=True)
@@ -18,3 +157,27 @@ class LLMService:
     @retry_sync(max_retries=3, delay=2, backoff=2)
     def chatWithOutStream(self, messages):
         return self.client.chat(model=OLLAMA_MODEL, messages=messages)
+
+    async def achat(self, messages, max_retries: int = 3, delay: float = 2, backoff: float = 2):
+        """
+        Chat stream qua client async: yield từng chunk (cùng dạng với chat()), không chiếm thread nào.
+        Chỉ thử lại khi lỗi xảy ra trước chunk đầu tiên (đã gửi token cho client thì không phát lại).
+        """
+        current_delay = delay
+        for attempt in range(1, max_retries + 1):
+            received = False
+            try:
+                async for part in await self.async_client.chat(model=OLLAMA_MODEL, messages=messages, stream=True):
+                    received = True
+                    yield part
+                return
+            except Exception as e:
+                if received or attempt >= max_retries:
+                    raise
+                print(f"--> [Retry] achat lỗi: {e}. Thử lại lần {attempt}/{max_retries} sau {current_delay}s...")
+                await asyncio.sleep(current_delay)
+                current_delay *= backoff
+
+    @retry_async(max_retries=3, delay=2, backoff=2)
+    async def achatWithOutStream(self, messages):
+        return await self.async_client.chat(model=OLLAMA_MODEL, messages=messages)
@@ -0,0 +1,509 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import numpy as np
+from config import (
+    LOCAL_VECTOR_DIR,
+    LOCAL_ANN_MIN_ROWS,
+    LOCAL_VECTOR_DTYPE,
+    LOCAL_RESCORE_FACTOR,
+    CHROMA_HNSW_SPACE,
+    CHROMA_HNSW_M,
+    CHROMA_HNSW_CONSTRUCTION_EF,
+    CHROMA_HNSW_SEARCH_EF,
+)
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+_INITIAL_CAPACITY = 1024
+_SCAN_BLOCK_ROWS = 16384
+_VECTOR_DTYPES = ("float32", "float16", "int8")
+
+
+def _match(meta: dict, where: dict | None) -> bool:
+    """Bộ lọc metadata theo cú pháp `where` của ChromaDB ($and/$or/$eq/$ne/$in/$nin/$gt/$gte/$lt/$lte)."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_match(meta, sub) for sub in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(_match(meta, sub) for sub in cond):
+                return False
+            continue
+        value = meta.get(key)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, arg in cond.items():
+            if op == "$eq" and value != arg: return False
+            if op == "$ne" and value == arg: return False
+            if op == "$in" and value not in arg: return False
+            if op == "$nin" and value in arg: return False
+            if op in ("$gt", "$gte", "$lt", "$lte") and value is None: return False
+            if op == "$gt" and not value > arg: return False
+            if op == "$gte" and not value >= arg: return False
+            if op == "$lt" and not value < arg: return False
+            if op == "$lte" and not value <= arg: return False
+    return True
+
+
+def _source_filter(where: dict | None):
+    """Lấy tập source từ điều kiện where (nếu có) để thu hẹp ứng viên bằng index source."""
+    if not where:
+        return None
+    if "$and" in where:
+        for sub in where["$and"]:
+            sources = _source_filter(sub)
+            if sources is not None:
+                return sources
+        return None
+    cond = where.get("source")
+    if cond is None:
+        return None
+    if not isinstance(cond, dict):
+        return {cond}
+    if "$eq" in cond:
+        return {cond["$eq"]}
+    if "$in" in cond:
+        return set(cond["$in"])
+    return None
+
+
+class LocalCollection:
+    """
+    Collection lưu trong process:
+    - vectors.f32: ma trận float32 (capacity x dim) memory-mapped, tăng gấp đôi khi đầy;
+    - rows.sqlite3: id, metadata, document của từng slot.
+    Metadata và index source được giữ trong RAM để lọc nhanh; document đọc từ sqlite khi cần.
+    Top-k chính xác bằng NumPy; collection lớn (>= LOCAL_ANN_MIN_ROWS) dùng thêm HNSW (hnswlib) nếu có.
+    dtype float16/int8: lưu thêm bản nén (vectors.f16 hoặc vectors.i8 + scales.f32, scale theo từng vector)
+    để quét top-k, sau đó chấm lại top ứng viên bằng float32 - file float32 chỉ được đọc cho các ứng viên này.
+    API là tập con API collection của ChromaDB mà VectorStoreService dùng.
+    """
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        space: str = CHROMA_HNSW_SPACE,
+        ann_min_rows: int = LOCAL_ANN_MIN_ROWS,
+        dtype: str = LOCAL_VECTOR_DTYPE,
+        rescore_factor: int = LOCAL_RESCORE_FACTOR
+    ):
+        if dtype not in _VECTOR_DTYPES:
+            raise ValueError(f"LOCAL_VECTOR_DTYPE không hợp lệ: {dtype} (chọn một trong {_VECTOR_DTYPES})")
+        self.name = name
+        self.directory = directory
+        self.space = space
+        self.dtype = dtype
+        self.ann_min_rows = ann_min_rows
+        self.rescore_factor = max(1, rescore_factor)
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(directory, "rows.sqlite3"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " slot INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT, document TEXT)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.commit()
+
+        # space và dtype cố định từ lúc tạo collection
+        info = dict(self.db.execute("SELECT key, value FROM info").fetchall())
+        self.space = info.get("space", self.space)
+        self.dtype = info.get("dtype", "float32" if "dim" in info else self.dtype)
+        self.db.executemany(
+            "INSERT OR REPLACE INTO info(key, value) VALUES (?, ?)",
+            [("space", self.space), ("dtype", self.dtype)]
+        )
+        self.db.commit()
+        self.dim = int(info["dim"]) if "dim" in info else None
+        self.capacity = int(info.get("capacity", 0))
+        self.maps = []
+        self.vectors = None
+        self.codes = None
+        self.scales = None
+        if self.dim:
+            self._open_vectors()
+
+        self.slot_of = {}
+        self.ids = {}
+        self.metadatas = {}
+        self.by_source = {}
+        for slot, row_id, metadata in self.db.execute("SELECT slot, id, metadata FROM rows"):
+            self._index_row(slot, row_id, json.loads(metadata) if metadata else {})
+        self.free_slots = sorted(set(range(self._high_water())) - set(self.ids), reverse=True)
+
+        self.ann = None
+        self.ann_unavailable_logged = False
+
+    # ---------- lưu trữ ----------
+
+    def _storage_files(self) -> list[tuple]:
+        """(đường dẫn, dtype, số phần tử mỗi hàng) của các file memmap."""
+        files = [(os.path.join(self.directory, "vectors.f32"), np.float32, self.dim)]
+        if self.dtype == "float16":
+            files.append((os.path.join(self.directory, "vectors.f16"), np.float16, self.dim))
+        elif self.dtype == "int8":
+            files.append((os.path.join(self.directory, "vectors.i8"), np.int8, self.dim))
+            files.append((os.path.join(self.directory, "scales.f32"), np.float32, 1))
+        return files
+
+    def _open_vectors(self):
+        self.maps = [
+            np.memmap(path, dtype=dtype, mode="r+", shape=(self.capacity, width))
+            for path, dtype, width in self._storage_files()
+        ]
+        self.vectors = self.maps[0]
+        self.codes = self.maps[1] if len(self.maps) > 1 else None
+        self.scales = self.maps[2] if len(self.maps) > 2 else None
+
+    def _close_vectors(self):
+        for matrix in self.maps:
+            matrix.flush()
+        self.maps = []
+        self.vectors = self.codes = self.scales = None
+
+    def _flush(self):
+        for matrix in self.maps:
+            matrix.flush()
+
+    def _high_water(self) -> int:
+        return max(self.ids) + 1 if self.ids else 0
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        if self.dim is None:
+            self.dim = dim
+            self.capacity = 0
+        elif dim != self.dim:
+            raise ValueError(f"Collection {self.name} có số chiều {self.dim}, nhận vector {dim} chiều.")
+        if needed <= self.capacity:
+            return
+        capacity = max(_INITIAL_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        self._close_vectors()
+        for path, dtype, width in self._storage_files():
+            with open(path, "ab") as handle:
+                handle.truncate(capacity * width * np.dtype(dtype).itemsize)
+        self.capacity = capacity
+        self._open_vectors()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO info(key, value) VALUES (?, ?)",
+            [("dim", str(self.dim)), ("capacity", str(self.capacity))]
+        )
+
+    def _index_row(self, slot: int, row_id: str, metadata: dict):
+        self.slot_of[row_id] = slot
+        self.ids[slot] = row_id
+        self.metadatas[slot] = metadata
+        source = metadata.get("source")
+        if source is not None:
+            self.by_source.setdefault(source, set()).add(slot)
+
+    def _unindex_row(self, slot: int):
+        row_id = self.ids.pop(slot)
+        self.slot_of.pop(row_id, None)
+        metadata = self.metadatas.pop(slot, {})
+        source = metadata.get("source")
+        if source is not None and source in self.by_source:
+            self.by_source[source].discard(slot)
+            if not self.by_source[source]:
+                del self.by_source[source]
+
+    def _allocate_slot(self) -> int:
+        if self.free_slots:
+            return self.free_slots.pop()
+        return self._high_water()
+
+    def _write_vectors(self, slots: list[int], embeddings):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        self._ensure_capacity(max(slots) + 1, matrix.shape[1])
+        self.vectors[slots] = matrix
+        if self.codes is None:
+            return
+        if self.space == "cosine":
+            # Bản nén lưu vector đơn vị để khi quét không phải tính lại norm từng dòng
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms > 0, norms, 1.0)
+        if self.dtype == "float16":
+            self.codes[slots] = matrix.astype(np.float16)
+        else:
+            # Lượng tử hóa đối xứng, scale riêng cho từng vector: v ~ scale * code
+            scale = np.abs(matrix).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            self.codes[slots] = np.clip(np.rint(matrix / scale[:, None]), -127, 127).astype(np.int8)
+            self.scales[slots] = scale[:, None]
+
+    # ---------- chọn slot theo where ----------
+
+    def _slots_for(self, ids=None, where=None) -> list[int]:
+        if ids is not None:
+            candidates = [self.slot_of[row_id] for row_id in ids if row_id in self.slot_of]
+        else:
+            sources = _source_filter(where)
+            if sources is not None:
+                candidates = sorted(slot for source in sources for slot in self.by_source.get(source, ()))
+            else:
+                candidates = sorted(self.ids)
+        if where:
+            candidates = [slot for slot in candidates if _match(self.metadatas[slot], where)]
+        return candidates
+
+    def _documents(self, slots: list[int]) -> list:
+        documents = {}
+        for start in range(0, len(slots), 500):
+            batch = slots[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            documents.update(self.db.execute(
+                f"SELECT slot, document FROM rows WHERE slot IN ({placeholders})", batch
+            ).fetchall())
+        return [documents.get(slot) for slot in slots]
+
+    # ---------- API giống ChromaDB ----------
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        with self.lock:
+            slots = []
+            rows = []
+            for i, row_id in enumerate(ids):
+                slot = self.slot_of.get(row_id)
+                if slot is None:
+                    slot = self._allocate_slot()
+                else:
+                    self._unindex_row(slot)
+                metadata = metadatas[i] if metadatas else {}
+                self._index_row(slot, row_id, metadata)
+                slots.append(slot)
+                rows.append((slot, row_id, json.dumps(metadata, ensure_ascii=False), documents[i] if documents else None))
+            if embeddings is not None and len(slots):
+                self._write_vectors(slots, embeddings)
+                self._flush()
+            self.db.executemany("INSERT OR REPLACE INTO rows(slot, id, metadata, document) VALUES (?, ?, ?, ?)", rows)
+            self.db.commit()
+            self._ann_upsert(slots)
+
+    add = upsert
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None):
+        with self.lock:
+            known = [(i, self.slot_of[row_id]) for i, row_id in enumerate(ids) if row_id in self.slot_of]
+            for i, slot in known:
+                if metadatas is not None:
+                    row_id = self.ids[slot]
+                    self._unindex_row(slot)
+                    self._index_row(slot, row_id, metadatas[i])
+                    self.db.execute("UPDATE rows SET metadata = ? WHERE slot = ?", (json.dumps(metadatas[i], ensure_ascii=False), slot))
+                if documents is not None:
+                    self.db.execute("UPDATE rows SET document = ? WHERE slot = ?", (documents[i], slot))
+            if embeddings is not None and known:
+                self._write_vectors([slot for _, slot in known], [embeddings[i] for i, _ in known])
+                self._flush()
+                self._ann_upsert([slot for _, slot in known])
+            self.db.commit()
+
+    def delete(self, ids=None, where=None):
+        with self.lock:
+            slots = self._slots_for(ids, where)
+            for slot in slots:
+                self._unindex_row(slot)
+                self.free_slots.append(slot)
+                if self.ann is not None:
+                    self.ann.mark_deleted(slot)
+            self.free_slots.sort(reverse=True)
+            for start in range(0, len(slots), 500):
+                batch = slots[start:start + 500]
+                self.db.execute(f"DELETE FROM rows WHERE slot IN ({','.join('?' * len(batch))})", batch)
+            self.db.commit()
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        with self.lock:
+            slots = self._slots_for(ids, where)
+            if offset:
+                slots = slots[offset:]
+            if limit is not None:
+                slots = slots[:limit]
+            result = {"ids": [self.ids[slot] for slot in slots]}
+            include = include or []
+            if "metadatas" in include:
+                result["metadatas"] = [self.metadatas[slot] for slot in slots]
+            if "documents" in include:
+                result["documents"] = self._documents(slots)
+            if "embeddings" in include:
+                result["embeddings"] = [self.vectors[slot].tolist() for slot in slots]
+            return result
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        with self.lock:
+            result = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+            include = include or []
+            candidates = self._slots_for(None, where) if where else None
+            for query in query_embeddings:
+                slots, distances = self._top_k(np.asarray(query, dtype=np.float32), n_results, candidates)
+                result["ids"].append([self.ids[slot] for slot in slots])
+                result["distances"].append(distances)
+                result["metadatas"].append([self.metadatas[slot] for slot in slots] if "metadatas" in include else None)
+                result["documents"].append(self._documents(slots) if "documents" in include else None)
+            return result
+
+    # ---------- tìm kiếm ----------
+
+    def _distances(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        dots = matrix @ query
+        if self.space == "cosine":
+            norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+            return 1.0 - dots / np.where(norms > 0, norms, 1.0)
+        if self.space == "ip":
+            return 1.0 - dots
+        return np.einsum("ij,ij->i", matrix, matrix) - 2 * dots + float(query @ query)
+
+    def _top_k(self, query: np.ndarray, k: int, candidates):
+        if self.vectors is None or not self.ids:
+            return [], []
+        use_ann = (
+            hnswlib is not None
+            and len(self.ids) >= self.ann_min_rows
+            and (candidates is None or len(candidates) >= self.ann_min_rows)
+        )
+        if use_ann:
+            return self._ann_query(query, k, candidates)
+        if hnswlib is None and not self.ann_unavailable_logged and len(self.ids) >= self.ann_min_rows:
+            print(
+                f"[LocalVectorStore] ⚠️ {self.name} có {len(self.ids)} vectors (>= LOCAL_ANN_MIN_ROWS={self.ann_min_rows}) "
+                "nhưng chưa cài hnswlib: tiếp tục tìm chính xác bằng NumPy."
+            )
+            self.ann_unavailable_logged = True
+
+        if self.codes is not None:
+            # Quét trên bản nén, giữ k * rescore_factor ứng viên để chấm lại bằng float32
+            slots, approx = self._approx_distances(candidates, query)
+            shortlist = min(len(self.ids) if candidates is None else len(slots), k * self.rescore_factor)
+            if not shortlist:
+                return [], []
+            slots = np.sort(slots[np.argpartition(approx, shortlist - 1)[:shortlist]])
+        else:
+            slots = np.asarray(candidates if candidates is not None else sorted(self.ids), dtype=np.int64)
+            if not len(slots):
+                return [], []
+        distances = self._distances(self.vectors[slots], query)
+        k = min(k, len(slots))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return slots[top].tolist(), distances[top].tolist()
+
+    def _approx_distances(self, candidates, query: np.ndarray):
+        """
+        Khoảng cách xấp xỉ trên vector nén, giải nén từng khối để giới hạn bộ nhớ tạm.
+        Không lọc thì quét tuần tự cả file (slot trống nhận khoảng cách vô cùng).
+        """
+        if candidates is None:
+            slots = np.arange(self._high_water(), dtype=np.int64)
+        else:
+            slots = np.asarray(candidates, dtype=np.int64)
+        if self.space == "cosine":
+            query = query / (np.linalg.norm(query) or 1.0)
+        distances = np.empty(len(slots), dtype=np.float32)
+        for start in range(0, len(slots), _SCAN_BLOCK_ROWS):
+            block = slice(start, min(start + _SCAN_BLOCK_ROWS, len(slots))) if candidates is None else slots[start:start + _SCAN_BLOCK_ROWS]
+            matrix = self.codes[block].astype(np.float32)
+            dots = matrix @ query
+            if self.scales is not None:
+                dots *= self.scales[block][:, 0]
+            if self.space in ("cosine", "ip"):
+                block_distances = 1.0 - dots
+            else:
+                if self.scales is not None:
+                    matrix *= self.scales[block]
+                block_distances = np.einsum("ij,ij->i", matrix, matrix) - 2 * dots + float(query @ query)
+            distances[start:start + len(block_distances)] = block_distances
+        if candidates is None and len(self.free_slots):
+            distances[[slot for slot in self.free_slots if slot < len(slots)]] = np.inf
+        return slots, distances
+
+    def _ann_upsert(self, slots: list[int]):
+        if self.ann is None or not slots:
+            return
+        needed = max(slots) + 1
+        if needed > self.ann.get_max_elements():
+            self.ann.resize_index(max(needed, 2 * self.ann.get_max_elements()))
+        for slot in slots:
+            try:
+                self.ann.unmark_deleted(slot)
+            except RuntimeError:
+                pass
+        self.ann.add_items(np.asarray(self.vectors[slots]), np.asarray(slots))
+
+    def _ann_query(self, query: np.ndarray, k: int, candidates):
+        if self.ann is None:
+            print(f"[LocalVectorStore] Dựng HNSW cho {self.name} ({len(self.ids)} vectors)...")
+            slots = np.asarray(sorted(self.ids), dtype=np.int64)
+            index = hnswlib.Index(space=self.space, dim=self.dim)
+            index.init_index(max_elements=max(self.capacity, 1), M=CHROMA_HNSW_M, ef_construction=CHROMA_HNSW_CONSTRUCTION_EF)
+            index.add_items(np.asarray(self.vectors[slots]), slots)
+            self.ann = index
+        self.ann.set_ef(max(CHROMA_HNSW_SEARCH_EF, k))
+        allowed = set(candidates) if candidates is not None else None
+        k = min(k, len(allowed) if allowed is not None else len(self.ids))
+        if k <= 0:
+            return [], []
+        labels, distances = self.ann.knn_query(
+            query, k=k, filter=(lambda label: label in allowed) if allowed is not None else None
+        )
+        return labels[0].tolist(), distances[0].tolist()
+
+
+class LocalVectorClient:
+    """
+    Backend vector chạy trong process (không cần ChromaDB server), mỗi collection một thư mục.
+    Cung cấp get_or_create_collection / get_collection / delete_collection như chromadb client.
+    """
+    def __init__(self, directory: str = LOCAL_VECTOR_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.collections = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        if not name or "/" in name or name.startswith("."):
+            raise ValueError(f"Tên collection không hợp lệ: {name}")
+        return os.path.join(self.directory, name)
+
+    def get_or_create_collection(self, name: str, metadata: dict | None = None, **kwargs) -> LocalCollection:
+        with self.lock:
+            if name not in self.collections:
+                space = (metadata or {}).get("hnsw:space", CHROMA_HNSW_SPACE)
+                self.collections[name] = LocalCollection(name, self._path(name), space=space)
+            return self.collections[name]
+
+    def get_collection(self, name: str, **kwargs) -> LocalCollection:
+        with self.lock:
+            if name in self.collections:
+                return self.collections[name]
+            path = self._path(name)
+            if not os.path.isdir(path):
+                raise ValueError(f"Collection {name} does not exist.")
+            self.collections[name] = LocalCollection(name, path)
+            return self.collections[name]
+
+    def delete_collection(self, name: str):
+        with self.lock:
+            collection = self.collections.pop(name, None)
+            if collection is not None:
+                collection.db.close()
+                collection._close_vectors()
+            path = self._path(name)
+            if not os.path.isdir(path):
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(path)
@@ -1,20 +1,37 @@
 import os
+import time
+import codecs
+import asyncio
 import mimetypes
+import multiprocessing
+from collections import deque
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor
 from minio import Minio
-from config import MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, MINIO_USE_SSL, MINIO_BUCKET
+from config import (
+    MINIO_ENDPOINT,
+    MINIO_ACCESS_KEY,
+    MINIO_SECRET_KEY,
+    MINIO_USE_SSL,
+    MINIO_BUCKET,
+    PARSE_PROCESS_WORKERS,
+    PARSE_MAX_TASKS_PER_CHILD,
+    PDF_PAGES_PER_TASK,
+    IN_MEMORY_PARSE_MAX_BYTES,
+    PARSED_CACHE_ENABLED,
+    PARSED_CACHE_MAX_ENTRY_CHARS,
+)
 import tempfile
-from utils_retry import retry_async
+from utils.metrics import register_metrics
+from services.document_parser import parse_document, parse_docx, parse_pdf_pages, parse_text_content
+from services.parsed_document_cache import ParsedDocumentCache
 from langchain_core.documents import Document
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    Docx2txtLoader,
-    TextLoader,
-    UnstructuredPowerPointLoader,
-    UnstructuredExcelLoader,
-    CSVLoader,
-)
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".doc", ".txt", ".md", ".pptx", ".ppt", ".csv", ".xlsx", ".xls"}
+# Đọc thẳng từ response MinIO thành text, không cần file tạm hay process pool
+TEXT_EXTENSIONS = {".txt", ".md", ".csv"}
+# Parse từ bytes trong bộ nhớ nếu nhỏ hơn IN_MEMORY_PARSE_MAX_BYTES
+IN_MEMORY_EXTENSIONS = {".pdf", ".docx", ".doc"}
 
 # Map CONTENT-TYPE to EXTENSION if extension is missing
 MIME_MAP = {
@@ -40,31 +57,57 @@ class MinioService:
             secure=MINIO_USE_SSL,
         )
         self.bucket = MINIO_BUCKET
+        self.parse_pool = None
+        self.parse_stats = {}
+        register_metrics("document_parse", self.get_parse_stats)
+        self.parsed_cache = ParsedDocumentCache() if PARSED_CACHE_ENABLED else None
+        if self.parsed_cache:
+            register_metrics("parsed_document_cache", self.parsed_cache.stats)
 
-    @retry_async(max_retries=3, delay=1, backoff=2)
-    async def load_documents(self, object_name: str, original_name: str = None):
-        """
-        Tải file từ MinIO, lưu tạm, parse thành Documents (LangChain), rồi xóa file tạm.
-        object_name: storageKey (UUID + extension) của file trong MinIO.
-        original_name: Tên gốc của file (Dùng làm metadata).
-        """
-        print(f"--> [MinIO] Đang tải file: {object_name}")
-        
+    def _get_parse_pool(self) -> ProcessPoolExecutor:
+        # Khởi tạo lazy; dùng "spawn" để process con không kế thừa thread/event loop của worker
+        if self.parse_pool is None:
+            self.parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=PARSE_MAX_TASKS_PER_CHILD,
+            )
+        return self.parse_pool
+
+    def _record_parse_time(self, file_extension: str, parse_seconds: float, wall_seconds: float):
+        stats = self.parse_stats.setdefault(
+            file_extension, {"files": 0, "parse_seconds": 0.0, "wall_seconds": 0.0, "max_parse_seconds": 0.0}
+        )
+        stats["files"] += 1
+        stats["parse_seconds"] += parse_seconds
+        stats["wall_seconds"] += wall_seconds
+        stats["max_parse_seconds"] = max(stats["max_parse_seconds"], parse_seconds)
+
+    def get_parse_stats(self) -> dict:
+        return {
+            ext: {**stats, "avg_parse_seconds": round(stats["parse_seconds"] / stats["files"], 3)}
+            for ext, stats in self.parse_stats.items()
+        }
+
+    def _stat(self, object_name: str):
+        try:
+            return self.client.stat_object(self.bucket, object_name)
+        except Exception as e:
+            print(f"--> [MinIO] Không thể stat object: {e}")
+            return None
+
+    def _resolve_extension(self, object_name: str, original_name: str = None, stat=None) -> str:
         # 1. Xác định extension
         file_extension = os.path.splitext(object_name)[1].lower()
         
         # Nếu storageKey không có extension, lấy từ MinIO metadata (stat_object)
-        if not file_extension:
-            try:
-                stat = self.client.stat_object(self.bucket, object_name)
-                content_type = stat.content_type
-                file_extension = MIME_MAP.get(content_type)
-                if not file_extension:
-                    file_extension = mimetypes.guess_extension(content_type)
-                
-                print(f"--> [MinIO] Detected content-type: {content_type} -> extension: {file_extension}")
-            except Exception as e:
-                print(f"--> [MinIO] Không thể stat object để lấy content-type: {e}")
+        if not file_extension and stat is not None:
+            content_type = stat.content_type
+            file_extension = MIME_MAP.get(content_type)
+            if not file_extension:
+                file_extension = mimetypes.guess_extension(content_type)
+            
+            print(f"--> [MinIO] Detected content-type: {content_type} -> extension: {file_extension}")
 
         # 2. Fallback cuối cùng sang original_name nếu vẫn không thấy extension
         if not file_extension and original_name:
@@ -76,11 +119,42 @@ class MinioService:
                 f"Định dạng '{file_extension}' của file '{original_name or object_name}' không được hỗ trợ. "
                 f"Hỗ trợ: {', '.join(sorted(SUPPORTED_EXTENSIONS))}"
             )
+        return file_extension
 
-        documents = []
-        temp_file_path = None
+    def _read_bytes(self, object_name: str) -> bytes:
+        try:
+            response = self.client.get_object(self.bucket, object_name)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+        except Exception as e:
+            print(f"--> [MinIO] Lỗi khi tải file từ MinIO: {e}")
+            raise RuntimeError(f"Không thể tải file '{object_name}' từ MinIO: {e}")
+
+    def _read_text(self, object_name: str) -> str:
+        # Giải mã UTF-8 tăng dần ngay trên stream của response, không giữ bản bytes đầy đủ
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        parts = []
+        try:
+            response = self.client.get_object(self.bucket, object_name)
+            try:
+                for chunk in response.stream(32 * 1024):
+                    parts.append(decoder.decode(chunk))
+                parts.append(decoder.decode(b"", final=True))
+            finally:
+                response.close()
+                response.release_conn()
+        except UnicodeDecodeError:
+            raise
+        except Exception as e:
+            print(f"--> [MinIO] Lỗi khi tải file từ MinIO: {e}")
+            raise RuntimeError(f"Không thể tải file '{object_name}' từ MinIO: {e}")
+        return "".join(parts)
 
-        # ── Tải file từ MinIO vào file tạm ──────────────────────────────────────
+    def _download_to_temp(self, object_name: str, file_extension: str) -> str:
+        temp_file_path = None
         with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp:
             temp_file_path = tmp.name
             try:
@@ -94,49 +168,154 @@ class MinioService:
                 if temp_file_path and os.path.exists(temp_file_path):
                     os.remove(temp_file_path)
                 raise RuntimeError(f"Không thể tải file '{object_name}' từ MinIO: {e}")
+        return temp_file_path
 
-        # ── Parse nội dung ────────────────────────────────────────────────────────
-        try:
-            print(f"--> [MinIO] Parse file tạm: {temp_file_path} ({file_extension})")
+    def _remove_temp(self, temp_file_path: str):
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+            print(f"--> [MinIO] Đã xóa file tạm.")
 
-            if file_extension == ".pdf":
-                loader = PyPDFLoader(temp_file_path)
-                documents = loader.load()
+    async def stream_documents(self, object_name: str, original_name: str = None):
+        """
+        Tải file từ MinIO và parse thành Documents (LangChain), yield từng Document (từng trang PDF,
+        từng dòng CSV...) ngay khi parse xong, để pipeline ingestion xử lý song song với việc parse.
+        object_name: storageKey (UUID + extension) của file trong MinIO.
+        original_name: Tên gốc của file (Dùng làm metadata).
+        Kiểm tra stat_object trước: nếu (storageKey, ETag) đã có trong cache parse
+        thì trả về luôn, không tải và không parse lại.
+        """
+        print(f"--> [MinIO] Đang tải file: {object_name}")
+        stat = await asyncio.to_thread(self._stat, object_name)
+        file_extension = self._resolve_extension(object_name, original_name, stat)
+        etag = stat.etag if stat is not None else None
 
-            elif file_extension in [".docx", ".doc"]:
-                loader = Docx2txtLoader(temp_file_path)
-                documents = loader.load()
+        def to_documents(pages):
+            return [
+                Document(
+                    page_content=text,
+                    metadata={**metadata, "source": object_name, "file_name": original_name or object_name},
+                )
+                for text, metadata in pages
+            ]
 
-            elif file_extension in [".txt", ".md"]:
-                loader = TextLoader(temp_file_path, encoding="utf-8")
-                documents = loader.load()
+        if self.parsed_cache and etag:
+            cached = await asyncio.to_thread(self.parsed_cache.get, object_name, etag)
+            if cached is not None:
+                print(f"--> [ParsedCache] HIT '{object_name}' (etag {etag}): {len(cached)} documents, bỏ qua tải + parse.")
+                for doc in to_documents(cached):
+                    yield doc
+                return
 
-            elif file_extension == ".csv":
-                loader = CSVLoader(temp_file_path, encoding="utf-8")
-                documents = loader.load()
+        # Giữ lại các trang đã parse để ghi cache (bỏ nếu nội dung quá lớn)
+        collected = [] if self.parsed_cache and etag else None
+        collected_chars = 0
+        count = 0
+        async with aclosing(self._iter_parsed_pages(object_name, file_extension, stat)) as batches:
+            async for pages in batches:
+                if collected is not None:
+                    collected.extend(pages)
+                    collected_chars += sum(len(text) for text, _ in pages)
+                    if collected_chars > PARSED_CACHE_MAX_ENTRY_CHARS:
+                        collected = None
+                for doc in to_documents(pages):
+                    count += 1
+                    yield doc
 
-            elif file_extension in [".pptx", ".ppt"]:
-                loader = UnstructuredPowerPointLoader(temp_file_path)
-                documents = loader.load()
+        if not count:
+            raise ValueError(f"File '{object_name}' không có nội dung hợp lệ để xử lý.")
 
-            elif file_extension in [".xlsx", ".xls"]:
-                loader = UnstructuredExcelLoader(temp_file_path)
-                documents = loader.load()
+        if collected is not None:
+            try:
+                await asyncio.to_thread(self.parsed_cache.put, object_name, etag, collected)
+            except Exception as e:
+                print(f"--> [ParsedCache] Không ghi được cache cho '{object_name}': {e}")
 
+    async def _iter_parsed_pages(self, object_name: str, file_extension: str, stat):
+        """
+        Tải + parse, yield từng lô [(text, metadata), ...].
+        - .txt/.md/.csv: đọc thẳng từ response MinIO thành text, parse ngay trong process.
+        - PDF/DOCX nhỏ hơn IN_MEMORY_PARSE_MAX_BYTES: đọc vào bộ nhớ, parse từ bytes.
+        - Còn lại: ghi ra file tạm, worker đọc qua mmap; PDF chia nhiều cửa sổ trang parse song song.
+        Mọi I/O MinIO chạy trong thread; parse nhị phân chạy trong ProcessPoolExecutor.
+        """
+        size = stat.size if stat is not None else None
+        loop = asyncio.get_running_loop()
+        pending = deque()
+        temp_file_path = None
+        started = time.perf_counter()
+        parse_seconds = 0.0
+        count = 0
+
+        try:
+            if file_extension in TEXT_EXTENSIONS:
+                print(f"--> [MinIO] Parse trong bộ nhớ (text): {object_name} ({file_extension})")
+                text = await asyncio.to_thread(self._read_text, object_name)
+                parse_started = time.perf_counter()
+                pages = parse_text_content(text, file_extension)
+                parse_seconds += time.perf_counter() - parse_started
+                count += len(pages)
+                yield pages
+
+            elif file_extension in IN_MEMORY_EXTENSIONS and size is not None and size <= IN_MEMORY_PARSE_MAX_BYTES:
+                print(f"--> [MinIO] Parse trong bộ nhớ ({size} bytes): {object_name} ({file_extension})")
+                data = await asyncio.to_thread(self._read_bytes, object_name)
+                if file_extension == ".pdf":
+                    task = loop.run_in_executor(self._get_parse_pool(), parse_pdf_pages, data, 0, float("inf"))
+                else:
+                    task = loop.run_in_executor(self._get_parse_pool(), parse_docx, data)
+                del data
+                pages, _, elapsed = await task
+                parse_seconds += elapsed
+                count += len(pages)
+                yield pages
+
+            else:
+                temp_file_path = await asyncio.to_thread(self._download_to_temp, object_name, file_extension)
+                print(f"--> [MinIO] Parse file tạm: {temp_file_path} ({file_extension})")
+                pool = self._get_parse_pool()
+                if file_extension == ".pdf":
+                    pages, total_pages, elapsed = await loop.run_in_executor(
+                        pool, parse_pdf_pages, temp_file_path, 0, PDF_PAGES_PER_TASK
+                    )
+                    parse_seconds += elapsed
+                    windows = iter(range(PDF_PAGES_PER_TASK, total_pages, PDF_PAGES_PER_TASK))
+
+                    def submit_next():
+                        start = next(windows, None)
+                        if start is not None:
+                            pending.append(loop.run_in_executor(
+                                pool, parse_pdf_pages, temp_file_path, start, start + PDF_PAGES_PER_TASK
+                            ))
+
+                    # Parse trước tối đa PARSE_PROCESS_WORKERS cửa sổ trong khi pipeline xử lý trang đầu
+                    for _ in range(PARSE_PROCESS_WORKERS):
+                        submit_next()
+                    count += len(pages)
+                    yield pages
+
+                    while pending:
+                        pages, _, elapsed = await pending.popleft()
+                        parse_seconds += elapsed
+                        submit_next()
+                        count += len(pages)
+                        yield pages
+                else:
+                    if file_extension in (".docx", ".doc"):
+                        task = loop.run_in_executor(pool, parse_docx, temp_file_path)
+                    else:
+                        task = loop.run_in_executor(pool, parse_document, temp_file_path, file_extension)
+                    pages, _, elapsed = await task
+                    parse_seconds += elapsed
+                    count += len(pages)
+                    yield pages
         except Exception as e:
             print(f"--> [MinIO] Lỗi khi parse document: {e}")
             raise RuntimeError(f"Không thể đọc nội dung file '{object_name}': {e}")
         finally:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                print(f"--> [MinIO] Đã xóa file tạm.")
-
-        if not documents:
-            raise ValueError(f"File '{object_name}' không có nội dung hợp lệ để xử lý.")
-
-        for doc in documents:
-            doc.metadata["source"] = object_name
-            doc.metadata["file_name"] = original_name or object_name
+            for future in pending:
+                future.cancel()
+            self._record_parse_time(file_extension, parse_seconds, time.perf_counter() - started)
+            if temp_file_path:
+                await asyncio.to_thread(self._remove_temp, temp_file_path)
 
-        print(f"--> [MinIO] Parse xong: {len(documents)} documents từ '{object_name}'")
-        return documents
\ No newline at end of file
+        print(f"--> [MinIO] Parse xong: {count} documents từ '{object_name}' (parse {parse_seconds:.2f}s)")
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from config import PARSED_CACHE_DIR, PARSED_CACHE_MAX_BYTES
+
+
+class ParsedDocumentCache:
+    """
+    Cache nội dung đã parse của file MinIO, key = (storageKey, ETag).
+    Mỗi entry là một file JSON nén zlib trên đĩa local; khi tổng dung lượng
+    vượt max_bytes thì xóa các entry có mtime cũ nhất (mtime được cập nhật khi hit).
+    """
+    def __init__(self, directory: str = PARSED_CACHE_DIR, max_bytes: int = PARSED_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith(".json.z")
+        )
+        print(f"--> [ParsedCache] {self.directory}: {self.total_bytes / (1024 * 1024):.1f}/{self.max_bytes / (1024 * 1024):.0f} MB")
+
+    def _path(self, object_name: str, etag: str) -> str:
+        digest = hashlib.sha256(f"{object_name}\0{etag}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json.z")
+
+    def get(self, object_name: str, etag: str):
+        """
+        Trả về list [(text, metadata), ...] hoặc None nếu chưa có.
+        """
+        path = self._path(object_name, etag)
+        try:
+            with open(path, "rb") as f:
+                pages = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            print(f"--> [ParsedCache] Entry hỏng, bỏ qua: {e}")
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return [(text, metadata) for text, metadata in pages]
+
+    def put(self, object_name: str, etag: str, pages: list):
+        path = self._path(object_name, etag)
+        data = zlib.compress(json.dumps(pages, ensure_ascii=False, default=str).encode("utf-8"), 6)
+        if len(data) > self.max_bytes:
+            return
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self.lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.total_bytes += len(data) - previous
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json.z")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        # Xóa tới 90% giới hạn để không phải evict ở mỗi lần ghi
+        target = int(self.max_bytes * 0.9)
+        for entry in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.total_bytes -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                continue
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from services.embedding_cache import _pack, _unpack
+from config import QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """NFC, chữ thường, gộp khoảng trắng: "Dự án  X?" và "dự án x?" dùng chung một embedding."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", query or "")).strip().casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Cache embedding của câu hỏi RAG, key = (model, câu hỏi đã chuẩn hóa).
+    Tầng 1: LRU trong process (max_entries, TTL). Tầng 2 (tùy chọn): Redis dùng chung giữa các worker.
+    Các câu hỏi giống nhau đến cùng lúc chỉ gọi embedding một lần.
+    """
+    def __init__(self, redis_client=None, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE, ttl: int = QUERY_EMBEDDING_CACHE_TTL):
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (vector, thời điểm hết hạn)
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def _get_local(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def _put_local(self, key: str, vector):
+        self.entries[key] = (vector, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_embed(self, query: str, model: str, embed):
+        """
+        Trả về embedding của query; embed: coroutine function(query) -> vector, chỉ gọi khi cache miss.
+        """
+        key = self.make_key(query, model)
+        vector = self._get_local(key)
+        if vector is not None:
+            self.hits_local += 1
+            return vector
+
+        pending = self.pending.get(key)
+        if pending is not None:
+            self.hits_local += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            vector = await self._get_redis(key)
+            if vector is not None:
+                self.hits_redis += 1
+            else:
+                self.misses += 1
+                vector = await embed(query)
+                if vector:
+                    await self._put_redis(key, vector)
+            if vector:
+                self._put_local(key, vector)
+            future.set_result(vector)
+            return vector
+        except BaseException as e:
+            future.set_exception(e)
+            # Tránh cảnh báo "exception never retrieved" khi không có ai chờ cùng
+            future.exception()
+            raise
+        finally:
+            self.pending.pop(key, None)
+
+    async def _get_redis(self, key: str):
+        if self.redis is None:
+            return None
+        try:
+            blob = await self.redis.get(f"qemb:{key}")
+        except Exception as e:
+            print(f"--> [QueryEmbeddingCache] Lỗi đọc Redis: {e}")
+            return None
+        return _unpack(blob) if blob else None
+
+    async def _put_redis(self, key: str, vector):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(f"qemb:{key}", _pack(vector), ex=self.ttl)
+        except Exception as e:
+            print(f"--> [QueryEmbeddingCache] Lỗi ghi Redis: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits_local + self.hits_redis + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits_local + self.hits_redis) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import RERANK_BATCH_WINDOW_MS, RERANK_MAX_BATCH_PAIRS, RERANK_MODEL
+from models.registry import ModelRegistry, model_registry
+
+
+class _RerankJob:
+    __slots__ = ("query", "texts", "future", "enqueued")
+
+    def __init__(self, query: str, texts: list[str], future: asyncio.Future):
+        self.query = query
+        self.texts = texts
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class RerankerService:
+    """
+    Chấm điểm (câu hỏi, đoạn văn) bằng cross-encoder ONNX của FlashRank, gom yêu cầu của nhiều câu hỏi:
+    yêu cầu đến trong cửa sổ window_ms (và trong lúc batch trước đang chạy) được ghép thành một lần
+    tokenize + một lần session.run, chạy trên thread riêng để không chặn event loop.
+    Model lấy từ registry (dùng chung trong process), được tải ở batch đầu tiên nếu chưa warm-up.
+    """
+    def __init__(
+        self,
+        registry: ModelRegistry = model_registry,
+        model_name: str = RERANK_MODEL,
+        window_ms: float = RERANK_BATCH_WINDOW_MS,
+        max_batch_pairs: int = RERANK_MAX_BATCH_PAIRS
+    ):
+        self.registry = registry
+        self.model_name = model_name
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch_pairs = max(1, max_batch_pairs)
+        # Một thread: mỗi lúc chỉ một batch chạy, ONNX Runtime tự dùng nhiều luồng bên trong
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self.requests = 0
+        self.batches = 0
+        self.pairs = 0
+        self.wait_seconds = 0.0
+        self.inference_seconds = 0.0
+
+    async def score(self, query: str, texts: list[str]) -> list[float]:
+        """Điểm liên quan (0..1) của từng đoạn văn với câu hỏi, cùng thứ tự với texts."""
+        if not texts:
+            return []
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_RerankJob(query, list(texts), future))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _collect(self, first: _RerankJob):
+        """Gom job cho một batch; trả về (batch, job để dành cho batch sau nếu vượt max_batch_pairs)."""
+        loop = asyncio.get_running_loop()
+        batch, pairs = [first], len(first.texts)
+        deadline = loop.time() + self.window
+        while pairs < self.max_batch_pairs:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                job = self._queue.get_nowait()
+            if pairs + len(job.texts) > self.max_batch_pairs:
+                return batch, job
+            batch.append(job)
+            pairs += len(job.texts)
+        return batch, None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        carry = None
+        while True:
+            first = carry if carry is not None else await self._queue.get()
+            batch, carry = await self._collect(first)
+            # Bỏ yêu cầu mà người gọi đã hủy (vd. client ngắt kết nối)
+            batch = [job for job in batch if not job.future.done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                scores = await loop.run_in_executor(self.executor, self._infer, batch)
+            except Exception as e:
+                print(f"--> [Reranker] Lỗi chạy batch {len(batch)} yêu cầu: {e}")
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            self.inference_seconds += time.perf_counter() - started
+            offset = 0
+            for job in batch:
+                self.pairs += len(job.texts)
+                self.wait_seconds += started - job.enqueued
+                if not job.future.done():
+                    job.future.set_result(scores[offset:offset + len(job.texts)])
+                offset += len(job.texts)
+
+    def _infer(self, batch: list[_RerankJob]) -> list[float]:
+        """
+        Một lần tokenize + session.run cho mọi cặp trong batch (cùng cách tính điểm với Ranker.rerank).
+        Dùng tokenizer/session bên trong Ranker của flashrank 0.2.10 (cố định trong requirements.txt).
+        """
+        ranker = self.registry.get_ranker(self.model_name)
+        pairs = [[job.query, text] for job in batch for text in job.texts]
+        encoded = ranker.tokenizer.encode_batch(pairs)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        token_type_ids = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+
+        onnx_input = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if not np.all(token_type_ids == 0):
+            onnx_input["token_type_ids"] = token_type_ids
+        logits = ranker.session.run(None, onnx_input)[0]
+
+        if logits.shape[1] == 1:
+            scores = 1 / (1 + np.exp(-logits.flatten()))
+        else:
+            exp_logits = np.exp(logits)
+            scores = exp_logits[:, 1] / np.sum(exp_logits, axis=1)
+        return [float(score) for score in scores]
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "avg_batch_requests": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "avg_batch_pairs": round(self.pairs / self.batches, 2) if self.batches else 0.0,
+            "avg_wait_ms": round(self.wait_seconds / self.requests * 1000, 2) if self.requests else 0.0,
+            "avg_inference_ms": round(self.inference_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+        }
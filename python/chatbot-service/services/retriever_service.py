@@ -1,14 +1,15 @@
-from flashrank import Ranker, RerankRequest
 from langchain_core.documents import Document
+from models.registry import ModelRegistry, model_registry
+from services.reranker_service import RerankerService
 
 class RetrieverService:
-    def __init__(self, embeddings, use_reranker: bool = False):
+    def __init__(self, embeddings, use_reranker: bool = False, registry: ModelRegistry = model_registry):
         self.embeddings = embeddings
         self.use_reranker = use_reranker
         
         if self.use_reranker:
-            print("🛠️ Loading FlashRank (Lightweight Reranker)...")
-            self.ranker = Ranker(model_name="ms-marco-TinyBERT-L-2-v2")
+            # Model FlashRank lấy từ registry dùng chung, không tải thêm bản thứ hai
+            self.reranker = RerankerService(registry)
 
     async def rerank_documents(self, query, documents):
         """
@@ -28,8 +29,11 @@ class RetrieverService:
                 "text": content,
                 "meta": meta
             })
-        request = RerankRequest(query=query, passages=passages)
-        results = self.ranker.rerank(request)
+        # Gom chung batch ONNX với các câu hỏi khác đang rerank, chạy ngoài event loop
+        scores = await self.reranker.score(query, [passage["text"] for passage in passages])
+        for score, passage in zip(scores, passages):
+            passage["score"] = score
+        results = sorted(passages, key=lambda x: x["score"], reverse=True)
         print(f"[Reranker] Done. Top score: {results[0]['score'] if results else 'N/A'}")
         final_docs = []
         for res in results:
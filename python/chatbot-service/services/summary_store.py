@@ -0,0 +1,51 @@
+import hashlib
+from config import SUMMARY_CACHE_TTL
+
+
+class SummaryStore:
+    """
+    Lưu bản tóm tắt đã sinh trong Redis, key = (storageKey, phiên bản nội dung, model, cấu hình tóm tắt).
+    Phiên bản nội dung là content_hash của các chunk đã được tóm tắt (VectorStoreService.content_version):
+    file được ingest lại với nội dung khác -> key mới, bản cũ tự hết hạn theo TTL.
+    """
+    def __init__(self, redis_client, ttl: int = SUMMARY_CACHE_TTL):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    @staticmethod
+    def _key(storage_key: str, version: str, model: str, settings: str = "") -> str:
+        digest = hashlib.sha256(f"{storage_key}\0{version}\0{model}\0{settings}".encode("utf-8")).hexdigest()
+        return f"summary:{digest}"
+
+    async def get(self, storage_key: str, version: str, model: str, settings: str = "") -> str | None:
+        try:
+            value = await self.redis.get(self._key(storage_key, version, model, settings))
+        except Exception as e:
+            print(f"--> [SummaryStore] Lỗi đọc Redis: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    async def put(self, storage_key: str, version: str, model: str, summary: str, settings: str = ""):
+        if not summary.strip():
+            return
+        try:
+            await self.redis.set(self._key(storage_key, version, model, settings), summary, ex=self.ttl)
+            self.stored += 1
+        except Exception as e:
+            print(f"--> [SummaryStore] Lỗi ghi Redis: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stored": self.stored,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
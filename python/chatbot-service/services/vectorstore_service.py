@@ -1,52 +1,234 @@
 from datetime import datetime
+import hashlib
 import json
 import os
 import chromadb
-from config import CHROMA_HOST, CHROMA_PORT
-import chromadb
+from config import CHROMA_HOST, CHROMA_PORT, VECTOR_BACKEND
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from services.minio_service import MinioService
 from services.llm_service import LLMService
+from services.ingest_manifest import IngestManifest
+from services.lexical_index import LexicalIndex
+from services.query_embedding_cache import QueryEmbeddingCache
 from aio_pika import Channel, Message, Exchange
-from config import INDEX_DOCUMENT_CHUNK_ROUTING_KEY
+from config import INDEX_DOCUMENT_CHUNK_ROUTING_KEY, INGESTION_QUEUE_SIZE, CHROMA_UPSERT_BATCH_SIZE, EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_CONCURRENCY, CHUNK_READ_PAGE_SIZE, COLLECTION_CACHE_TTL, COLLECTION_NEGATIVE_TTL
+from config import OLLAMA_EMBEDDING_MODEL
+from config import CHROMA_HNSW_SPACE, CHROMA_HNSW_M, CHROMA_HNSW_CONSTRUCTION_EF, CHROMA_HNSW_SEARCH_EF
+from config import CHROMA_MAX_WORKERS, CHROMA_READ_TIMEOUT, CHROMA_WRITE_TIMEOUT, CHROMA_DELETE_BATCH_SIZE
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from functools import partial
 from utils_retry import retry_async, retry_sync
 
+_STAGE_DONE = object()
+# Cấu hình index của collection mới (Chroma đọc các key "hnsw:*" trong metadata khi tạo collection)
+_COLLECTION_METADATA = {
+    "hnsw:space": CHROMA_HNSW_SPACE,
+    "hnsw:M": CHROMA_HNSW_M,
+    "hnsw:construction_ef": CHROMA_HNSW_CONSTRUCTION_EF,
+    "hnsw:search_ef": CHROMA_HNSW_SEARCH_EF,
+}
+# chunk_overlap của text splitter là 200; dò dư ra một chút vì splitter cắt theo ranh giới từ
+_MAX_CHUNK_OVERLAP = 250
+_MIN_CHUNK_OVERLAP = 20
+_SEGMENT_MAX_CHARS = 16000
+# Chunk embed qua /api/embed (vector đã chuẩn hóa) được đánh dấu "embedding_normalized" trong metadata.
+# Chunk thiếu dấu này được embed qua /api/embeddings (chưa chuẩn hóa): coi là cũ, embed lại khi ingest.
+_NORMALIZED_KEY = "embedding_normalized"
+
+
+def create_vector_client(backend: str = VECTOR_BACKEND):
+    """
+    Backend lưu vector của VectorStoreService. Mọi backend cung cấp cùng API client/collection
+    mà service dùng (get_or_create_collection / get_collection / delete_collection;
+    collection.get / query / upsert / update / delete / count):
+      - "chroma": ChromaDB server qua HTTP;
+      - "local": index trong process, vector NumPy memory-mapped (services/local_vector_store.py).
+    """
+    if backend == "local":
+        from services.local_vector_store import LocalVectorClient
+        return LocalVectorClient()
+    if backend != "chroma":
+        raise ValueError(f"VECTOR_BACKEND không hợp lệ: {backend}")
+    return chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+
+
+def _overlap_length(previous: str, current: str) -> int:
+    """Độ dài phần cuối của previous trùng với phần đầu của current (0 nếu không trùng)."""
+    for size in range(min(_MAX_CHUNK_OVERLAP, len(previous), len(current)), _MIN_CHUNK_OVERLAP - 1, -1):
+        if previous.endswith(current[:size]):
+            return size
+    return 0
+
 
 class VectorStoreService:
-    def __init__(self, llm_service: LLMService, minio: MinioService):
-        self.client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    def __init__(
+        self,
+        llm_service: LLMService,
+        minio: MinioService,
+        manifest: IngestManifest | None = None,
+        client=None,
+        lexical: LexicalIndex | None = None,
+        query_cache: QueryEmbeddingCache | None = None
+    ):
+        self.client = client if client is not None else create_vector_client()
         self.minio = minio
         self.llm = llm_service
+        self.manifest = manifest
+        # Index BM25 song song với vector (None = chỉ tìm kiếm vector)
+        self.lexical = lexical
+        self.query_cache = query_cache
+        # name -> (collection handle | None nếu chưa tồn tại, thời điểm hết hạn)
+        self._collections = {}
+        # name -> (collection có vector chuẩn hóa không, thời điểm hết hạn)
+        self._normalized = {}
+        # Nạp bổ sung index BM25 khi tìm kiếm: name -> source đã có trong index, name -> hạn quét lại cả collection,
+        # name -> task nạp bổ sung đang chạy
+        self._lexical_checked = {}
+        self._lexical_scanned = {}
+        self._lexical_backfills = {}
+        self.collection_cache_stats = {"hits": 0, "misses": 0, "negative_hits": 0}
+        # Mọi lời gọi ChromaDB (HTTP đồng bộ) chạy trên pool riêng có giới hạn,
+        # không chiếm event loop và không tranh thread với embedding/LLM.
+        self._executor = ThreadPoolExecutor(max_workers=CHROMA_MAX_WORKERS, thread_name_prefix="chroma")
+
+    async def _run(self, func, *args, timeout: float = CHROMA_READ_TIMEOUT, **kwargs):
+        """
+        Chạy một lời gọi ChromaDB trên executor riêng, có timeout.
+        Khi hết thời gian, coroutine nhận TimeoutError (thread vẫn chạy nốt lời gọi HTTP).
+        """
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._executor, partial(func, *args, **kwargs)), timeout)
+
+    async def _get_collection(self, name, create: bool = True):
+        """
+        Lấy collection handle, có cache trong process (TTL) để không gọi HTTP mỗi request.
+        create=False: trả về None nếu collection chưa tồn tại (kết quả này cũng được cache ngắn hạn).
+        """
+        now = time.monotonic()
+        cached = self._collections.get(name)
+        if cached is not None and cached[1] > now:
+            if cached[0] is not None:
+                self.collection_cache_stats["hits"] += 1
+                return cached[0]
+            if not create:
+                self.collection_cache_stats["negative_hits"] += 1
+                return None
+
+        self.collection_cache_stats["misses"] += 1
+        if create:
+            collection = await self._run(self.client.get_or_create_collection, name=name, metadata=_COLLECTION_METADATA)
+        else:
+            try:
+                collection = await self._run(self.client.get_collection, name=name)
+            except asyncio.TimeoutError:
+                raise
+            except Exception:
+                self._collections[name] = (None, now + COLLECTION_NEGATIVE_TTL)
+                return None
+        self._collections[name] = (collection, now + COLLECTION_CACHE_TTL)
+        return collection
+
+    async def _update_lexical(self, func, *args):
+        """Cập nhật index BM25; lỗi chỉ ghi log (index phụ, không làm hỏng ingestion/xóa)."""
+        try:
+            return await asyncio.to_thread(func, *args)
+        except Exception as e:
+            print(f"[VectorStore] Lỗi cập nhật index BM25: {e}")
+            return None
 
-    def _get_collection(self, name):
-        return self.client.get_or_create_collection(name=name)
+    def invalidate_collection(self, name):
+        self._collections.pop(name, None)
+        self._normalized.pop(name, None)
+        self._lexical_checked.pop(name, None)
+        self._lexical_scanned.pop(name, None)
+
+    async def _has_normalized_vectors(self, collection_name: str, collection) -> bool:
+        """
+        Collection đã có chunk embed qua /api/embed (vector chuẩn hóa) chưa (cache theo COLLECTION_CACHE_TTL).
+        Collection chỉ gồm chunk cũ (/api/embeddings) thì câu hỏi cũng phải embed kiểu cũ mới so sánh đúng.
+        Collection lẫn cả hai (đang được ingest lại dần) dùng vector chuẩn hóa.
+        """
+        now = time.monotonic()
+        cached = self._normalized.get(collection_name)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        found = await self._run(collection.get, where={_NORMALIZED_KEY: True}, limit=1, include=[])
+        normalized = bool(found and found.get('ids')) or not await self._run(collection.count)
+        self._normalized[collection_name] = (normalized, now + COLLECTION_CACHE_TTL)
+        return normalized
+
+    def get_collection_cache_stats(self) -> dict:
+        return {**self.collection_cache_stats, "size": len(self._collections)}
 
     @retry_async(max_retries=3, delay=1, backoff=2)
-    async def delete_collection(self, collection_name: str):
+    async def delete_collection(self, collection_name: str) -> int:
+        """Xóa cả collection, trả về số chunk đã bị xóa (0 nếu collection không tồn tại)."""
+        removed = 0
+        # Không tin kết quả "chưa tồn tại" đã cache khi xóa
+        self.invalidate_collection(collection_name)
         try:
-            print(f"[VectorStore] Đang xóa collection: {collection_name}")
-            def _delete():
-                self.client.delete_collection(name=collection_name)
-            await asyncio.to_thread(_delete)
+            collection = await self._get_collection(collection_name, create=False)
+            self.invalidate_collection(collection_name)
+            if collection is None:
+                print(f"[VectorStore] Collection {collection_name} không tồn tại, bỏ qua.")
+                return 0
+            removed = await self._run(collection.count)
+            print(f"[VectorStore] Đang xóa collection: {collection_name} ({removed} chunks)")
+            if self.manifest is not None:
+                await self.manifest.drop(collection_name)
+            if self.lexical is not None:
+                await self._update_lexical(self.lexical.drop, collection_name)
+            await self._run(self.client.delete_collection, name=collection_name, timeout=CHROMA_WRITE_TIMEOUT)
+            self.invalidate_collection(collection_name)
             print(f"[VectorStore] Đã xóa thành công collection {collection_name}.")
         except Exception as e:
             print(f"[VectorStore] Lỗi hoặc collection không tồn tại: {e}")
+            return 0
+        return removed
     
+    async def delete_documents_by_source(self, collection_name: str, file_source: str) -> int:
+        return await self.delete_documents_by_sources(collection_name, [file_source])
+
+    async def delete_documents_by_sources(self, collection_name: str, file_sources: list[str], batch_size: int = CHROMA_DELETE_BATCH_SIZE) -> int:
+        """
+        Xóa chunk của nhiều file cùng lúc theo {"source": {"$in": [...]}}, mỗi lô tối đa batch_size file.
+        Trả về tổng số chunk đã xóa.
+        """
+        sources = list(dict.fromkeys(source for source in file_sources if source))
+        if not sources:
+            return 0
+        self.invalidate_collection(collection_name)
+        collection = await self._get_collection(collection_name, create=False)
+        if collection is None:
+            print(f"[VectorStore] Collection {collection_name} không tồn tại, không có chunk nào để xóa.")
+            return 0
+
+        print(f"[VectorStore] Đang xóa chunk của {len(sources)} file trong collection {collection_name}")
+        if self.manifest is not None:
+            await self.manifest.remove(collection_name, sources)
+        if self.lexical is not None:
+            await self._update_lexical(self.lexical.delete_sources, collection_name, sources)
+        removed = 0
+        for start in range(0, len(sources), batch_size):
+            removed += await self._delete_source_batch(collection_name, collection, sources[start:start + batch_size])
+        print(f"[VectorStore] Đã xóa {removed} chunks của {len(sources)} file.")
+        return removed
+
     @retry_async(max_retries=3, delay=1, backoff=2)
-    async def delete_documents_by_source(self, collection_name: str, file_source: str):
+    async def _delete_source_batch(self, collection_name: str, collection, sources: list[str]) -> int:
+        where = {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": sources}}
         try:
-            collection = self._get_collection(collection_name)
-            print(f"[VectorStore] Đang xóa các chunk cũ của file: {file_source} trong collection {collection_name}")
-            
-            def _delete():
-                collection.delete(where={"source": file_source})
-
-            await asyncio.to_thread(_delete)
-            print(f"[VectorStore] Đã xóa thành công các chunk cũ.")
-            
-        except Exception as e:
-            print(f"[VectorStore] Không thể xóa chunk cũ (có thể là file mới): {e}")
+            found = await self._run(collection.get, where=where, include=[])
+            ids = (found or {}).get('ids') or []
+            for start in range(0, len(ids), CHROMA_UPSERT_BATCH_SIZE):
+                await self._run(collection.delete, ids=ids[start:start + CHROMA_UPSERT_BATCH_SIZE], timeout=CHROMA_WRITE_TIMEOUT)
+        except Exception:
+            self.invalidate_collection(collection_name)
+            raise
+        return len(ids)
     
     @retry_async(max_retries=3, delay=1, backoff=2)
     async def search(self, collection_name: str, query: str, k: int = 5, file_ids: list = None):
@@ -54,13 +236,12 @@ class VectorStoreService:
         Tìm kiếm vector bằng native client (không qua LangChain).
         Nếu file_ids được cung cấp, chỉ tìm trong các file đó.
         """
-        try:
-            collection = self.client.get_collection(name=collection_name)
-        except Exception:
+        collection = await self._get_collection(collection_name, create=False)
+        if collection is None:
             print(f"Collection {collection_name} chưa tồn tại.")
             return []
 
-        query_vec = self.llm.get_embedding(query)
+        query_vec = await self.embed_query(query, normalized=await self._has_normalized_vectors(collection_name, collection))
 
         query_kwargs = {
             "query_embeddings": [query_vec],
@@ -75,7 +256,12 @@ class VectorStoreService:
                 query_kwargs["where"] = {"source": {"$in": file_ids}}
             print(f"[RAG] Filter theo {len(file_ids)} file(s): {file_ids}")
 
-        results = collection.query(**query_kwargs)
+        try:
+            results = await self._run(collection.query, **query_kwargs)
+        except Exception:
+            # Handle có thể đã cũ (collection bị xóa/tạo lại ở nơi khác), lần retry sẽ lấy lại
+            self.invalidate_collection(collection_name)
+            raise
 
         formatted_docs = []
         if results['ids'] and results['ids'][0]:
@@ -86,7 +272,196 @@ class VectorStoreService:
                 formatted_docs.append(Document(page_content=doc_content, metadata=metadata))
                 
         return formatted_docs
+
+    async def embed_query(self, query: str, normalized: bool = True):
+        """
+        Embedding câu hỏi, qua query cache nếu có (câu hỏi lặp lại không gọi Ollama).
+        normalized=False: vector chưa chuẩn hóa (/api/embeddings), cùng kiểu với chunk của collection cũ.
+        """
+        embed, model = self.llm.aget_embedding, OLLAMA_EMBEDDING_MODEL
+        if not normalized:
+            embed, model = self.llm.aget_legacy_embedding, f"{OLLAMA_EMBEDDING_MODEL}:legacy"
+        if self.query_cache is None:
+            return await embed(query)
+        return await self.query_cache.get_or_embed(query, model, embed)
+
+    async def lexical_search(self, collection_name: str, query: str, k: int = 10, file_ids: list = None):
+        """Tìm kiếm BM25 trên index lexical (không cần embedding), lọc theo file_ids nếu có."""
+        if self.lexical is None:
+            return []
+        self._schedule_lexical_backfill(collection_name, file_ids)
+        return await asyncio.to_thread(self.lexical.search, collection_name, query, k, file_ids or None)
+
+    def _schedule_lexical_backfill(self, collection_name: str, file_ids: list | None):
+        """
+        Index BM25 nằm trên đĩa của từng worker: file ingest trước khi có index hoặc ở worker khác
+        chưa có trong index. Chạy nền việc nạp bổ sung các file đó (lần tìm kiếm sau sẽ có kết quả BM25).
+        Tìm trong cả collection thì quét danh sách file từ ChromaDB, tối đa mỗi COLLECTION_CACHE_TTL một lần.
+        """
+        checked = self._lexical_checked.get(collection_name, set())
+        if file_ids:
+            if all(file_id in checked for file_id in file_ids):
+                return
+        elif self._lexical_scanned.get(collection_name, 0) > time.monotonic():
+            return
+        task = self._lexical_backfills.get(collection_name)
+        if task is not None and not task.done():
+            return
+        self._lexical_backfills[collection_name] = asyncio.create_task(
+            self._backfill_lexical_sources(collection_name, list(file_ids) if file_ids else None)
+        )
+
+    async def _backfill_lexical_sources(self, collection_name: str, file_ids: list | None):
+        try:
+            collection = await self._get_collection(collection_name, create=False)
+            if collection is None:
+                return
+            sources = file_ids
+            if sources is None:
+                found = await self._run(collection.get, include=["metadatas"])
+                sources = list(dict.fromkeys(
+                    meta.get("source") for meta in (found or {}).get("metadatas") or [] if meta.get("source")
+                ))
+            checked = self._lexical_checked.setdefault(collection_name, set())
+            for source in sources:
+                if source not in checked:
+                    await self._backfill_lexical(collection_name, collection, source)
+                    checked.add(source)
+            if file_ids is None:
+                self._lexical_scanned[collection_name] = time.monotonic() + COLLECTION_CACHE_TTL
+        except Exception as e:
+            print(f"[VectorStore] Lỗi nạp bổ sung index BM25 cho {collection_name}: {e}")
             
+    async def list_files(self, collection_name: str) -> dict[str, dict]:
+        """Danh sách file đã ingest của collection (theo manifest): source -> thông tin ingest."""
+        if self.manifest is None:
+            return {}
+        return await self.manifest.list_sources(collection_name)
+
+    async def has_chunks(self, collection_name: str, file_id: str) -> bool:
+        if self.manifest is not None and await self.manifest.get(collection_name, file_id):
+            return True
+        collection = await self._get_collection(collection_name, create=False)
+        if collection is None:
+            return False
+        result = await self._run(collection.get, where={"source": file_id}, limit=1, include=[])
+        return bool(result and result.get('ids'))
+
+    async def content_version(self, collection_name: str, file_id: str) -> str | None:
+        """
+        Phiên bản nội dung của file đang lưu: content_hash cả file (manifest, hoặc tính từ metadata chunk).
+        None nếu file chưa có chunk hoặc có chunk cũ không mang content_hash.
+        """
+        if self.manifest is not None:
+            entry = await self.manifest.get(collection_name, file_id)
+            if entry and entry.get("content_hash"):
+                return entry["content_hash"]
+        collection = await self._get_collection(collection_name, create=False)
+        if collection is None:
+            return None
+        found = await self._run(collection.get, where={"source": file_id}, include=["metadatas"])
+        metas = sorted((found or {}).get("metadatas") or [], key=lambda meta: meta.get("chunk_id", 0))
+        if not metas or not all(meta.get("content_hash") for meta in metas):
+            return None
+        return IngestManifest.content_hash([meta["content_hash"] for meta in metas])
+
+    async def iter_document_text(self, collection_name: str, file_id: str, page_size: int = CHUNK_READ_PAGE_SIZE):
+        """
+        Đọc lại nội dung file từ các chunk đã lưu, theo thứ tự chunk_id, từng trang
+        [start, start + page_size) để không phải tải cả file một lần.
+        Cắt phần chunk_overlap giữa hai chunk liên tiếp rồi ghép thành các đoạn liền mạch.
+        chunk_id có thể bị ngắt quãng (chunk rỗng, chunk bị xóa), nên đọc tới chunk_id lớn nhất
+        thay vì dừng ở trang rỗng đầu tiên.
+        """
+        collection = await self._get_collection(collection_name, create=False)
+        if collection is None:
+            return
+        found = await self._run(collection.get, where={"source": file_id}, include=["metadatas"])
+        chunk_ids = [meta.get("chunk_id", 0) for meta in (found or {}).get("metadatas") or []]
+        if not chunk_ids:
+            return
+        last = max(chunk_ids)
+        start = 0
+        previous = None
+        segment = []
+        segment_size = 0
+        while start <= last:
+            result = await self._run(
+                collection.get,
+                where={"$and": [
+                    {"source": file_id},
+                    {"chunk_id": {"$gte": start}},
+                    {"chunk_id": {"$lt": start + page_size}}
+                ]},
+                include=["documents", "metadatas"]
+            )
+            start += page_size
+            if not result or not result.get('ids'):
+                continue
+
+            rows = sorted(zip(result['metadatas'], result['documents']), key=lambda row: row[0].get("chunk_id", 0))
+            for _, text in rows:
+                if not text:
+                    continue
+                overlap = _overlap_length(previous, text) if previous is not None else 0
+                if previous is not None and not overlap and segment:
+                    # Không trùng -> sang trang/đoạn mới của tài liệu gốc
+                    yield "".join(segment)
+                    segment, segment_size = [], 0
+                elif segment_size >= _SEGMENT_MAX_CHARS:
+                    yield "".join(segment)
+                    segment, segment_size = [], 0
+                piece = text[overlap:]
+                segment.append(piece)
+                segment_size += len(piece)
+                previous = text
+
+        if segment:
+            yield "".join(segment)
+
+    async def _backfill_manifest(self, collection_name: str, file_id: str, existing: dict):
+        """Manifest miss nhưng ChromaDB đã có chunk (ingest trước khi có manifest): ghi bổ sung entry."""
+        if self.manifest is None or not existing:
+            return
+        metas = sorted(existing.values(), key=lambda meta: meta.get("chunk_id", 0))
+        await self.manifest.put(collection_name, file_id, {
+            "chunks": len(metas),
+            "content_hash": IngestManifest.content_hash([meta.get("content_hash", "") for meta in metas]),
+            "embedding_model": metas[0].get("embedding_model") or OLLAMA_EMBEDDING_MODEL,
+            _NORMALIZED_KEY: all(meta.get(_NORMALIZED_KEY) for meta in metas),
+            "ingested_at": metas[0].get("processed_at")
+        })
+
+    @retry_async(max_retries=3, delay=1, backoff=2)
+    async def _backfill_lexical(self, collection_name: str, collection, file_id: str):
+        """File đã có trong ChromaDB nhưng chưa có trong index BM25 (ingest trước khi có index): nạp bổ sung."""
+        if self.lexical is None or await asyncio.to_thread(self.lexical.has_source, collection_name, file_id):
+            return
+        found = await self._run(collection.get, where={"source": file_id}, include=["documents", "metadatas"])
+        ids = (found or {}).get("ids") or []
+        if not ids:
+            return
+        await self._update_lexical(
+            self.lexical.replace_source, collection_name, file_id, ids, found["documents"], found["metadatas"]
+        )
+        print(f"[VectorStore] Đã bổ sung {len(ids)} chunks của {file_id} vào index BM25.")
+
+    def _build_chunk_metadata(self, user_id, file_id, team_id, index, processing_time, doc_metadata, content_hash):
+        final_meta = {
+            "user_id": user_id,
+            "source": file_id,
+            "chunk_id": index,
+            "content_hash": content_hash,
+            "embedding_model": OLLAMA_EMBEDDING_MODEL,
+            _NORMALIZED_KEY: True,
+            "processed_at": processing_time
+        }
+        if team_id: final_meta["team_id"] = team_id
+        
+        if isinstance(doc_metadata, dict):
+            final_meta.update(doc_metadata)
+        return final_meta
+
     @retry_async(max_retries=3, delay=2, backoff=2)
     async def process_and_store(
         self, 
@@ -95,122 +470,244 @@ class VectorStoreService:
         search_exchange: Exchange,
         team_id: str | None = None,
         original_name: str | None = None,
+        reingest_mode: str = "skip",
         ):
-        print(f"[VectorStore] Đang tải file: {file_id} (original: {original_name})")
-        raw_docs = await self.minio.load_documents(file_id, original_name)
-        
-        if not raw_docs:
-            print(f"[VectorStore] Không tải được tài liệu: {file_id}")
-            return 
+        """
+        Pipeline ingestion gồm các stage nối bằng queue có giới hạn:
+        download + parse (MinIO, từng trang) -> split -> embed (theo lô) -> upsert (theo lô).
+        reingest_mode khi file đã có chunk trong collection:
+          - "skip": coi là CACHE HIT, không làm gì.
+          - "full": embed lại toàn bộ, chunk cũ không còn trong file chỉ bị xóa sau khi lưu xong chunk mới.
+          - "diff": so content_hash từng chunk, chỉ embed chunk mới, xóa chunk không còn,
+                    giữ nguyên chunk không đổi (chỉ cập nhật vị trí nếu bị dịch).
+        """
+        if reingest_mode not in ("skip", "full", "diff"):
+            raise ValueError(f"reingest_mode không hợp lệ: {reingest_mode}")
 
         collection_name = f"user_{user_id}" if team_id is None else f"team_{team_id}"
-        collection = self._get_collection(collection_name)
+        collection = await self._get_collection(collection_name)
+
+        # Manifest: kiểm tra "đã ingest" bằng 1 lệnh Redis thay vì kéo metadata mọi chunk từ ChromaDB
+        manifest_entry = None
+        if self.manifest is not None:
+            manifest_entry = await self.manifest.get(collection_name, file_id)
+            if (
+                manifest_entry and reingest_mode == "skip"
+                and manifest_entry.get("embedding_model") == OLLAMA_EMBEDDING_MODEL and manifest_entry.get(_NORMALIZED_KEY)
+            ):
+                print(f"--> [CACHE HIT] File '{file_id}' đã tồn tại ({manifest_entry.get('chunks')} chunks, manifest). Bỏ qua Embedding.")
+                await self._backfill_lexical(collection_name, collection, file_id)
+                return
         
-        existing_docs = collection.get(
-            where={"source": file_id}, 
-            include=["metadatas"] 
-        )
-        count = 0
-        if existing_docs and 'ids' in existing_docs:
-            count = len(existing_docs['ids'])
+        try:
+            existing_docs = await self._run(
+                collection.get,
+                where={"source": file_id}, 
+                include=["metadatas"] 
+            )
+        except Exception:
+            self.invalidate_collection(collection_name)
+            raise
+        existing = {}
+        if existing_docs and existing_docs.get('ids'):
+            existing = dict(zip(existing_docs['ids'], existing_docs['metadatas']))
             
-        if count > 0:
-            print(f"--> [CACHE HIT] File '{file_id}' đã tồn tại ({count} chunks). Bỏ qua Embedding.")
-            return raw_docs
+        stale_models = {
+            meta.get("embedding_model") for meta in existing.values()
+            if meta.get("embedding_model") not in (None, OLLAMA_EMBEDDING_MODEL)
+        }
+        if manifest_entry and manifest_entry.get("embedding_model") not in (None, OLLAMA_EMBEDDING_MODEL):
+            stale_models.add(manifest_entry["embedding_model"])
+        if existing and stale_models:
+            # Vector cũ sinh bởi model embedding khác -> không dùng lại được, embed lại toàn bộ
+            print(f"[VectorStore] File {file_id} được embed bằng model cũ {sorted(stale_models)}, embed lại toàn bộ.")
+            reingest_mode = "full"
+        elif existing and any(not meta.get(_NORMALIZED_KEY) for meta in existing.values()):
+            # Vector từ /api/embeddings (chưa chuẩn hóa), câu hỏi mới embed qua /api/embed -> embed lại toàn bộ
+            print(f"[VectorStore] File {file_id} có chunk embed qua endpoint cũ (vector chưa chuẩn hóa), embed lại toàn bộ.")
+            reingest_mode = "full"
 
-        print(f"[VectorStore] Chưa có dữ liệu, bắt đầu Embedding mới...")
-        print(f"[VectorStore] Đã tải {len(raw_docs)} tài liệu. Đang tách...")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        docs = text_splitter.split_documents(raw_docs)
+        if existing and reingest_mode == "skip":
+            print(f"--> [CACHE HIT] File '{file_id}' đã tồn tại ({len(existing)} chunks). Bỏ qua Embedding.")
+            await self._backfill_manifest(collection_name, file_id, existing)
+            await self._backfill_lexical(collection_name, collection, file_id)
+            return
+
+        if self.manifest is not None and (existing or manifest_entry):
+            # Gỡ entry trước khi sửa chunk: nếu ingest dở dang, lần sau sẽ đọc lại từ ChromaDB
+            await self.manifest.remove(collection_name, [file_id])
 
-        ids = []
-        embeddings = []
-        metadatas = []
-        documents_content = []
-        tasks = []
+        # Chunk cũ được dùng lại (không embed lại) - chỉ ở chế độ diff.
+        # Ở chế độ full, chunk cũ vẫn giữ nguyên tới khi chunk mới được lưu xong, rồi mới xóa
+        # những id không còn: ingest lỗi giữa chừng thì file vẫn còn vector cũ.
+        reusable = existing if reingest_mode == "diff" else {}
+        if existing and reingest_mode == "diff":
+            print(f"[VectorStore] File {file_id} đã có {len(existing)} chunks, re-ingest theo diff...")
+        else:
+            print(f"[VectorStore] Bắt đầu Embedding mới: {file_id} (original: {original_name})")
 
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
         processing_time = datetime.utcnow().isoformat()
-        
-        print(f"[VectorStore] Đang xử lý {len(docs)} chunks (Embedding + RabbitMQ)...")
-        
-        for i, doc in enumerate(docs):
-            chunk_id = f"{file_id}_{i}"
-            
-            doc_content = ""
-            doc_metadata = {}
-
-            if hasattr(doc, 'page_content'):
-                doc_content = doc.page_content
-                doc_metadata = doc.metadata if hasattr(doc, 'metadata') else {}
-            elif isinstance(doc, tuple) and len(doc) >= 1:
-                doc_content = doc[0]
-                if len(doc) > 1:
-                    doc_metadata = doc[1]
-            else:
-                doc_content = str(doc)
-            
-            if not doc_content:
-                print(f"--> [WARNING] Chunk {i} rỗng, bỏ qua.")
-                continue
+        chunk_queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+        record_queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+        seen_ids = set()
+        added_ids = []
+        chunk_hashes = []
+        # (id, nội dung, metadata) của mọi chunk hiện tại, để đồng bộ index BM25 khi xong
+        lexical_rows = []
+        moved = []
+        stats = {"pages": 0, "chunks": 0, "stored": 0, "unchanged": 0, "moved": 0, "failed": 0}
+
+        def make_metadata(index, doc_metadata, content_hash):
+            return self._build_chunk_metadata(user_id, file_id, team_id, index, processing_time, doc_metadata, content_hash)
+
+        async def flush_moved():
+            # Chunk không đổi nội dung nhưng đổi vị trí: chỉ cập nhật metadata, không embed lại
+            if not moved:
+                return
+            await self._run(
+                collection.update,
+                ids=[chunk_id for chunk_id, _ in moved],
+                metadatas=[meta for _, meta in moved],
+                timeout=CHROMA_WRITE_TIMEOUT
+            )
+            moved.clear()
+
+        async def split_stage():
+            index = 0
+            occurrences = {}
+            async with aclosing(self.minio.stream_documents(file_id, original_name)) as pages:
+                async for page in pages:
+                    stats["pages"] += 1
+                    for doc in text_splitter.split_documents([page]):
+                        if not doc.page_content:
+                            print(f"--> [WARNING] Chunk {index} rỗng, bỏ qua.")
+                            index += 1
+                            continue
+                        stats["chunks"] += 1
+                        content_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+                        chunk_hashes.append(content_hash)
+                        # Id theo nội dung để chunk không đổi giữ nguyên id khi file bị sửa
+                        occurrence = occurrences.get(content_hash, 0)
+                        occurrences[content_hash] = occurrence + 1
+                        chunk_id = f"{file_id}_{content_hash[:16]}_{occurrence}"
+                        seen_ids.add(chunk_id)
+                        if self.lexical is not None:
+                            lexical_rows.append((chunk_id, doc.page_content, make_metadata(index, doc.metadata, content_hash)))
+
+                        old_meta = reusable.get(chunk_id)
+                        if old_meta is not None and old_meta.get("content_hash") == content_hash:
+                            stats["unchanged"] += 1
+                            if old_meta.get("chunk_id") != index:
+                                stats["moved"] += 1
+                                moved.append((chunk_id, make_metadata(index, doc.metadata, content_hash)))
+                                if len(moved) >= CHROMA_UPSERT_BATCH_SIZE:
+                                    await flush_moved()
+                        else:
+                            await chunk_queue.put((chunk_id, index, doc.page_content, doc.metadata, content_hash))
+                        index += 1
+            await flush_moved()
+            await chunk_queue.put(_STAGE_DONE)
+
+        async def embed_stage():
+            # Gom đủ số chunk cho EMBEDDING_MAX_CONCURRENCY lô để embed_batched chạy song song
+            window = EMBEDDING_BATCH_SIZE * EMBEDDING_MAX_CONCURRENCY
+            pending = []
+
+            async def flush():
+                vectors = await self.llm.embed_batched([item[2] for item in pending])
+                for item, vector in zip(pending, vectors):
+                    if not vector:
+                        stats["failed"] += 1
+                        continue
+                    await record_queue.put((*item, vector))
+                pending.clear()
+
+            while True:
+                item = await chunk_queue.get()
+                if item is _STAGE_DONE:
+                    break
+                pending.append(item)
+                if len(pending) >= window:
+                    await flush()
+            if pending:
+                await flush()
+            await record_queue.put(_STAGE_DONE)
+
+        async def upsert_stage():
+            batch = []
+
+            async def flush():
+                ids, embeddings, metadatas, documents_content = [], [], [], []
+                for chunk_id, index, content, doc_metadata, content_hash, vector in batch:
+                    ids.append(chunk_id)
+                    embeddings.append(vector)
+                    metadatas.append(make_metadata(index, doc_metadata, content_hash))
+                    documents_content.append(content)
+                await self._run(
+                    collection.upsert,
+                    ids=ids,
+                    embeddings=embeddings,
+                    metadatas=metadatas,
+                    documents=documents_content,
+                    timeout=CHROMA_WRITE_TIMEOUT
+                )
+                added_ids.extend(ids)
+                stats["stored"] += len(ids)
+                print(f"[VectorStore] Đã lưu {stats['stored']} chunks vào ChromaDB...")
+                batch.clear()
 
+            while True:
+                item = await record_queue.get()
+                if item is _STAGE_DONE:
+                    break
+                batch.append(item)
+                if len(batch) >= CHROMA_UPSERT_BATCH_SIZE:
+                    await flush()
+            if batch:
+                await flush()
+
+        stages = [asyncio.create_task(stage()) for stage in (split_stage, embed_stage, upsert_stage)]
+        try:
+            await asyncio.gather(*stages)
+            if stats["failed"]:
+                # File thiếu chunk thì không được coi là đã ingest (manifest, CACHE HIT): báo lỗi để retry.
+                # Có embedding cache thì lần thử lại chỉ gọi Ollama cho các chunk lỗi
+                raise RuntimeError(f"{stats['failed']}/{stats['chunks']} chunks của {file_id} không embed được.")
+        except Exception:
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            # Xóa các chunk mới đã upsert dở để lần retry không nhầm là CACHE HIT;
+            # id đã có từ trước (cùng nội dung, bị ghi đè) được giữ lại cùng các chunk cũ
+            new_ids = [chunk_id for chunk_id in added_ids if chunk_id not in existing]
             try:
-                if asyncio.iscoroutinefunction(self.llm.get_embedding):
-                    vector = await self.llm.get_embedding(doc_content)
-                else:
-                    vector = self.llm.get_embedding(doc_content)
+                for start in range(0, len(new_ids), CHROMA_UPSERT_BATCH_SIZE):
+                    await self._run(collection.delete, ids=new_ids[start:start + CHROMA_UPSERT_BATCH_SIZE], timeout=CHROMA_WRITE_TIMEOUT)
             except Exception as e:
-                print(f"--> [ERROR] Lỗi Embedding chunk {i}: {e}")
-                vector = None
-
-            if not vector: continue
-
-            final_meta = {
-                "user_id": user_id,
-                "source": file_id,
-                "chunk_id": i,
-                "processed_at": processing_time
-            }
-            if team_id: final_meta["team_id"] = team_id
-            
-            if isinstance(doc_metadata, dict):
-                final_meta.update(doc_metadata)
-
-            ids.append(chunk_id)
-            embeddings.append(vector)
-            metadatas.append(final_meta)
-            documents_content.append(doc_content)
-
-            # chunk_payload = {
-            #     "chunk_id": chunk_id,
-            #     "content": doc_content,
-            #     "metadata": final_meta
-            # }
-            # message_body = json.dumps(chunk_payload, default=str).encode('utf-8')
-            # message = Message(
-            #     body=message_body,
-            #     content_type="application/json",
-            # )
-            # tasks.append(search_exchange.publish(message, routing_key=INDEX_DOCUMENT_CHUNK_ROUTING_KEY))
-        collection_name = f"user_{user_id}" if team_id is None else f"team_{team_id}"
-        collection = self._get_collection(collection_name)
+                print(f"[VectorStore] Không thể dọn chunk dở dang của {file_id}: {e}")
+            raise
 
-        print(f"[VectorStore] Đang xóa dữ liệu cũ của file {file_id}...")
-        try:
-            collection.delete(where={"source": file_id})
-        except Exception as e:
-            print(f"Lỗi khi xóa (có thể là file mới): {e}")
-
-        print(f"[VectorStore] Đang lưu {len(docs)} chunks vào ChromaDB...")
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=documents_content
+        # Collection vừa có thêm vector chuẩn hóa: kiểm tra lại kiểu vector ở lần tìm kiếm sau
+        self._normalized.pop(collection_name, None)
+        stale_ids = [chunk_id for chunk_id in existing if chunk_id not in seen_ids]
+        for start in range(0, len(stale_ids), CHROMA_UPSERT_BATCH_SIZE):
+            await self._run(collection.delete, ids=stale_ids[start:start + CHROMA_UPSERT_BATCH_SIZE], timeout=CHROMA_WRITE_TIMEOUT)
+
+        if self.lexical is not None:
+            ids, documents, metadatas = zip(*lexical_rows) if lexical_rows else ((), (), ())
+            await self._update_lexical(self.lexical.replace_source, collection_name, file_id, ids, documents, metadatas)
+
+        if self.manifest is not None:
+            await self.manifest.put(collection_name, file_id, {
+                "chunks": stats["chunks"],
+                "content_hash": IngestManifest.content_hash(chunk_hashes),
+                "embedding_model": OLLAMA_EMBEDDING_MODEL,
+                _NORMALIZED_KEY: True,
+                "ingested_at": processing_time
+            })
+
+        print(
+            f"[VectorStore] Hoàn tất xử lý file: {file_id} ({stats['pages']} trang, {stats['chunks']} chunks: "
+            f"{stats['stored']} mới, {stats['unchanged']} giữ nguyên ({stats['moved']} đổi vị trí), {len(stale_ids)} đã xóa)"
         )
-        
-        print(f"[VectorStore] Đang gửi {len(tasks)} tin nhắn RabbitMQ...")
-        if tasks:
-            await asyncio.gather(*tasks)
-            
-        print(f"[VectorStore] Hoàn tất xử lý file: {file_id}")
-        return raw_docs
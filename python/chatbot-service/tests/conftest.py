@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Module của service import theo gốc python/chatbot-service (config, services.*, utils.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+"""Redis async tối giản trong bộ nhớ cho test (chỉ các lệnh mà service dùng)."""
+import time
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+        self.hashes = {}
+        self.sets = {}
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("Redis không phản hồi")
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+    async def get(self, key):
+        self._check()
+        return self.values[key] if self._alive(key) else None
+
+    async def set(self, key, value, ex=None):
+        self._check()
+        self.values[key] = value.encode("utf-8") if isinstance(value, str) else value
+        if ex is not None:
+            self.expires[key] = time.monotonic() + ex
+        return True
+
+    async def hget(self, key, field):
+        self._check()
+        value = self.hashes.get(key, {}).get(field)
+        return value.encode("utf-8") if isinstance(value, str) else value
+
+    async def hgetall(self, key):
+        self._check()
+        return {field.encode("utf-8"): value.encode("utf-8") for field, value in self.hashes.get(key, {}).items()}
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hset(self, key, field, value):
+        self.commands.append(lambda r: r.hashes.setdefault(key, {}).__setitem__(field, value))
+
+    def hdel(self, key, *fields):
+        self.commands.append(lambda r: [r.hashes.get(key, {}).pop(field, None) for field in fields])
+
+    def sadd(self, key, member):
+        self.commands.append(lambda r: r.sets.setdefault(key, set()).add(member))
+
+    def srem(self, key, member):
+        self.commands.append(lambda r: r.sets.get(key, set()).discard(member))
+
+    def delete(self, key):
+        self.commands.append(lambda r: (r.hashes.pop(key, None), r.values.pop(key, None)))
+
+    async def execute(self):
+        self.redis._check()
+        for command in self.commands:
+            command(self.redis)
+        self.commands.clear()
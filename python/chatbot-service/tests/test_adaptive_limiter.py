@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from utils.adaptive_limiter import AdaptiveLimiter
+
+
+def test_additive_increase_and_multiplicative_decrease():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=4, target_latency=10, initial=2)
+
+    async def scenario():
+        for _ in range(3):
+            async with limiter():
+                pass
+        grown = limiter.limit
+        assert 3 <= grown <= 4
+        with pytest.raises(RuntimeError):
+            async with limiter():
+                raise RuntimeError("lỗi")
+        assert limiter.limit == grown / 2
+        # Không xuống dưới min_limit, không vượt max_limit
+        for _ in range(5):
+            await limiter.release(await limiter.acquire(), failed=True)
+        assert limiter.limit == 1.0
+        for _ in range(50):
+            async with limiter():
+                pass
+        assert limiter.limit == 4.0
+
+    asyncio.run(scenario())
+
+
+def test_slow_calls_halve_the_limit():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=8, target_latency=0.01, initial=8)
+
+    async def scenario():
+        async with limiter():
+            await asyncio.sleep(0.02)
+
+    asyncio.run(scenario())
+    assert limiter.limit == 4.0
+
+
+def test_in_flight_never_exceeds_limit():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=3, target_latency=10, initial=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter():
+            peak = max(peak, limiter.in_flight)
+            assert limiter.in_flight <= int(limiter.limit)
+            await asyncio.sleep(0.001)
+
+    async def scenario():
+        await asyncio.gather(*(call() for _ in range(30)))
+
+    asyncio.run(scenario())
+    assert peak == 3
+    assert limiter.in_flight == 0
+    assert limiter.stats()["limit"] == 3.0
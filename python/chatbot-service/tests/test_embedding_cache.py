@@ -0,0 +1,52 @@
+import time
+
+import services.embedding_cache as embedding_cache
+from services.embedding_cache import EmbeddingCache
+
+
+def make_cache(tmp_path, max_entries=100):
+    return EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3"), max_entries=max_entries, redis_url="")
+
+
+def test_hits_misses_and_duplicates(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(["a", "b"], [[1.0, 2.0], None], "m")
+    assert cache.get_many(["a", "b", "a"], "m") == [[1.0, 2.0], None, [1.0, 2.0]]
+    assert cache.get_many(["a"], "other-model") == [None]
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["hits_local"] == 2 and stats["misses"] == 2
+
+
+def test_cache_hits_do_not_write_on_every_read(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(["a", "b"], [[1.0], [2.0]], "m")
+    changes = cache.db.total_changes
+    for _ in range(20):
+        cache.get_many(["a", "b"], "m")
+    assert cache.db.total_changes == changes
+    assert set(cache.pending_access) == {cache.make_key("a", "m"), cache.make_key("b", "m")}
+
+
+def test_access_times_are_flushed_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_ACCESS_FLUSH_SECONDS", 0)
+    cache = make_cache(tmp_path)
+    cache.put_many(["a"], [[1.0]], "m")
+    inserted = cache.db.execute("SELECT last_access FROM embeddings").fetchone()[0]
+    time.sleep(0.01)
+    cache.get_many(["a"], "m")
+    assert not cache.pending_access
+    assert cache.db.execute("SELECT last_access FROM embeddings").fetchone()[0] > inserted
+
+
+def test_eviction_keeps_recently_read_entries(tmp_path):
+    cache = make_cache(tmp_path, max_entries=10)
+    texts = [f"t{i}" for i in range(10)]
+    cache.put_many(texts, [[float(i)] for i in range(10)], "m")
+    time.sleep(0.01)
+    # Đọc 5 entry đầu: thời điểm truy cập mới chỉ nằm trong RAM cho tới lần evict
+    cache.get_many(texts[:5], "m")
+    cache.put_many(["new"], [[99.0]], "m")
+    survivors = [text for text, vector in zip(texts, cache.get_many(texts, "m")) if vector]
+    assert set(texts[:5]) <= set(survivors)
+    assert cache.stats()["evictions"] == 2
+    assert cache.get_many(["new"], "m") == [[99.0]]
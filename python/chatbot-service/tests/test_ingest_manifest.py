@@ -0,0 +1,52 @@
+import asyncio
+
+from fake_redis import FakeRedis
+
+from services.ingest_manifest import IngestManifest
+
+
+def test_put_get_list_remove_and_drop():
+    redis = FakeRedis()
+    manifest = IngestManifest(redis)
+
+    async def scenario():
+        assert await manifest.get("user_1", "a.pdf") is None
+        await manifest.put("user_1", "a.pdf", {"chunks": 3, "content_hash": "h1"})
+        await manifest.put("user_1", "b.pdf", {"chunks": 1, "content_hash": "h2"})
+        await manifest.put("team_2", "c.pdf", {"chunks": 5, "content_hash": "h3"})
+        assert await manifest.get("user_1", "a.pdf") == {"chunks": 3, "content_hash": "h1"}
+        assert set(await manifest.list_sources("user_1")) == {"a.pdf", "b.pdf"}
+        assert redis.sets[IngestManifest.COLLECTIONS_KEY] == {"user_1", "team_2"}
+
+        assert await manifest.remove("user_1", ["a.pdf"])
+        assert await manifest.get("user_1", "a.pdf") is None
+        assert await manifest.remove("user_1", [])
+
+        assert await manifest.drop("user_1")
+        assert await manifest.list_sources("user_1") == {}
+        assert redis.sets[IngestManifest.COLLECTIONS_KEY] == {"team_2"}
+
+    asyncio.run(scenario())
+    assert manifest.stats()["hits"] == 1
+
+
+def test_redis_errors_count_as_miss():
+    redis = FakeRedis()
+    manifest = IngestManifest(redis)
+
+    async def scenario():
+        await manifest.put("user_1", "a.pdf", {"chunks": 1})
+        redis.fail = True
+        assert await manifest.get("user_1", "a.pdf") is None
+        assert await manifest.list_sources("user_1") == {}
+        assert not await manifest.remove("user_1", ["a.pdf"])
+        await manifest.put("user_1", "b.pdf", {"chunks": 1})
+
+    asyncio.run(scenario())
+    assert manifest.stats()["errors"] == 4
+    assert "b.pdf" not in redis.hashes["ingest_manifest:user_1"]
+
+
+def test_content_hash_depends_on_chunk_order():
+    assert IngestManifest.content_hash(["a", "b"]) == IngestManifest.content_hash(["a", "b"])
+    assert IngestManifest.content_hash(["a", "b"]) != IngestManifest.content_hash(["b", "a"])
@@ -0,0 +1,77 @@
+import threading
+import unicodedata
+
+from services.lexical_index import LexicalIndex, build_match_query, tokenize
+
+
+def add(index, collection, source, texts):
+    ids = [f"{source}_{i}" for i in range(len(texts))]
+    metadatas = [{"source": source, "chunk_id": i} for i in range(len(texts))]
+    index.replace_source(collection, source, ids, texts, metadatas)
+
+
+def test_tokenize_keeps_vietnamese_tones_and_normalizes_nfd():
+    nfd = unicodedata.normalize("NFD", "Quản Lý Dự Án")
+    assert tokenize(nfd) == ["quản", "lý", "dự", "án"]
+    assert tokenize("ticket_PROJ-123, v2.1") == ["ticket", "proj", "123", "v2", "1"]
+
+
+def test_match_query_has_codes_pairs_and_syllables():
+    match = build_match_query("Lỗi PROJ-123 quản lý")
+    assert '"proj 123"' in match
+    assert '"quản lý"' in match
+    assert '"lỗi"' in match
+    assert build_match_query("!!! ...") is None
+
+
+def test_match_query_drops_unknown_and_common_terms():
+    doc_freq = {"dự": 900, "án": 5, "của": 900}
+    # Cụm 2 âm tiết được giữ nếu có ít nhất một âm tiết hiếm
+    assert build_match_query("dự án của", doc_freq, cutoff=100) == '"dự án" OR "án của" OR "án"'
+    # Chỉ còn từ phổ biến / không có trong index -> không tìm BM25
+    assert build_match_query("của xyz", doc_freq, cutoff=100) is None
+
+
+def test_search_ranks_by_bm25_and_filters_sources(tmp_path):
+    index = LexicalIndex(directory=str(tmp_path))
+    add(index, "team_1", "a.pdf", ["Kế hoạch triển khai máy chủ tháng 5", "Biên bản họp nhóm thiết kế"])
+    add(index, "team_1", "b.pdf", ["Máy chủ cơ sở dữ liệu bị lỗi PROJ-123", "Ngân sách quý 3"])
+
+    results = index.search("team_1", "lỗi PROJ-123 máy chủ", k=5)
+    assert results[0].metadata["source"] == "b.pdf" and results[0].metadata["chunk_id"] == 0
+    assert results[0].metadata["bm25"] > 0
+    assert {doc.metadata["source"] for doc in results} == {"a.pdf", "b.pdf"}
+
+    only_a = index.search("team_1", "máy chủ", k=5, sources=["a.pdf"])
+    assert [doc.page_content for doc in only_a] == ["Kế hoạch triển khai máy chủ tháng 5"]
+    assert index.search("team_2", "máy chủ") == []
+    assert not (tmp_path / "team_2.sqlite3").exists()
+
+
+def test_replace_delete_and_drop(tmp_path):
+    index = LexicalIndex(directory=str(tmp_path))
+    add(index, "team_1", "a.pdf", ["phiên bản cũ"])
+    add(index, "team_1", "a.pdf", ["phiên bản mới"])
+    assert [doc.page_content for doc in index.search("team_1", "phiên bản")] == ["phiên bản mới"]
+    assert index.has_source("team_1", "a.pdf")
+    assert index.delete_sources("team_1", ["a.pdf", "missing.pdf"]) == 1
+    assert not index.has_source("team_1", "a.pdf")
+    assert index.search("team_1", "phiên bản") == []
+    index.drop("team_1")
+    assert not (tmp_path / "team_1.sqlite3").exists()
+    assert not index.has_source("team_1", "a.pdf")
+
+
+def test_write_on_one_collection_does_not_block_search_on_another(tmp_path):
+    index = LexicalIndex(directory=str(tmp_path))
+    add(index, "team_1", "a.pdf", ["máy chủ"])
+    add(index, "team_2", "b.pdf", ["máy chủ"])
+    _, busy_lock = index._connect("team_1")
+    results = []
+    with busy_lock:
+        # Giữ lock của team_1 như một replace_source đang chạy
+        worker = threading.Thread(target=lambda: results.append(index.search("team_2", "máy chủ")))
+        worker.start()
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+    assert [doc.metadata["source"] for doc in results[0]] == ["b.pdf"]
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from services.local_vector_store import LocalCollection, LocalVectorClient, _match
+
+DIM = 16
+ROWS = 300
+
+
+def brute_force(matrix, query, space, k):
+    if space == "cosine":
+        distances = 1.0 - (matrix @ query) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    elif space == "ip":
+        distances = 1.0 - matrix @ query
+    else:
+        distances = ((matrix - query) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return order.tolist(), distances[order]
+
+
+def fill(collection, rows=ROWS, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(rows, DIM)).astype(np.float32)
+    ids = [f"doc{i}" for i in range(rows)]
+    metadatas = [{"source": f"file{i % 5}", "chunk_id": i // 5, "lang": "vi" if i % 2 else "en"} for i in range(rows)]
+    collection.upsert(ids=ids, embeddings=matrix.tolist(), metadatas=metadatas, documents=[f"text {i}" for i in range(rows)])
+    return matrix, metadatas
+
+
+def make_collection(tmp_path, **kwargs):
+    # ann_min_rows lớn: luôn tìm chính xác bằng NumPy để so với brute force
+    kwargs.setdefault("ann_min_rows", 10 ** 12)
+    return LocalCollection("test", str(tmp_path / "test"), **kwargs)
+
+
+@pytest.mark.parametrize("where", [
+    {"source": "file1"},
+    {"source": {"$in": ["file0", "file3"]}},
+    {"source": {"$nin": ["file0", "file3"]}},
+    {"lang": {"$ne": "vi"}},
+    {"$and": [{"source": "file2"}, {"chunk_id": {"$gte": 10}}, {"chunk_id": {"$lt": 20}}]},
+    {"$or": [{"chunk_id": {"$lte": 1}}, {"chunk_id": {"$gt": 57}}]},
+    {"$and": [{"source": {"$in": ["file1", "file4"]}}, {"lang": "en"}]},
+])
+def test_get_where_matches_python_filter(tmp_path, where):
+    collection = make_collection(tmp_path)
+    _, metadatas = fill(collection)
+    expected = {f"doc{i}" for i, meta in enumerate(metadatas) if _match(meta, where)}
+    assert expected
+    result = collection.get(where=where, include=["metadatas"])
+    assert set(result["ids"]) == expected
+    assert all(_match(meta, where) for meta in result["metadatas"])
+
+
+def test_match_operators():
+    meta = {"source": "a", "chunk_id": 5}
+    assert _match(meta, {"chunk_id": {"$gte": 5, "$lt": 6}})
+    assert not _match(meta, {"chunk_id": {"$gt": 5}})
+    assert not _match(meta, {"missing": {"$gte": 0}})
+    assert _match(meta, {"$or": [{"source": "b"}, {"chunk_id": 5}]})
+    assert not _match(meta, {"$and": [{"source": "a"}, {"chunk_id": {"$ne": 5}}]})
+
+
+def test_delete_where_and_slot_reuse(tmp_path):
+    collection = make_collection(tmp_path)
+    fill(collection)
+    collection.delete(where={"source": "file0"})
+    assert collection.count() == ROWS - ROWS // 5
+    assert not collection.get(where={"source": "file0"})["ids"]
+    collection.upsert(ids=["new"], embeddings=[[1.0] * DIM], metadatas=[{"source": "file9"}], documents=["mới"])
+    assert collection.get(ids=["new"], include=["documents"])["documents"] == ["mới"]
+    assert collection.query([[1.0] * DIM], n_results=1, where={"source": "file9"})["ids"] == [["new"]]
+
+
+@pytest.mark.parametrize("space", ["cosine", "l2", "ip"])
+def test_query_top_k_matches_brute_force(tmp_path, space):
+    collection = make_collection(tmp_path, space=space)
+    matrix, _ = fill(collection)
+    queries = np.random.default_rng(1).normal(size=(5, DIM)).astype(np.float32)
+    result = collection.query(queries.tolist(), n_results=10)
+    for query, ids, distances in zip(queries, result["ids"], result["distances"]):
+        order, expected = brute_force(matrix, query, space, 10)
+        assert ids == [f"doc{i}" for i in order]
+        np.testing.assert_allclose(distances, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_query_with_where_only_returns_filtered_rows(tmp_path):
+    collection = make_collection(tmp_path)
+    matrix, metadatas = fill(collection)
+    where = {"$and": [{"source": {"$in": ["file1", "file2"]}}, {"lang": "vi"}]}
+    allowed = np.array([i for i, meta in enumerate(metadatas) if _match(meta, where)])
+    query = np.random.default_rng(2).normal(size=DIM).astype(np.float32)
+    result = collection.query([query.tolist()], n_results=7, where=where)
+    order, _ = brute_force(matrix[allowed], query, "cosine", 7)
+    assert result["ids"][0] == [f"doc{allowed[i]}" for i in order]
+    # k lớn hơn số dòng khớp điều kiện: trả về mọi dòng khớp
+    result = collection.query([query.tolist()], n_results=ROWS, where=where)
+    assert len(result["ids"][0]) == len(allowed)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compressed_scan_rescored_with_float32(tmp_path, dtype):
+    collection = make_collection(tmp_path, dtype=dtype, rescore_factor=8)
+    matrix, _ = fill(collection)
+    queries = np.random.default_rng(3).normal(size=(5, DIM)).astype(np.float32)
+    result = collection.query(queries.tolist(), n_results=5)
+    hits = 0
+    for query, ids, distances in zip(queries, result["ids"], result["distances"]):
+        order, _ = brute_force(matrix, query, "cosine", 5)
+        hits += len(set(ids) & {f"doc{i}" for i in order})
+        # Khoảng cách trả về được chấm lại bằng vector float32 gốc
+        rows = [int(row_id[3:]) for row_id in ids]
+        exact = 1.0 - (matrix[rows] @ query) / (np.linalg.norm(matrix[rows], axis=1) * np.linalg.norm(query))
+        np.testing.assert_allclose(distances, exact, rtol=1e-4, atol=1e-4)
+    assert hits / 25 >= 0.95
+
+
+def test_client_reopens_collection_from_disk(tmp_path):
+    client = LocalVectorClient(directory=str(tmp_path))
+    collection = client.get_or_create_collection("user_1", metadata={"hnsw:space": "cosine"})
+    matrix, _ = fill(collection, rows=20)
+    reopened = LocalVectorClient(directory=str(tmp_path)).get_collection("user_1")
+    assert reopened.count() == 20
+    assert reopened.get(where={"source": "file3"})["ids"] == collection.get(where={"source": "file3"})["ids"]
+    assert reopened.query([matrix[4].tolist()], n_results=1)["ids"] == [["doc4"]]
+    client.delete_collection("user_1")
+    with pytest.raises(ValueError):
+        LocalVectorClient(directory=str(tmp_path)).get_collection("user_1")
+
+
+def test_warns_once_when_ann_is_needed_but_hnswlib_is_missing(tmp_path, monkeypatch, capsys):
+    import services.local_vector_store as local_vector_store
+    monkeypatch.setattr(local_vector_store, "hnswlib", None)
+    collection = make_collection(tmp_path, ann_min_rows=10)
+    matrix, _ = fill(collection, rows=20)
+    for _ in range(3):
+        assert collection.query([matrix[3].tolist()], n_results=1)["ids"] == [["doc3"]]
+    assert capsys.readouterr().out.count("chưa cài hnswlib") == 1
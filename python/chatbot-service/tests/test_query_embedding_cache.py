@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from fake_redis import FakeRedis
+
+from services.query_embedding_cache import QueryEmbeddingCache, normalize_query
+
+
+class CountingEmbed:
+    def __init__(self, delay: float = 0.01, fail: bool = False):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self, query):
+        self.calls.append(query)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("Ollama lỗi")
+        return [float(len(query)), 1.0]
+
+
+def test_normalize_query():
+    assert normalize_query("  Dự   ÁN\tX? ") == normalize_query("dự án x?") == "dự án x?"
+    assert QueryEmbeddingCache.make_key("Dự án", "m") != QueryEmbeddingCache.make_key("Dự án", "other")
+
+
+def test_concurrent_identical_queries_embed_once():
+    cache = QueryEmbeddingCache()
+    embed = CountingEmbed()
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_embed(query, "m", embed) for query in ["Dự án X?", "dự án  x?"] * 5))
+
+    results = asyncio.run(scenario())
+    assert len(embed.calls) == 1
+    assert all(result == results[0] for result in results)
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits_local"] == 9
+    assert not cache.pending
+
+
+def test_failure_reaches_waiters_and_is_not_cached():
+    cache = QueryEmbeddingCache()
+    embed = CountingEmbed(fail=True)
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_embed("q", "m", embed) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        embed.fail = False
+        assert await cache.get_or_embed("q", "m", embed) == [1.0, 1.0]
+
+    asyncio.run(scenario())
+    assert len(embed.calls) == 2
+
+
+def test_entries_expire_after_ttl_and_lru_evicts():
+    cache = QueryEmbeddingCache(max_entries=2, ttl=0.05)
+    embed = CountingEmbed(delay=0)
+
+    async def scenario():
+        await cache.get_or_embed("a", "m", embed)
+        await cache.get_or_embed("a", "m", embed)
+        assert embed.calls == ["a"]
+        await asyncio.sleep(0.06)
+        await cache.get_or_embed("a", "m", embed)
+        assert embed.calls == ["a", "a"]
+
+        await cache.get_or_embed("b", "m", embed)
+        await cache.get_or_embed("a", "m", embed)
+        await cache.get_or_embed("c", "m", embed)
+        # "b" ít dùng gần đây nhất -> bị đẩy ra
+        assert cache.stats()["evictions"] == 1
+        await cache.get_or_embed("a", "m", embed)
+        await cache.get_or_embed("b", "m", embed)
+        assert embed.calls == ["a", "a", "b", "c", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_redis_tier_is_shared_between_workers():
+    redis = FakeRedis()
+    first, second = QueryEmbeddingCache(redis), QueryEmbeddingCache(redis)
+    embed = CountingEmbed(delay=0)
+
+    async def scenario():
+        vector = await first.get_or_embed("câu hỏi", "m", embed)
+        assert await second.get_or_embed("Câu  hỏi", "m", embed) == pytest.approx(vector)
+        redis.fail = True
+        assert await QueryEmbeddingCache(redis).get_or_embed("khác", "m", embed) == [4.0, 1.0]
+
+    asyncio.run(scenario())
+    assert embed.calls == ["câu hỏi", "khác"]
+    assert second.stats()["hits_redis"] == 1
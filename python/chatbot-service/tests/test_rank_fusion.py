@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+
+from utils.rank_fusion import reciprocal_rank_fusion
+
+
+def doc(source, chunk_id, text=None):
+    return Document(page_content=text or f"{source}-{chunk_id}", metadata={"source": source, "chunk_id": chunk_id})
+
+
+def test_scores_are_summed_across_lists():
+    a, b, c = doc("f", 0), doc("f", 1), doc("f", 2)
+    # b: 1/(60+2) + 1/(60+1) > a: 1/(60+1) + 1/(60+3)
+    fused = reciprocal_rank_fusion([[a, b, c], [b, c, a]])
+    assert [d.metadata["chunk_id"] for d in fused] == [1, 0, 2]
+
+
+def test_chunk_in_one_list_only_ranks_below_shared_chunks():
+    shared, vector_only, lexical_only = doc("f", 0), doc("f", 1), doc("g", 0)
+    fused = reciprocal_rank_fusion([[vector_only, shared], [shared, lexical_only]])
+    assert fused[0].metadata == shared.metadata
+    assert len(fused) == 3
+
+
+def test_duplicates_keep_the_first_lists_copy():
+    from_vector = doc("f", 3, "bản từ vector search")
+    from_lexical = doc("f", 3, "bản từ BM25")
+    fused = reciprocal_rank_fusion([[from_vector], [from_lexical]])
+    assert len(fused) == 1
+    assert fused[0] is from_vector
+
+
+def test_documents_without_position_are_deduped_by_content():
+    first = Document(page_content="cùng nội dung", metadata={})
+    second = Document(page_content="cùng nội dung", metadata={"source": "f"})
+    other = Document(page_content="nội dung khác", metadata={})
+    fused = reciprocal_rank_fusion([[first, other], [second]])
+    assert fused == [first, other]
+
+
+def test_limit_and_empty_lists():
+    docs = [doc("f", i) for i in range(5)]
+    assert reciprocal_rank_fusion([docs, None, []], limit=2) == docs[:2]
+    assert reciprocal_rank_fusion([[], None]) == []
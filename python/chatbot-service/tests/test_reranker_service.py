@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from services.reranker_service import RerankerService
+
+
+class RecordingReranker(RerankerService):
+    """RerankerService với _infer giả: điểm = độ dài đoạn văn, ghi lại các batch đã chạy."""
+    def __init__(self, fail: bool = False, **kwargs):
+        super().__init__(registry=None, model_name="fake", **kwargs)
+        self.batches_run = []
+        self.fail = fail
+
+    def _infer(self, batch):
+        self.batches_run.append([(job.query, list(job.texts)) for job in batch])
+        if self.fail:
+            raise RuntimeError("ONNX lỗi")
+        return [float(len(text)) for job in batch for text in job.texts]
+
+
+def test_concurrent_requests_share_one_batch():
+    service = RecordingReranker(window_ms=50, max_batch_pairs=64)
+
+    async def scenario():
+        return await asyncio.gather(
+            service.score("q1", ["a", "bb"]),
+            service.score("q2", ["ccc"]),
+            service.score("q3", ["dddd", "e", "ff"]),
+        )
+
+    assert asyncio.run(scenario()) == [[1.0, 2.0], [3.0], [4.0, 1.0, 2.0]]
+    assert len(service.batches_run) == 1
+    assert [query for query, _ in service.batches_run[0]] == ["q1", "q2", "q3"]
+    stats = service.stats()
+    assert stats["requests"] == 3 and stats["batches"] == 1 and stats["avg_batch_pairs"] == 6.0
+
+
+def test_batches_are_split_at_max_batch_pairs():
+    service = RecordingReranker(window_ms=50, max_batch_pairs=4)
+
+    async def scenario():
+        return await asyncio.gather(*(service.score(f"q{i}", ["x", "yy", "zzz"]) for i in range(3)))
+
+    assert asyncio.run(scenario()) == [[1.0, 2.0, 3.0]] * 3
+    # 3 cặp/yêu cầu, tối đa 4 cặp/batch -> mỗi yêu cầu một batch, giữ đúng thứ tự đến
+    assert [[query for query, _ in batch] for batch in service.batches_run] == [["q0"], ["q1"], ["q2"]]
+
+
+def test_cancelled_request_is_dropped_before_inference():
+    service = RecordingReranker(window_ms=50, max_batch_pairs=64)
+
+    async def scenario():
+        cancelled = asyncio.create_task(service.score("gone", ["a"]))
+        kept = asyncio.create_task(service.score("kept", ["bb"]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        assert await kept == [2.0]
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+    asyncio.run(scenario())
+    assert [[query for query, _ in batch] for batch in service.batches_run] == [["kept"]]
+
+
+def test_inference_error_reaches_every_caller_and_worker_survives():
+    service = RecordingReranker(fail=True, window_ms=10)
+
+    async def scenario():
+        results = await asyncio.gather(service.score("q1", ["a"]), service.score("q2", ["b"]), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        service.fail = False
+        assert await service.score("q3", ["ccc"]) == [3.0]
+        assert await service.score("q4", []) == []
+
+    asyncio.run(scenario())
+    assert service.stats()["batches"] == 1
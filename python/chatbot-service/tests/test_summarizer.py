@@ -0,0 +1,127 @@
+import asyncio
+
+from chains.summarizer import FAILED_MESSAGE, MAP_PROMPT, MAX_REDUCE_LEVELS, NO_CONTENT_MESSAGE, REDUCE_PROMPT, Summarizer
+
+
+class FakeLLM:
+    """LLM giả: ghi lại prompt; lời gọi có chứa một trong `fail_on` thì lỗi."""
+    model = "fake"
+
+    def __init__(self, fail_on=(), map_answer="- ý chính"):
+        self.fail_on = fail_on
+        self.map_answer = map_answer
+        self.prompts = []
+
+    async def achatWithOutStream(self, messages):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        if any(marker in prompt for marker in self.fail_on):
+            raise RuntimeError("Ollama lỗi")
+        return {"message": {"content": self.map_answer}}
+
+    async def achat(self, messages):
+        self.prompts.append(messages[0]["content"])
+        yield {"message": {"content": "Tóm tắt cuối."}}
+
+
+def long_text(sections: int, words: int = 900) -> str:
+    return "\n\n".join(" ".join(f"s{n}w{i}" for i in range(words)) for n in range(sections))
+
+
+def run(summarizer, documents):
+    report = {}
+
+    async def collect():
+        return "".join([part async for part in summarizer.summarize(documents, report)])
+    return asyncio.run(collect()), report
+
+
+def make_summarizer(llm, token_budget=1000):
+    summarizer = Summarizer(llm, token_budget=token_budget, extractive=False)
+    summarizer.stream_sections = False
+    return summarizer
+
+
+def test_short_text_is_stuffed_in_one_call():
+    llm = FakeLLM()
+    summary, report = run(make_summarizer(llm, token_budget=6000), ["văn bản ngắn"])
+    assert summary == "Tóm tắt cuối."
+    assert report["failed_calls"] == 0
+    assert len(llm.prompts) == 1
+
+
+def test_empty_input_reports_no_content():
+    summary, report = run(make_summarizer(FakeLLM()), [])
+    assert summary == NO_CONTENT_MESSAGE
+    assert report["failed_calls"] == 0
+
+
+def test_failed_map_call_is_reported():
+    llm = FakeLLM(fail_on=("s1w0 ",))
+    summary, report = run(make_summarizer(llm), [long_text(3)])
+    assert summary.endswith("Tóm tắt cuối.")
+    assert report["failed_calls"] >= 1
+
+
+def test_every_map_call_failing_yields_failed_message():
+    llm = FakeLLM(fail_on=(MAP_PROMPT.strip()[:30],))
+    summary, report = run(make_summarizer(llm), [long_text(3)])
+    assert summary == FAILED_MESSAGE
+    assert report["failed_calls"] == sum(MAP_PROMPT.strip()[:30] in prompt for prompt in llm.prompts)
+
+
+class CollapsingLLM(FakeLLM):
+    """MAP trả về đoạn dài cố định; COLLAPSE trả về bản ngắn hơn đầu vào (hoặc giữ nguyên nếu shrink=False)."""
+    def __init__(self, shrink=True, delays=None):
+        super().__init__()
+        self.shrink = shrink
+        self.delays = delays or {}
+
+    async def achatWithOutStream(self, messages):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        for marker, delay in self.delays.items():
+            if marker in prompt:
+                await asyncio.sleep(delay)
+        if "Gộp các danh sách" in prompt:
+            body = prompt.split("CÁC Ý CHÍNH:")[1]
+            return {"message": {"content": "- gộp" if self.shrink else body}}
+        return {"message": {"content": "- " + "ý " * 400}}
+
+
+def test_reduce_collapses_in_levels_until_it_fits():
+    llm = CollapsingLLM()
+    summarizer = make_summarizer(llm)
+    limit = summarizer._chars_for(REDUCE_PROMPT)
+    summaries = ["- " + "ý " * 400] * 20
+    report = {}
+    result = asyncio.run(summarizer._reduce_until_fits(summaries, report))
+    assert len("\n---\n".join(result)) <= limit
+    collapse_prompts = [prompt for prompt in llm.prompts if "Gộp các danh sách" in prompt]
+    assert collapse_prompts
+    # Mỗi prompt COLLAPSE vừa ngân sách token
+    assert all(len(prompt) // 4 <= summarizer.token_budget + 50 for prompt in collapse_prompts)
+    assert report.get("failed_calls", 0) == 0
+
+
+def test_reduce_stops_after_max_levels(capsys):
+    # COLLAPSE không rút ngắn được gì: dừng sau MAX_REDUCE_LEVELS tầng và cắt bớt đầu vào REDUCE
+    summarizer = make_summarizer(CollapsingLLM(shrink=False))
+    summaries = ["- " + "ý " * 800] * 20
+    result = asyncio.run(summarizer._reduce_until_fits(summaries, {}))
+    assert len(result) == 1
+    assert len(result[0]) <= summarizer._chars_for(REDUCE_PROMPT)
+    assert capsys.readouterr().out.count("REDUCE tầng") == MAX_REDUCE_LEVELS
+
+
+def test_sections_stream_in_document_order():
+    # Phần đầu MAP chậm nhất nhưng vẫn được phát trước
+    llm = CollapsingLLM(delays={"s0w0 ": 0.05})
+    summarizer = make_summarizer(llm)
+    summarizer.stream_sections = True
+    summary, _ = run(summarizer, [long_text(4)])
+    headers = [line for line in summary.splitlines() if line.startswith("**Phần")]
+    assert headers == [f"**Phần {i}**" for i in range(1, len(headers) + 1)]
+    assert len(headers) >= 4
+    assert summary.endswith("Tóm tắt cuối.")
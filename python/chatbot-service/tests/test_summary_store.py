@@ -0,0 +1,117 @@
+import asyncio
+
+from fake_redis import FakeRedis
+
+import callback
+from chains.summarizer import FAILED_MESSAGE, Summarizer
+from services.summary_store import SummaryStore
+
+
+def test_key_depends_on_version_model_and_settings():
+    store = SummaryStore(FakeRedis())
+
+    async def scenario():
+        await store.put("file.pdf", "v1", "llama", "Bản tóm tắt", "budget=6000")
+        assert await store.get("file.pdf", "v1", "llama", "budget=6000") == "Bản tóm tắt"
+        assert await store.get("file.pdf", "v2", "llama", "budget=6000") is None
+        assert await store.get("file.pdf", "v1", "qwen", "budget=6000") is None
+        assert await store.get("file.pdf", "v1", "llama", "budget=3000") is None
+        assert await store.get("other.pdf", "v1", "llama", "budget=6000") is None
+
+    asyncio.run(scenario())
+    assert store.stats()["hits"] == 1
+    assert store.stats()["stored"] == 1
+
+
+def test_blank_summary_and_redis_errors_are_ignored():
+    redis = FakeRedis()
+    store = SummaryStore(redis)
+
+    async def scenario():
+        await store.put("file.pdf", "v1", "llama", "   ")
+        assert redis.values == {}
+        redis.fail = True
+        await store.put("file.pdf", "v1", "llama", "Bản tóm tắt")
+        assert await store.get("file.pdf", "v1", "llama") is None
+
+    asyncio.run(scenario())
+    assert store.stats()["stored"] == 0
+
+
+def test_summarizer_settings_key_tracks_output_settings():
+    summarizer = Summarizer(object(), token_budget=6000, extractive=False)
+    base = summarizer.settings_key
+    assert Summarizer(object(), token_budget=3000, extractive=False).settings_key != base
+    assert Summarizer(object(), token_budget=6000, extractive=True, extractive_ratio=0.3).settings_key != base
+    summarizer.stream_sections = not summarizer.stream_sections
+    assert summarizer.settings_key != base
+
+
+class FakeVectorStore:
+    """Chunk của file đang lưu: danh sách đoạn văn bản + phiên bản nội dung."""
+    def __init__(self, texts, version):
+        self.texts = texts
+        self.version = version
+        self.ingested = 0
+
+    async def has_chunks(self, collection_name, file_id):
+        return True
+
+    async def process_and_store(self, *args, **kwargs):
+        self.ingested += 1
+
+    async def content_version(self, collection_name, file_id):
+        return self.version
+
+    async def iter_document_text(self, collection_name, file_id):
+        for text in self.texts:
+            yield text
+
+
+class FakeLLM:
+    model = "fake"
+
+    def __init__(self, answer="Bản tóm tắt."):
+        self.answer = answer
+        self.calls = 0
+
+    async def achat(self, messages):
+        self.calls += 1
+        if self.answer is None:
+            raise RuntimeError("Ollama lỗi")
+        yield {"message": {"content": self.answer}}
+
+
+def summarize(summarizer, store, vectors):
+    async def collect():
+        return "".join([part async for part in callback.generate_summary(
+            summarizer, store, vectors, "u1", None, "file.pdf", "file.pdf"
+        )])
+    return asyncio.run(collect())
+
+
+def test_summary_is_keyed_on_the_summarized_content():
+    llm = FakeLLM()
+    summarizer = Summarizer(llm, token_budget=6000, extractive=False)
+    store = SummaryStore(FakeRedis())
+    vectors = FakeVectorStore(["Nội dung phiên bản 1."], "v1")
+
+    assert summarize(summarizer, store, vectors) == "Bản tóm tắt."
+    assert summarize(summarizer, store, vectors) == "Bản tóm tắt."
+    assert llm.calls == 1
+
+    # Chunk đổi (file được ingest lại) -> tóm tắt lại, không phát lại bản cũ
+    vectors.texts, vectors.version = ["Nội dung phiên bản 2."], "v2"
+    llm.answer = "Bản tóm tắt mới."
+    assert summarize(summarizer, store, vectors) == "Bản tóm tắt mới."
+    assert llm.calls == 2
+
+
+def test_failed_or_unversioned_summaries_are_not_stored():
+    store = SummaryStore(FakeRedis())
+    summarizer = Summarizer(FakeLLM(FAILED_MESSAGE), token_budget=6000, extractive=False)
+    summarize(summarizer, store, FakeVectorStore(["Nội dung."], "v1"))
+    # Chunk cũ không có content_hash -> không có phiên bản để gắn bản tóm tắt
+    summarizer = Summarizer(FakeLLM(), token_budget=6000, extractive=False)
+    summarize(summarizer, store, FakeVectorStore(["Nội dung."], None))
+    assert store.stats()["stored"] == 0
@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+
+import pytest
+from fake_redis import FakeRedis
+from langchain_core.documents import Document
+
+from services.ingest_manifest import IngestManifest
+from services.lexical_index import LexicalIndex
+from services.local_vector_store import LocalVectorClient
+from services.vectorstore_service import VectorStoreService, _overlap_length
+
+FILE_ID = "file-1"
+COLLECTION = "user_u1"
+
+
+class FakeLLM:
+    """
+    Embedding tất định theo nội dung chunk, đếm các chunk đã gửi đi embed.
+    fail_after: lỗi cả lần gọi khi vượt số chunk này; bad_texts: các chunk trả về None (embed lỗi).
+    """
+    def __init__(self, fail_after: int | None = None, bad_texts=()):
+        self.embedded = []
+        self.fail_after = fail_after
+        self.bad_texts = set(bad_texts)
+
+    async def embed_batched(self, texts):
+        if self.fail_after is not None and len(self.embedded) + len(texts) > self.fail_after:
+            raise RuntimeError("Ollama không phản hồi")
+        self.embedded.extend(texts)
+        return [None if text in self.bad_texts else vector(text) for text in texts]
+
+
+class FakeMinio:
+    def __init__(self, pages: list[str]):
+        self.pages = pages
+
+    async def stream_documents(self, object_name, original_name=None):
+        for number, text in enumerate(self.pages):
+            yield Document(page_content=text, metadata={"page": number})
+
+
+def vector(text: str) -> list[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [byte / 255 + 0.01 for byte in digest[:8]]
+
+
+def paragraph(name: str) -> str:
+    """Một trang ngắn (< chunk_size) -> đúng một chunk."""
+    return f"Đoạn {name}: " + " ".join(f"{name}{i}" for i in range(30))
+
+
+def chunk_id(text: str, occurrence: int = 0) -> str:
+    return f"{FILE_ID}_{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}_{occurrence}"
+
+
+def make_service(tmp_path, pages, llm=None, manifest=None):
+    return VectorStoreService(
+        llm or FakeLLM(), FakeMinio(pages), manifest=manifest, client=LocalVectorClient(directory=str(tmp_path))
+    )
+
+
+def ingest(service, mode="skip"):
+    # Bỏ qua retry_async để lỗi được trả về ngay
+    return asyncio.run(VectorStoreService.process_and_store.__wrapped__(service, "u1", FILE_ID, None, reingest_mode=mode))
+
+
+def stored(service):
+    collection = service.client.get_collection(COLLECTION)
+    result = collection.get(where={"source": FILE_ID}, include=["metadatas", "documents"])
+    return {row_id: (meta, doc) for row_id, meta, doc in zip(result["ids"], result["metadatas"], result["documents"])}
+
+
+def test_ids_follow_content_hash_and_occurrence(tmp_path):
+    a, b = paragraph("a"), paragraph("b")
+    service = make_service(tmp_path, [a, b, a])
+    ingest(service)
+    rows = stored(service)
+    assert set(rows) == {chunk_id(a, 0), chunk_id(b), chunk_id(a, 1)}
+    assert rows[chunk_id(a, 1)][0]["chunk_id"] == 2
+    meta = rows[chunk_id(b)][0]
+    assert meta["content_hash"] == hashlib.sha256(b.encode("utf-8")).hexdigest()
+    assert meta["embedding_normalized"] is True
+    assert meta["page"] == 1
+
+
+def test_skip_mode_does_not_embed_again(tmp_path):
+    llm = FakeLLM()
+    service = make_service(tmp_path, [paragraph("a"), paragraph("b")], llm)
+    ingest(service)
+    ingest(service, "skip")
+    assert len(llm.embedded) == 2
+
+
+def test_diff_reingest_embeds_only_new_chunks(tmp_path):
+    a, b, c, d = (paragraph(name) for name in "abcd")
+    llm = FakeLLM()
+    service = make_service(tmp_path, [a, b, c], llm)
+    ingest(service)
+    original = stored(service)
+
+    # b giữ vị trí, a bị dịch xuống, c bị xóa, d là chunk mới
+    llm.embedded.clear()
+    service.minio.pages = [d, b, a]
+    ingest(service, "diff")
+
+    assert llm.embedded == [d]
+    rows = stored(service)
+    assert set(rows) == {chunk_id(d), chunk_id(b), chunk_id(a)}
+    assert {row_id: meta["chunk_id"] for row_id, (meta, _) in rows.items()} == {
+        chunk_id(d): 0, chunk_id(b): 1, chunk_id(a): 2
+    }
+    # Chunk không đổi nội dung giữ nguyên id, document và vector
+    assert rows[chunk_id(a)][1] == a
+    assert rows[chunk_id(b)][0]["processed_at"] == original[chunk_id(b)][0]["processed_at"]
+    collection = service.client.get_collection(COLLECTION)
+    assert collection.query([vector(a)], n_results=1)["ids"] == [[chunk_id(a)]]
+    assert collection.query([vector(c)], n_results=3)["ids"][0].count(chunk_id(c)) == 0
+
+
+def test_diff_reingest_of_unchanged_file_embeds_nothing(tmp_path):
+    pages = [paragraph("a"), paragraph("b")]
+    llm = FakeLLM()
+    service = make_service(tmp_path, pages, llm)
+    ingest(service)
+    before = stored(service)
+    llm.embedded.clear()
+    ingest(service, "diff")
+    assert llm.embedded == []
+    assert stored(service) == before
+
+
+def test_failed_full_reingest_keeps_old_chunks(tmp_path):
+    a, b, c = (paragraph(name) for name in "abc")
+    service = make_service(tmp_path, [a, b])
+    ingest(service)
+    before = stored(service)
+
+    service.llm = FakeLLM(fail_after=0)
+    service.minio.pages = [a, c]
+    with pytest.raises(RuntimeError):
+        ingest(service, "full")
+    assert stored(service) == before
+
+    service.llm = FakeLLM()
+    ingest(service, "full")
+    assert set(stored(service)) == {chunk_id(a), chunk_id(c)}
+    assert service.llm.embedded == [a, c]
+
+
+def test_chunks_that_fail_to_embed_leave_the_file_unindexed(tmp_path):
+    pages = [paragraph(name) for name in "abcd"]
+    manifest = IngestManifest(FakeRedis())
+    service = make_service(tmp_path, pages, FakeLLM(bad_texts=[pages[2]]), manifest)
+    with pytest.raises(RuntimeError):
+        ingest(service)
+    assert asyncio.run(manifest.get(COLLECTION, FILE_ID)) is None
+    assert stored(service) == {}
+
+    # Lần sau (skip) không bị coi là CACHE HIT mà embed lại và ghi manifest đủ chunk
+    service.llm = FakeLLM()
+    ingest(service)
+    assert asyncio.run(manifest.get(COLLECTION, FILE_ID))["chunks"] == 4
+    assert len(stored(service)) == 4
+
+
+def test_manifest_entry_short_circuits_skip_mode(tmp_path):
+    manifest = IngestManifest(FakeRedis())
+    llm = FakeLLM()
+    service = make_service(tmp_path, [paragraph("a")], llm, manifest)
+    ingest(service)
+    entry = asyncio.run(manifest.get(COLLECTION, FILE_ID))
+    assert entry["chunks"] == 1 and entry["embedding_normalized"] is True
+    assert entry["content_hash"] == asyncio.run(service.content_version(COLLECTION, FILE_ID))
+    service.minio = None
+    ingest(service)
+    assert len(llm.embedded) == 1
+
+
+def long_page(prefix: str, words: int = 600) -> str:
+    return " ".join(f"{prefix}{i:04d}" for i in range(words))
+
+
+def read_back(service, page_size):
+    async def collect():
+        return [text async for text in service.iter_document_text(COLLECTION, FILE_ID, page_size=page_size)]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 200])
+def test_iter_document_text_removes_overlap_across_read_pages(tmp_path, page_size):
+    pages = [long_page("x"), long_page("y"), paragraph("z")]
+    service = make_service(tmp_path, pages)
+    ingest(service)
+    collection = service.client.get_collection(COLLECTION)
+    # Trang dài bị cắt thành nhiều chunk có chunk_overlap, nên phép thử đi qua nhiều trang đọc
+    assert collection.count() > len(pages) + 3
+    assert read_back(service, page_size) == pages
+
+
+def test_iter_document_text_reads_past_chunk_id_gaps(tmp_path):
+    pages = [paragraph(name) for name in "abcdef"]
+    service = make_service(tmp_path, pages)
+    ingest(service)
+    # Khoảng trống chunk_id 2-3 phủ kín một trang đọc (page_size=2)
+    service.client.get_collection(COLLECTION).delete(ids=[chunk_id(pages[2]), chunk_id(pages[3])])
+    assert read_back(service, 2) == [pages[0], pages[1], pages[4], pages[5]]
+
+
+def test_iter_document_text_missing_collection(tmp_path):
+    service = make_service(tmp_path, [])
+    assert read_back(service, 10) == []
+
+
+def test_overlap_length():
+    tail = "phần trùng nhau giữa hai chunk"
+    assert _overlap_length("mở đầu " + tail, tail + " phần sau") == len(tail)
+    # Ngắn hơn _MIN_CHUNK_OVERLAP thì không coi là trùng
+    assert _overlap_length("abc xyz", "xyz def") == 0
+    assert _overlap_length("đoạn một hoàn toàn khác", "đoạn hai không liên quan") == 0
+    # Chọn phần trùng dài nhất
+    repeated = "abcdefghij" * 5
+    assert _overlap_length(repeated, repeated + "k") == len(repeated)
+
+
+def test_content_version_follows_stored_chunks(tmp_path):
+    a, b, c = (paragraph(name) for name in "abc")
+    service = make_service(tmp_path, [a, b])
+    assert asyncio.run(service.content_version(COLLECTION, FILE_ID)) is None
+    ingest(service)
+    first = asyncio.run(service.content_version(COLLECTION, FILE_ID))
+    assert first
+    service.minio.pages = [a, c]
+    ingest(service, "diff")
+    second = asyncio.run(service.content_version(COLLECTION, FILE_ID))
+    assert second and second != first
+    service.minio.pages = [a, b]
+    ingest(service, "diff")
+    assert asyncio.run(service.content_version(COLLECTION, FILE_ID)) == first
+
+
+@pytest.mark.parametrize("file_ids", [None, [FILE_ID]])
+def test_lexical_search_backfills_files_missing_from_the_bm25_index(tmp_path, file_ids):
+    # File ingest khi worker này chưa có index BM25 (hoặc ở worker khác)
+    service = make_service(tmp_path / "vectors", [paragraph("a"), paragraph("b")])
+    ingest(service)
+    service.lexical = LexicalIndex(directory=str(tmp_path / "lexical"))
+
+    async def scenario():
+        await service.lexical_search(COLLECTION, "b7", file_ids=file_ids)
+        await service._lexical_backfills[COLLECTION]
+        found = await service.lexical_search(COLLECTION, "b7", file_ids=file_ids)
+        assert [doc.metadata["source"] for doc in found] == [FILE_ID]
+        assert found[0].page_content == paragraph("b")
+        # Đã kiểm tra: không chạy lại việc nạp bổ sung
+        await service.lexical_search(COLLECTION, "a3", file_ids=file_ids)
+        assert service._lexical_backfills[COLLECTION].done()
+
+    asyncio.run(scenario())
+    assert service.lexical.has_source(COLLECTION, FILE_ID)
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from collections import deque
+
+
+class AdaptiveLimiter:
+    """
+    Giới hạn số lời gọi song song theo AIMD dựa trên độ trễ:
+    - lời gọi xong nhanh hơn target_latency: tăng limit thêm 1/limit (cộng dần),
+    - chậm hơn target_latency hoặc lỗi: giảm limit một nửa (nhân).
+    Dùng: `async with limiter(): ...`
+    """
+    def __init__(self, min_limit: int = 1, max_limit: int = 4, target_latency: float = 30.0, initial: int | None = None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.target_latency = target_latency
+        self.limit = float(initial if initial is not None else self.min_limit)
+        self.in_flight = 0
+        self.latencies = deque(maxlen=200)
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, failed: bool = False):
+        latency = time.monotonic() - started
+        self.latencies.append(latency)
+        async with self._condition:
+            self.in_flight -= 1
+            if failed or latency > self.target_latency:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def __call__(self):
+        return _LimiterSlot(self)
+
+    def stats(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "avg_latency_s": round(sum(ordered) / len(ordered), 2) if ordered else 0,
+            "p95_latency_s": round(ordered[int(0.95 * (len(ordered) - 1))], 2) if ordered else 0,
+        }
+
+
+class _LimiterSlot:
+    def __init__(self, limiter: AdaptiveLimiter):
+        self.limiter = limiter
+        self.started = None
+
+    async def __aenter__(self):
+        self.started = await self.limiter.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.limiter.release(self.started, failed=exc_type is not None)
+        return False
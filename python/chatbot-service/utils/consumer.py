@@ -0,0 +1,82 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+class WorkerLane:
+    """
+    Một lane xử lý message RabbitMQ.
+    - concurrency: số message của lane được xử lý cùng lúc.
+    - shared: semaphore dùng chung giữa nhiều lane (vd. các tác vụ LLM dài),
+      để tổng của chúng không lấn sang phần capacity dành cho lane khác.
+    Ghi lại thời gian chờ của message (trong worker và trên broker nếu có timestamp).
+    """
+    def __init__(self, name: str, concurrency: int, shared: asyncio.Semaphore | None = None):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.shared = shared
+        self.waiting = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.waits = deque(maxlen=500)
+        self.broker_waits = deque(maxlen=500)
+
+    def wrap(self, callback):
+        async def wrapper(message):
+            received = time.monotonic()
+            timestamp = getattr(message, "timestamp", None)
+            if timestamp is not None:
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+                self.broker_waits.append(max(0.0, (datetime.now(timezone.utc) - timestamp).total_seconds()))
+
+            self.waiting += 1
+            try:
+                await self.semaphore.acquire()
+                if self.shared is not None:
+                    try:
+                        await self.shared.acquire()
+                    except BaseException:
+                        self.semaphore.release()
+                        raise
+            finally:
+                self.waiting -= 1
+
+            wait = time.monotonic() - received
+            self.waits.append(wait)
+            if wait > 1:
+                print(f"--> [Lane {self.name}] Message chờ {wait:.2f}s trước khi được xử lý.")
+
+            self.in_flight += 1
+            try:
+                return await callback(message)
+            finally:
+                self.in_flight -= 1
+                self.processed += 1
+                if self.shared is not None:
+                    self.shared.release()
+                self.semaphore.release()
+
+        return wrapper
+
+    def stats(self) -> dict:
+        def summary(values):
+            if not values:
+                return {"avg_ms": 0, "p95_ms": 0, "max_ms": 0}
+            ordered = sorted(values)
+            return {
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "processed": self.processed,
+            "queue_wait": summary(self.waits),
+            "broker_wait": summary(self.broker_waits),
+        }
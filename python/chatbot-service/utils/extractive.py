@@ -0,0 +1,86 @@
+import re
+import numpy as np
+
+_SENTENCE_RE = re.compile(r"[^.!?…\n]+(?:[.!?…]+|\n+|$)")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def split_sentences(text: str, min_chars: int = 20) -> list[str]:
+    """Tách câu thô theo dấu câu/xuống dòng; câu quá ngắn được nối vào câu trước."""
+    sentences = []
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group().strip()
+        if not sentence:
+            continue
+        if sentences and len(sentence) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {sentence}"
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+def score_sentences(sentences: list[str]) -> np.ndarray:
+    """
+    Điểm TF-IDF của từng câu = cosine giữa vector câu và vector trọng tâm của cả tài liệu.
+    Tính trên dạng thưa (chỉ số term theo token) nên không dựng ma trận câu x từ vựng.
+    """
+    vocab = {}
+    term_ids, sent_ids = [], []
+    for i, sentence in enumerate(sentences):
+        for word in _WORD_RE.findall(sentence.lower()):
+            term_ids.append(vocab.setdefault(word, len(vocab)))
+            sent_ids.append(i)
+
+    n_sent = len(sentences)
+    if not term_ids:
+        return np.zeros(n_sent, dtype=np.float32)
+
+    n_terms = len(vocab)
+    pair_keys, counts = np.unique(
+        np.asarray(sent_ids, dtype=np.int64) * n_terms + np.asarray(term_ids, dtype=np.int64),
+        return_counts=True
+    )
+    pair_sent = pair_keys // n_terms
+    pair_term = pair_keys % n_terms
+
+    df = np.bincount(pair_term, minlength=n_terms)
+    idf = np.log((1 + n_sent) / (1 + df)) + 1.0
+    weights = (1.0 + np.log(counts)) * idf[pair_term]
+
+    centroid = np.bincount(pair_term, weights=weights, minlength=n_terms)
+    centroid /= np.linalg.norm(centroid) or 1.0
+
+    dots = np.bincount(pair_sent, weights=weights * centroid[pair_term], minlength=n_sent)
+    norms = np.sqrt(np.bincount(pair_sent, weights=weights ** 2, minlength=n_sent))
+    return np.divide(dots, norms, out=np.zeros(n_sent), where=norms > 0)
+
+
+def select_passages(text: str, budget_chars: int, segments: int = 8) -> str:
+    """
+    Chọn các câu tiêu biểu nhất (theo điểm TF-IDF) cho tới khi đủ budget_chars.
+    Tài liệu được chia thành `segments` đoạn liên tiếp, mỗi đoạn có phần ngân sách
+    tỉ lệ với độ dài để bản trích không dồn hết vào một chủ đề. Giữ thứ tự gốc.
+    """
+    if len(text) <= budget_chars:
+        return text
+    sentences = split_sentences(text)
+    if not sentences:
+        return text[:budget_chars]
+
+    scores = score_sentences(sentences)
+    lengths = np.fromiter((len(s) + 1 for s in sentences), dtype=np.int64, count=len(sentences))
+    ratio = budget_chars / max(1, int(lengths.sum()))
+
+    selected = []
+    for segment in np.array_split(np.arange(len(sentences)), max(1, min(segments, len(sentences)))):
+        if not len(segment):
+            continue
+        remaining = int(lengths[segment].sum() * ratio)
+        for idx in segment[np.argsort(-scores[segment], kind="stable")]:
+            if lengths[idx] > remaining:
+                continue
+            selected.append(idx)
+            remaining -= lengths[idx]
+
+    selected.sort()
+    return "\n".join(sentences[i] for i in selected)
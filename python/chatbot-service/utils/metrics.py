@@ -0,0 +1,33 @@
+import asyncio
+import json
+import time
+
+_providers = {}
+
+def register_metrics(name: str, provider):
+    """
+    Đăng ký một hàm trả về dict số liệu (counter, thời gian...) dưới tên name.
+    """
+    _providers[name] = provider
+
+def metrics_snapshot() -> dict:
+    snapshot = {"timestamp": time.time()}
+    for name, provider in list(_providers.items()):
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            snapshot[name] = {"error": str(e)}
+    return snapshot
+
+async def report_metrics(redis_client, key: str, interval: float):
+    """
+    Định kỳ ghi snapshot số liệu vào Redis (key) và in ra log.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        snapshot = metrics_snapshot()
+        try:
+            await redis_client.set(key, json.dumps(snapshot, default=str))
+        except Exception as e:
+            print(f"--> [Metrics] Không ghi được metrics vào Redis: {e}")
+        print(f"--> [Metrics] {json.dumps(snapshot, default=str)}")
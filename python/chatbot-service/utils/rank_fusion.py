@@ -0,0 +1,23 @@
+def _doc_key(doc):
+    meta = getattr(doc, "metadata", None) or {}
+    if "source" in meta and "chunk_id" in meta:
+        return (meta["source"], meta["chunk_id"])
+    return getattr(doc, "page_content", None) or str(doc)
+
+
+def reciprocal_rank_fusion(result_lists: list[list], k: int = 60, limit: int | None = None) -> list:
+    """
+    Gộp nhiều danh sách kết quả đã xếp hạng: score(d) = sum 1 / (k + rank_i(d)).
+    Chunk trùng (cùng source + chunk_id) chỉ giữ một bản, ưu tiên bản ở danh sách đứng trước.
+    """
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results or [], start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    if limit is not None:
+        ranked = ranked[:limit]
+    return [docs[key] for key in ranked]